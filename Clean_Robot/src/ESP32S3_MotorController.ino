@@ -57,6 +57,10 @@ const unsigned long SERVER_POLL_INTERVAL = 1500;
 
 String _last_server_command = "";
 unsigned long _last_poll = 0;
+// 服务器命令队列的回执：收到带 command_id 的命令后，在下一次心跳的 ack 字段中回执；
+// 同一 command_id 只执行一次（服务器重投时只重新回执，不重复执行）
+long _pending_ack = 0;
+long _last_command_id = 0;
 
 // 控制模式
 enum ControlMode {
@@ -477,10 +481,16 @@ void pollServerCommands() {
   payload += "\"lat\":" + String(simLat, 6) + ",";
   payload += "\"lng\":" + String(simLng, 6) + ",";
   payload += "\"status\":\"ONLINE\",";
-  payload += "\"battery\":" + String(sensorData.battery) + "}";
+  payload += "\"battery\":" + String(sensorData.battery);
+  if (_pending_ack > 0) {
+    payload += ",\"ack\":" + String(_pending_ack);
+  }
+  payload += "}";
   int code = http.POST(payload);
   if (code == 200) {
     String resp = http.getString();
+    // 回执已随本次心跳送达
+    _pending_ack = 0;
     // 解析返回 JSON 中的 "command" 和 "target"，实现简单的模拟导航
     // 1) 解析 command 字段: "command":"..."
     int idx = resp.indexOf("\"command\"");
@@ -496,6 +506,25 @@ void pollServerCommands() {
       }
     }
 
+    // 解析 command_id 字段: "command_id":123（IDLE 时为 null）
+    long cmdId = 0;
+    int idIdx = resp.indexOf("\"command_id\"");
+    if (idIdx >= 0) {
+      int colon = resp.indexOf(':', idIdx);
+      if (colon > 0) {
+        cmdId = resp.substring(colon + 1).toInt();
+      }
+    }
+    bool isNewCommand;
+    if (cmdId > 0) {
+      _pending_ack = cmdId;
+      isNewCommand = cmdId != _last_command_id;
+      _last_command_id = cmdId;
+    } else {
+      // 服务器未返回 command_id（IDLE 或旧版服务器）时按命令内容去重
+      isNewCommand = cmd != _last_server_command;
+    }
+
     // 2) 解析 target 字段: "target":{"lat":...,"lng":...}
     if (resp.indexOf("\"target\"") >= 0) {
       int tIdx = resp.indexOf("\"target\"");
@@ -518,7 +547,7 @@ void pollServerCommands() {
     }
 
     // 3) 根据 command 执行动作或更新模拟状态
-    if (cmd.length() > 0 && cmd != _last_server_command) {
+    if (cmd.length() > 0 && isNewCommand) {
       Serial.print("[ServerCmd] "); Serial.println(cmd);
       _last_server_command = cmd;
       if (cmd == "FORWARD") {
@@ -1,124 +1,538 @@
 import os
+import json
 import uuid
-import requests
+import hashlib
+import zipfile
 import logging
 from datetime import datetime
-from flask import Blueprint, current_app, request, jsonify
+import cv2
+import numpy as np
+from flask import Blueprint, current_app, request, jsonify, url_for
+from sqlalchemy import insert
 from database.db import db
 from database.models import DetectTask, DetectItem
-from inference.yolo_detector import YOLODetector
+from database import rollups
+from database.listing import list_tasks
+from inference.model_registry import registry
+from inference.batcher import QueueFullError
+from api.detect_jobs import get_job_pool, JobQueueFullError
+from services.geocoder import get_geocoder
+from services.cache import cached_response
+from services.detection import (
+    detections_changed, ensure_dirs, get_detector, get_batcher, get_tiler, get_dedup, get_tracker,
+    track, infer, infer_tiled, item_rows, new_detections, insert_items, geocell, locate,
+)
+from services.uploads import read_upload
 
 detect_bp = Blueprint("detect_bp", __name__)
 logger = logging.getLogger(__name__)
 
-def _ensure_dirs():
-    upload_dir = current_app.config.get("UPLOAD_DIR", "static/uploads")
-    result_dir = current_app.config.get("RESULT_DIR", "static/results")
-    os.makedirs(upload_dir, exist_ok=True)
-    os.makedirs(result_dir, exist_ok=True)
+ALLOWED_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+def _format_result(detections, track_ids=None):
+    result = [{
+        "class_name": label,
+        "confidence": f"{conf*100:.2f}%",
+        "bbox": bbox
+    } for label, conf, bbox in zip(detections.labels, detections.conf.tolist(),
+                                   detections.xyxy.astype(np.int64).tolist())]
+    if track_ids is not None:
+        for entry, track_id in zip(result, track_ids):
+            entry["track_id"] = track_id
+    return result
+
+def _eager_annotation():
+    return current_app.config.get("EAGER_ANNOTATION", False)
+
+def _annotated_path(task):
+    """标注图地址（不带开头的 /，与 result_path 一致）：检测时保存过标注图的用静态文件，否则用按需渲染接口。"""
+    if task.result_path:
+        return task.result_path
+    return url_for("render_bp.render_task", task_id=task.id).lstrip("/")
+
+@detect_bp.route("/detect/model", methods=["GET"])
+def model_info():
+    return jsonify({"ok": True, **registry.stats()})
+
+@detect_bp.route("/detect/batcher", methods=["GET"])
+def batcher_info():
+    batcher = get_batcher()
+    return jsonify({"ok": True, "enabled": batcher is not None,
+                    "stats": batcher.stats() if batcher else None})
+
+@detect_bp.route("/detect/tiling", methods=["GET"])
+def tiling_info():
+    tiler = get_tiler()
+    return jsonify({"ok": True, "enabled": tiler is not None,
+                    "stats": tiler.stats() if tiler else None})
+
+@detect_bp.route("/detect/dedup", methods=["GET"])
+def dedup_info():
+    dedup = get_dedup()
+    return jsonify({"ok": True, "enabled": dedup is not None,
+                    "stats": dedup.stats() if dedup else None})
+
+@detect_bp.route("/detect/tracker", methods=["GET"])
+def tracker_info():
+    tracker = get_tracker()
+    return jsonify({"ok": True, "enabled": tracker is not None,
+                    "stats": tracker.stats() if tracker else None})
+
+@detect_bp.route("/detect/geocoder", methods=["GET"])
+def geocoder_info():
+    return jsonify({"ok": True, "stats": get_geocoder(current_app._get_current_object()).stats()})
+
+@detect_bp.route("/detect/jobs", methods=["GET"])
+def jobs_info():
+    pool = current_app.extensions.get("detect_jobs")
+    return jsonify({"ok": True, "stats": pool.stats() if pool else None})
+
+@detect_bp.route("/tasks", methods=["GET"])
+@cached_response("detections")
+def list_detect_tasks():
+    """任务列表的 JSON 版本（与 /result 页面相同的游标分页）：
+    ?before=<id> / ?after=<id> 翻页，limit 每页条数（最多 100），count=1 附带近似总数。"""
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    listing = list_tasks(before=request.args.get("before", type=int),
+                         after=request.args.get("after", type=int),
+                         limit=limit, count=request.args.get("count") == "1")
+    return jsonify({"ok": True, **listing})
+
+
+@detect_bp.route("/detect/<int:task_id>", methods=["GET"])
+def get_detection(task_id):
+    task = db.session.get(DetectTask, task_id)
+    if task is None:
+        return jsonify({"ok": False, "message": "任务不存在"}), 404
+
+    out = {"ok": True, "task": task.to_dict()}
+    if task.status == "DONE":
+        items = DetectItem.query.filter_by(task_id=task.id).all()
+        out["items"] = [it.to_dict() for it in items]
+        out["annotated_image_path"] = _annotated_path(task)
+    return jsonify(out)
+
+def _store_upload(path, data):
+    """按内容哈希命名的原图已存在时跳过；先写临时文件再改名，并发上传同一内容也不会留下半个文件。
+    返回是否新写入了文件。"""
+    if os.path.exists(path):
+        return False
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as out:
+        out.write(data)
+    os.replace(tmp, path)
+    return True
+
+def _task_by_content(digest):
+    """同一内容最近一次未失败的任务（失败的任务允许重新检测）。"""
+    return (DetectTask.query
+            .filter(DetectTask.content_hash == digest, DetectTask.status != "FAILED")
+            .order_by(DetectTask.id.desc())
+            .first())
+
+def _existing_task_result(task):
+    """同一内容已有任务时返回的结果；任务未完成时只返回任务状态。"""
+    if task.status != "DONE":
+        return {
+            "ok": True,
+            "status": "accepted",
+            "duplicate_of": task.id,
+            "task_id": task.id,
+            "task": task.to_dict(),
+            "status_url": url_for("detect_bp.get_detection", task_id=task.id)
+        }
+    items = DetectItem.query.filter_by(task_id=task.id).all()
+    return {
+        "ok": True,
+        "status": "success",
+        "duplicate_of": task.id,
+        "task_id": task.id,
+        "result": [{
+            "class_name": it.label,
+            "confidence": f"{(it.confidence or 0)*100:.2f}%",
+            "bbox": [it.x1, it.y1, it.x2, it.y2]
+        } for it in items],
+        "annotated_image_path": _annotated_path(task),
+        "task": task.to_dict()
+    }
+
+def _existing_task_response(task):
+    return jsonify(_existing_task_result(task)), 202 if task.status != "DONE" else 200
 
 @detect_bp.route("/detect", methods=["POST"])
 def run_detection():
-    _ensure_dirs()
+    ensure_dirs()
     
     lat = request.form.get("latitude")
     lng = request.form.get("longitude")
+    device_id = request.form.get("device_id") or None
 
     f = request.files.get("image") or request.files.get("file")
-
-    address_str = "未知地点"
-    if lat and lng:
-        address_str = resolve_address_from_coords(lat, lng)
+    # ?async=1：保存文件、写入 PENDING 任务后立即返回 202，由进程池完成其余工作
+    async_mode = (request.args.get("async") or request.form.get("async")) == "1"
 
     if not f:
         return jsonify({"ok": False, "message": "未收到文件"}), 400
 
+    # 上传内容解析时已读入内存并算好 sha256：原图按内容哈希命名，
+    # 同一张图重复上传（例如机器人超时重试）直接返回已有任务，不再推理
+    data, digest = read_upload(f)
+    previous = _task_by_content(digest)
+    if previous is not None:
+        return _existing_task_response(previous)
+
+    lat = _parse_coord(lat)
+    lng = _parse_coord(lng)
+
+    # 同步模式在内存中解码一次，数组直接交给模型，不再从磁盘读回
+    image = None
+    if not async_mode:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return jsonify({"ok": False, "message": "无法解析图片"}), 400
+
+    # 带 device_id 的同步请求先做近重复判定：与该设备最近推理过的帧几乎相同时直接返回那次的任务
+    dedup = get_dedup() if device_id and image is not None else None
+    if dedup is not None:
+        signature, hit = dedup.lookup(device_id, image, lat, lng)
+        previous = db.session.get(DetectTask, hit[0]) if hit and hit[0] is not None else None
+        if previous is not None:
+            previous_id, detections, track_ids = hit
+            tracker = get_tracker()
+            if tracker is not None and track_ids:
+                # 画面未变，目标仍在视野内：延长这些轨迹
+                tracker.touch(device_id, track_ids)
+            return jsonify({
+                "ok": True,
+                "status": "success",
+                "duplicate_of": previous.id,
+                "result": _format_result(detections, track_ids),
+                "annotated_image_path": _annotated_path(previous),
+                "task": previous.to_dict()
+            })
+
+    address_str, geocode_later = locate(lat, lng)
+
     ext = os.path.splitext(f.filename)[1].lower()
-    save_name = f"{uuid.uuid4().hex}{ext}"
-    
+    save_name = f"{digest}{ext}"
 
     original_abs_path = os.path.join(current_app.config["UPLOAD_DIR"], save_name)
     source_rel_path = f"static/uploads/{save_name}"
     
-    result_abs_path = os.path.join(current_app.config["RESULT_DIR"], save_name)
-    result_rel_path = f"static/results/{save_name}"
-
-    f.save(original_abs_path)
+    # 标注图默认由 /api/render 按需渲染，EAGER_ANNOTATION 时才在检测时保存
+    result_abs_path = result_rel_path = None
+    if _eager_annotation():
+        result_abs_path = os.path.join(current_app.config["RESULT_DIR"], save_name)
+        result_rel_path = f"static/results/{save_name}"
 
+    _store_upload(original_abs_path, data)
 
     task = DetectTask(
         source_type="image", 
         source_path=source_rel_path,
         result_path=result_rel_path,
+        content_hash=digest,
+        device_id=device_id,
         status="PENDING",
-        latitude=float(lat) if lat else None,
-        longitude=float(lng) if lng else None,
+        latitude=lat,
+        longitude=lng,
+        geocell=geocell(lat, lng),
         location=address_str,
         created_at=datetime.now()
     )
-    db.session.add(task)
-    db.session.commit()
 
+    if async_mode:
+        db.session.add(task)
+        db.session.flush()
+        rollups.record_detection(task, [])
+        db.session.commit()
+        detections_changed([(task, [])])
+        if geocode_later:
+            get_geocoder(current_app._get_current_object()).enqueue(task.id, lat, lng)
+        try:
+            get_job_pool(current_app._get_current_object()).submit(
+                task.id, original_abs_path, result_abs_path)
+        except JobQueueFullError as e:
+            task.status = "FAILED"
+            task.error_msg = str(e)
+            db.session.commit()
+            return jsonify({"ok": False, "message": str(e), "task_id": task.id}), 503
+        return jsonify({
+            "ok": True,
+            "status": "accepted",
+            "task_id": task.id,
+            "task": task.to_dict(),
+            "status_url": url_for("detect_bp.get_detection", task_id=task.id)
+        }), 202
+
+    # 同步模式先推理，任务与检测项在同一个事务里一次提交
+    try:
+        detections = infer(image, result_path=result_abs_path)
+    except QueueFullError as e:
+        return jsonify({"ok": False, "message": str(e)}), 503
+    except Exception as e:
+        logger.exception("检测处理失败")
+        task.status = "FAILED"
+        task.error_msg = str(e)
+        db.session.add(task)
+        db.session.flush()
+        rollups.record_detection(task, [])
+        db.session.commit()
+        detections_changed([(task, [])])
+        return jsonify({"ok": False, "message": str(e)}), 500
+
+    # 同一设备前几帧已经写过的目标只更新原检测项，不再新增
+    plan = track(device_id, detections, lat, lng)
     try:
-        project_root = os.path.dirname(current_app.root_path)
-        model_path = os.path.join(project_root, "best.pt")
-        detector = YOLODetector(model_path=model_path if os.path.exists(model_path) else None)
-
-        detections = detector.detect(original_abs_path, save_result=True, result_path=result_abs_path)
-        
-        result_list = []
-        for d in detections:
-            item = DetectItem(
-                task_id=task.id,
-                label=d["label"],
-                confidence=float(d["confidence"]),
-                x1=int(d["bbox"][0]), y1=int(d["bbox"][1]), 
-                x2=int(d["bbox"][2]), y2=int(d["bbox"][3]),
-                area=int((d["bbox"][2]-d["bbox"][0])*(d["bbox"][3]-d["bbox"][1])),
-                handle_state='NEW'
-            )
-            db.session.add(item)
-            
-            result_list.append({
-                "class_name": d["label"],
-                "confidence": f"{d['confidence']*100:.2f}%",
-                "bbox": [int(x1) for x1 in d["bbox"]]
-            })
-        
         task.status = "DONE"
+        db.session.add(task)
+        db.session.flush()
+        insert_items(task.id, detections, plan)
+        labels = new_detections(detections, plan).labels
+        rollups.record_detection(task, labels)
         db.session.commit()
+        detections_changed([(task, labels)])
+    except Exception as e:
+        db.session.rollback()
+        if plan is not None:
+            get_tracker().release(plan)
+        logger.exception("检测结果写库失败")
+        return jsonify({"ok": False, "message": str(e)}), 500
 
-        return jsonify({
-            "ok": True,
-            "status": "success",
-            "result": result_list,
-            "annotated_image_path": result_rel_path,
-            "task": task.to_dict() if hasattr(task, 'to_dict') else {"id": task.id}
-        })
+    track_ids = None
+    if plan is not None:
+        get_tracker().apply(plan)
+        track_ids = plan.track_ids
+    if dedup is not None:
+        dedup.remember(device_id, signature, (task.id, detections, track_ids), lat, lng)
+
+    if geocode_later:
+        get_geocoder(current_app._get_current_object()).enqueue(task.id, lat, lng)
+
+    return jsonify({
+        "ok": True,
+        "status": "success",
+        "result": _format_result(detections, track_ids),
+        "annotated_image_path": _annotated_path(task),
+        "task": task.to_dict()
+    })
+
+def _parse_coord(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _read_zip(f):
+    max_bytes = current_app.config.get("BATCH_ZIP_MAX_BYTES", 200 * 1024 * 1024)
+    uploads = []
+    total = 0
+    with zipfile.ZipFile(f.stream) as zf:
+        for info in zf.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith("."):
+                continue
+            if os.path.splitext(name)[1].lower() not in ALLOWED_IMAGE_EXTS:
+                continue
+            total += info.file_size
+            if total > max_bytes:
+                raise ValueError("压缩包解压后超过大小上限")
+            data = zf.read(info)
+            uploads.append((name, data, hashlib.sha256(data).hexdigest()))
+    return uploads
+
+def _collect_batch_uploads():
+    """收集批量上传的图片，返回 [(filename, bytes, sha256)]；支持多文件字段与 zip 压缩包。"""
+    uploads = []
+    for key in ("images", "files", "image", "file", "archive"):
+        for f in request.files.getlist(key):
+            if not f or not f.filename:
+                continue
+            if os.path.splitext(f.filename)[1].lower() == ".zip":
+                uploads.extend(_read_zip(f))
+            else:
+                uploads.append((f.filename, *read_upload(f)))
+    return uploads
+
+def _batch_coords(filenames):
+    """每张图的经纬度：meta（按顺序的列表或以文件名为键的字典）优先，其次按顺序对应的
+    latitude/longitude 字段；只给一组 latitude/longitude 时对所有图片生效。"""
+    lats = request.form.getlist("latitude")
+    lngs = request.form.getlist("longitude")
+    meta = request.form.get("meta")
+    meta = json.loads(meta) if meta else None
+
+    coords = []
+    for i, name in enumerate(filenames):
+        lat = lng = None
+        if len(lats) == 1 and len(lngs) == 1:
+            lat, lng = _parse_coord(lats[0]), _parse_coord(lngs[0])
+        elif i < len(lats) and i < len(lngs):
+            lat, lng = _parse_coord(lats[i]), _parse_coord(lngs[i])
+
+        entry = None
+        if isinstance(meta, list) and i < len(meta):
+            entry = meta[i]
+        elif isinstance(meta, dict):
+            entry = meta.get(name)
+        if isinstance(entry, dict):
+            lat = _parse_coord(entry.get("latitude", entry.get("lat")))
+            lng = _parse_coord(entry.get("longitude", entry.get("lng")))
+
+        if lat is None or lng is None:
+            lat = lng = None
+        coords.append((lat, lng))
+    return coords
+
+@detect_bp.route("/detect/batch", methods=["POST"])
+def run_batch_detection():
+    ensure_dirs()
+    # 多图/zip 上传使用单独的请求体上限（MAX_CONTENT_LENGTH 按单张图片设置）
+    request.max_content_length = current_app.config.get("BATCH_MAX_CONTENT_LENGTH", 100 * 1024 * 1024)
+
+    try:
+        uploads = _collect_batch_uploads()
+        coords = _batch_coords([name for name, _, _ in uploads])
+    except (zipfile.BadZipFile, ValueError) as e:
+        return jsonify({"ok": False, "message": f"无法读取上传内容: {e}"}), 400
+
+    if not uploads:
+        return jsonify({"ok": False, "message": "未收到文件"}), 400
+    max_files = current_app.config.get("BATCH_UPLOAD_MAX_FILES", 100)
+    if len(uploads) > max_files:
+        return jsonify({"ok": False, "message": f"单次最多上传 {max_files} 张图片"}), 400
 
+    results = [None] * len(uploads)
+    entries = []
+    by_digest = {}
+    eager = _eager_annotation()
+    for i, (name, data, digest) in enumerate(uploads):
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in ALLOWED_IMAGE_EXTS:
+            results[i] = {"filename": name, "ok": False, "message": "不支持的文件类型"}
+            continue
+        # 与单张上传相同：按内容哈希去重，已检测过的图片（或本批中重复的图片）不再推理
+        if digest in by_digest:
+            by_digest[digest]["duplicates"].append(i)
+            continue
+        previous = _task_by_content(digest)
+        if previous is not None:
+            results[i] = {"filename": name, **_existing_task_result(previous)}
+            continue
+        # 先在内存中解码：损坏的图片只让这一张失败，不会让整块批量前向报错
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            results[i] = {"filename": name, "ok": False, "message": "无法解析图片"}
+            continue
+        save_name = f"{digest}{ext}"
+        entries.append(by_digest.setdefault(digest, {
+            "index": i,
+            "duplicates": [],
+            "filename": name,
+            "digest": digest,
+            "data": data,
+            "image": image,
+            "source_abs_path": os.path.join(current_app.config["UPLOAD_DIR"], save_name),
+            "result_abs_path": os.path.join(current_app.config["RESULT_DIR"], save_name) if eager else None,
+            "source_path": f"static/uploads/{save_name}",
+            "result_path": f"static/results/{save_name}" if eager else None,
+            "lat": coords[i][0],
+            "lng": coords[i][1],
+        }))
+
+    written_files = []
+    try:
+        # 按 BATCH_MAX_SIZE 分块做批量前向；开启切片推理时大图逐张切片
+        detector = get_detector()
+        chunk = max(1, current_app.config.get("BATCH_MAX_SIZE", 8))
+        min_conf = current_app.config.get("DETECT_MIN_CONFIDENCE", 0.0)
+        tiler = get_tiler()
+        full_frame = entries
+        if tiler is not None:
+            full_frame = []
+            for e in entries:
+                if tiler.applies(e["image"]):
+                    e["detections"] = infer_tiled(tiler, e["image"], e["result_abs_path"])
+                else:
+                    full_frame.append(e)
+        for start in range(0, len(full_frame), chunk):
+            part = full_frame[start:start + chunk]
+            predictions = detector.predict([e["image"] for e in part])
+            for e, result in zip(part, predictions):
+                if eager:
+                    detector.save_annotated(result, e["result_abs_path"])
+                e["detections"] = detector.parse_arrays(result).filter(min_conf)
+
+        # 推理成功后才保存原图（按内容哈希命名，已存在的文件不重复写入）
+        for e in entries:
+            if _store_upload(e["source_abs_path"], e["data"]):
+                written_files.append(e["source_abs_path"])
+
+        addresses = {}
+        for e in entries:
+            if (e["lat"], e["lng"]) not in addresses:
+                addresses[(e["lat"], e["lng"])] = locate(e["lat"], e["lng"])
+
+        # 所有任务与检测项在同一个事务中写入
+        now = datetime.now()
+        tasks = [DetectTask(
+            source_type="image",
+            source_path=e["source_path"],
+            result_path=e["result_path"],
+            content_hash=e["digest"],
+            status="DONE",
+            latitude=e["lat"],
+            longitude=e["lng"],
+            geocell=geocell(e["lat"], e["lng"]),
+            location=addresses[(e["lat"], e["lng"])][0],
+            created_at=now
+        ) for e in entries]
+        db.session.add_all(tasks)
+        db.session.flush()
+
+        rows = []
+        for e, task in zip(entries, tasks):
+            rows.extend(item_rows(task.id, e["detections"]))
+        if rows:
+            db.session.execute(insert(DetectItem), rows)
+        written = [(task, e["detections"].labels) for e, task in zip(entries, tasks)]
+        rollups.record_detections(written)
+        db.session.commit()
+        detections_changed(written)
     except Exception as e:
         db.session.rollback()
-        logger.exception("检测处理失败")
+        logger.exception("批量检测处理失败")
+        for path in written_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
         return jsonify({"ok": False, "message": str(e)}), 500
-    
+
+    geocoder = get_geocoder(current_app._get_current_object())
+    for e, task in zip(entries, tasks):
+        if addresses[(e["lat"], e["lng"])][1]:
+            geocoder.enqueue(task.id, e["lat"], e["lng"])
+        results[e["index"]] = {
+            "filename": e["filename"],
+            "ok": True,
+            "task_id": task.id,
+            "result": _format_result(e["detections"]),
+            "annotated_image_path": _annotated_path(task),
+        }
+        for i in e["duplicates"]:
+            results[i] = {**results[e["index"]], "filename": uploads[i][0], "duplicate_of": task.id}
+
+    return jsonify({
+        "ok": True,
+        "count": len(uploads),
+        "succeeded": sum(1 for r in results if r["ok"]),
+        "results": results
+    })
+
 def resolve_address_from_coords(lat, lng):
     if not lat or not lng:
         return "未知地点"
-    
-    try:
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lng}&zoom=10&addressdetails=1"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (compatible; DetectApp/1.0; +http://yourdomain.com/)"
-        }
-
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            address = data.get("display_name", "未知地点")
-            return address
-        else:
-            return f"坐标： {lat}, {lng} (无法解析地址)"
-        
-    except Exception as e:
-        logger.exception("地址解析失败")
-        return f"坐标： {lat}, {lng} (解析地址失败)"
+    return get_geocoder(current_app._get_current_object()).resolve(lat, lng)
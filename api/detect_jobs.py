@@ -0,0 +1,163 @@
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import Config
+from database.db import db
+from database.models import DetectTask
+from database import rollups
+from services.cache import versions
+from services.detection import infer, insert_items, detections_changed
+
+logger = logging.getLogger(__name__)
+
+# 进程池 worker 内的 Flask 应用（由 _init_worker 创建，每个进程一份）
+_worker_app = None
+
+
+class JobQueueFullError(RuntimeError):
+    pass
+
+
+def _init_worker(config):
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app(config)
+
+
+def _run_job(task_id, source_abs_path, result_abs_path):
+    """在 worker 进程中执行：RUNNING -> 推理/写库 -> DONE 或 FAILED（地址由 Web 进程的地理编码器补全）。"""
+    with _worker_app.app_context():
+        task = db.session.get(DetectTask, task_id)
+        if task is None:
+            return task_id, "MISSING", []
+        task.status = "RUNNING"
+        db.session.commit()
+
+        labels = []
+        try:
+            detections = infer(source_abs_path, result_path=result_abs_path)
+            labels = detections.labels
+            insert_items(task.id, detections)
+            rollups.record_detection(task, labels, new_task=False)
+            task.status = "DONE"
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("异步检测任务 %s 失败", task_id)
+            task = db.session.get(DetectTask, task_id)
+            task.status = "FAILED"
+            task.error_msg = str(e)
+            db.session.commit()
+            labels = []
+        return task_id, task.status, labels
+
+
+class DetectJobPool:
+    """有界的检测进程池：CPU 密集的推理分散到多个进程，HTTP worker 立即返回。"""
+
+    def __init__(self, app, max_workers=2, max_pending=64):
+        self.app = app
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        # worker 沿用父进程的运行时配置（数据库、目录、模型路径等）
+        self._worker_config = {k: app.config[k] for k in dir(Config) if k.isupper() and k in app.config}
+        self._executor = self._new_executor()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.done = 0
+        self.failed = 0
+
+    def _new_executor(self):
+        # spawn 避免 fork 时继承父进程的线程与数据库连接
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self._worker_config,),
+        )
+
+    def submit(self, task_id, source_abs_path, result_abs_path):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFullError("检测任务队列已满，请稍后重试")
+            self._pending += 1
+            self.submitted += 1
+        try:
+            future = self._executor.submit(_run_job, task_id, source_abs_path, result_abs_path)
+        except BrokenProcessPool:
+            # 有 worker 异常退出后整个池不可用，重建后重试一次
+            logger.warning("检测进程池已损坏，重建进程池")
+            self._executor = self._new_executor()
+            try:
+                future = self._executor.submit(_run_job, task_id, source_abs_path, result_abs_path)
+            except Exception:
+                with self._lock:
+                    self._pending -= 1
+                raise
+        future.add_done_callback(lambda f: self._on_done(task_id, f))
+        return future
+
+    def _on_done(self, task_id, future):
+        with self._lock:
+            self._pending -= 1
+        labels = []
+        try:
+            _, status, labels = future.result()
+            error = None
+        except Exception as e:
+            # worker 进程崩溃等情况，任务状态由父进程兜底
+            logger.exception("异步检测任务 %s 未能完成", task_id)
+            status = "FAILED"
+            error = str(e) or e.__class__.__name__
+        # worker 进程里的写库不会触达本进程的版本号与订阅者，在这里代为通知
+        with self.app.app_context():
+            task = db.session.get(DetectTask, task_id)
+            if task is not None:
+                if error is not None:
+                    task.status = "FAILED"
+                    task.error_msg = error
+                    db.session.commit()
+                detections_changed([(task, labels)])
+            else:
+                versions.bump("detections")
+        with self._lock:
+            if status == "DONE":
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "submitted": self.submitted,
+                "done": self.done,
+                "failed": self.failed,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_pool_lock = threading.Lock()
+
+
+def get_job_pool(app):
+    pool = app.extensions.get("detect_jobs")
+    if pool is None:
+        with _pool_lock:
+            pool = app.extensions.get("detect_jobs")
+            if pool is None:
+                pool = DetectJobPool(
+                    app,
+                    max_workers=app.config.get("DETECT_WORKERS", 2),
+                    max_pending=app.config.get("DETECT_QUEUE_LIMIT", 64),
+                )
+                app.extensions["detect_jobs"] = pool
+    return pool
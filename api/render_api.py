@@ -0,0 +1,83 @@
+import io
+import os
+import hashlib
+
+import cv2
+from flask import Blueprint, current_app, request, jsonify, send_file
+from sqlalchemy import select
+
+from database.db import db
+from database.models import DetectTask, DetectItem
+from inference.annotate import FORMATS, render
+from services.render_cache import get_render_cache
+
+render_bp = Blueprint("render_bp", __name__)
+
+
+def _snap_width(width):
+    """请求宽度向上取到 RENDER_WIDTHS 中最近的一档，限制缓存里的尺寸种类；超过最大档按原图渲染。"""
+    if not width or width <= 0:
+        return None
+    for w in sorted(current_app.config.get("RENDER_WIDTHS", [160, 320, 640, 1280])):
+        if width <= w:
+            return w
+    return None
+
+
+@render_bp.route("/render/<int:task_id>", methods=["GET"])
+def render_task(task_id):
+    """按数据库中的检测项在原图上画框，返回标注图。
+
+    - ?w=320：缩略图宽度（向上取到 RENDER_WIDTHS 的一档，不放大）；不传为原尺寸；
+    - ?format=webp：输出格式 jpeg（默认）或 webp。
+
+    ETag 由原图与检测项内容决定，检测项不变时同一 URL 的响应不变；渲染结果写入磁盘 LRU 缓存。
+    """
+    fmt = (request.args.get("format") or "jpeg").lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in FORMATS:
+        return jsonify({"ok": False, "message": f"不支持的格式 {fmt}"}), 400
+    width = _snap_width(request.args.get("w", type=int))
+
+    task = db.session.get(DetectTask, task_id)
+    if task is None or not task.source_path:
+        return jsonify({"ok": False, "message": "任务不存在"}), 404
+    items = db.session.execute(
+        select(DetectItem.label, DetectItem.confidence, DetectItem.x1, DetectItem.y1, DetectItem.x2, DetectItem.y2)
+        .where(DetectItem.task_id == task_id)
+        .order_by(DetectItem.id)
+    ).all()
+
+    ext, mimetype, _ = FORMATS[fmt]
+    quality = current_app.config.get("RENDER_WEBP_QUALITY" if fmt == "webp" else "RENDER_JPEG_QUALITY", 85)
+    key = hashlib.sha256(repr((task.source_path, width, fmt, quality, [tuple(r) for r in items])).encode()).hexdigest()[:40]
+    max_age = current_app.config.get("RENDER_CACHE_MAX_AGE", 3600)
+
+    # 浏览器已有同一内容：不读缓存也不渲染
+    if request.if_none_match.contains(key):
+        resp = current_app.response_class(status=304)
+        resp.set_etag(key)
+        resp.cache_control.public = True
+        resp.cache_control.max_age = max_age
+        return resp
+
+    cache = get_render_cache(current_app._get_current_object())
+    name = key + ext
+    path = cache.get(name)
+    if path is not None:
+        return send_file(path, mimetype=mimetype, etag=key, max_age=max_age, conditional=True)
+
+    image = cv2.imread(os.path.join(current_app.config["UPLOAD_DIR"], os.path.basename(task.source_path)),
+                       cv2.IMREAD_COLOR)
+    if image is None:
+        return jsonify({"ok": False, "message": "原图不存在"}), 404
+    data = render(image, [(r.x1, r.y1, r.x2, r.y2) for r in items], [r.label for r in items],
+                  [r.confidence or 0.0 for r in items], width=width, fmt=fmt, quality=quality)
+    cache.put(name, data)
+    return send_file(io.BytesIO(data), mimetype=mimetype, etag=key, max_age=max_age, conditional=True)
+
+
+@render_bp.route("/render/cache", methods=["GET"])
+def render_cache_info():
+    return jsonify({"ok": True, **get_render_cache(current_app._get_current_object()).stats()})
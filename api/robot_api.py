@@ -1,12 +1,103 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from database.models import Robot
 from database.db import db
+import time
 from datetime import datetime
+from services.cache import cached_response, versions
+from services.pubsub import broker
+from services.robot_state import get_robot_state, public_state
+from services.command_queue import get_command_queue
+from services.liveness import get_liveness
+from services.camera_ingest import get_camera_ingest
 
 robot_bp = Blueprint('robot_bp', __name__)
 
-# timeout in seconds after which a robot is considered offline
-HEARTBEAT_TIMEOUT = 15
+
+def _store():
+    return get_robot_state(current_app._get_current_object())
+
+
+def _liveness():
+    app = current_app._get_current_object()
+    return get_liveness(app, get_robot_state(app))
+
+
+def _commands():
+    return get_command_queue(current_app._get_current_object())
+
+
+def _robot_changed(state):
+    # 状态变化后调用：失效读缓存，并把最新状态推送给 /api/stream 的订阅者
+    versions.bump("robots")
+    broker.publish("robot", state)
+
+
+def live_robots():
+    """从状态存储读取全部机器人（纯读取）；超过 HEARTBEAT_TIMEOUT 未心跳的由在线状态监视在后台置为 OFFLINE。"""
+    _liveness()
+    return _store().all()
+
+
+def _ack(state, acks):
+    if acks is None:
+        return
+    try:
+        _commands().ack(state["id"], acks if isinstance(acks, list) else [acks])
+    except (TypeError, ValueError):
+        pass
+
+
+def _claim(state, force=False):
+    """认领下一条命令。状态存储中记录了是否有待投递命令，没有时不查询命令表（force 除外）。"""
+    store = _store()
+    if not force and not store.has_commands(state):
+        return None
+    mark = state.get("_cmd_mark")
+    cmd, outstanding = _commands().claim(state["id"])
+    if not outstanding:
+        store.commands_drained(state["device_id"], mark)
+    return cmd
+
+
+def _reply(state, cmd):
+    target = state["target"]
+    if cmd and cmd["target"]["lat"] is not None:
+        target = cmd["target"]
+    return {
+        "ok": True,
+        "command": cmd["command"] if cmd else "IDLE",
+        "command_id": cmd["id"] if cmd else None,
+        "target": target
+    }
+
+
+def _command_reply(state, data):
+    """处理心跳中捎带的回执（ack），并认领下一条命令，返回给机器人的响应。"""
+    _ack(state, data.get('ack'))
+    return _reply(state, _claim(state))
+
+
+def _enqueue(robot, command, target_lat=None, target_lng=None, ttl=None):
+    """命令写入 robot_command 队列（入队即唤醒该机器人的长轮询），并提示状态存储在下一次心跳时认领。"""
+    queued = _commands().enqueue(robot.id, command, target_lat, target_lng, ttl=ttl)
+    state = _store().mark_commands(robot.device_id, command)
+    if state is not None:
+        _robot_changed(state)
+    return queued
+
+
+def _ttl(data):
+    """请求中的命令有效期（秒），缺省为 None（使用 COMMAND_TTL）；不是非负数时抛出 ValueError。"""
+    ttl = data.get('ttl')
+    if ttl is None:
+        return None
+    if isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or ttl < 0:
+        raise ValueError("ttl 无效")
+    return ttl
+
+
+def _client_ip():
+    return request.headers.get('X-Real-IP') or request.headers.get('X-Forwarded-For') or request.remote_addr
 
 # 1. 心跳同步：仅允许手动注册过的设备更新
 @robot_bp.route('/heartbeat', methods=['POST'])
@@ -14,40 +105,33 @@ def robot_heartbeat():
     data = request.json
     did = data.get('device_id')
     
-    # 查找机器人，如果不存在则返回错误（因为你要求手动注册）
-    robot = Robot.query.filter_by(device_id=did).first()
-    if not robot:
-        return jsonify({"ok": False, "msg": "设备未注册"}), 403
-    
-    # 更新动态数据
-    robot.current_lat = data.get('lat')
-    robot.current_lng = data.get('lng')
+    # 心跳只更新内存中的状态存储，位置/电量/心跳时间由后台定期批量写回数据库
+    fields = {
+        "lat": data.get('lat'),
+        "lng": data.get('lng'),
+        "status": data.get('status', 'ONLINE'),
+        "last_heartbeat": datetime.now().isoformat(),
+    }
     # record battery if provided
     if data.get('battery') is not None:
         try:
-            robot.battery = int(data.get('battery'))
+            fields["battery"] = int(data.get('battery'))
         except Exception:
             pass
-    robot.status = data.get('status', 'ONLINE')
     # detect ip from headers (useful when robots connect over wifi)
-    ip = request.headers.get('X-Real-IP') or request.headers.get('X-Forwarded-For') or request.remote_addr
+    ip = _client_ip()
     if ip:
-        robot.ip_address = ip
-    robot.last_heartbeat = datetime.now()
-    # grab pending command then clear it so it won't be re-delivered
-    cmd = robot.next_command or "IDLE"
-    robot.next_command = None
-    db.session.commit()
+        fields["ip_address"] = ip
 
-    # 返回指令给机器人上位机
-    return jsonify({
-        "ok": True,
-        "command": cmd,
-        "target": {
-            "lat": robot.target_lat,
-            "lng": robot.target_lng
-        }
-    })
+    # 查找机器人，如果不存在则返回错误（因为你要求手动注册）
+    state = _store().heartbeat(did, fields)
+    if state is None:
+        return jsonify({"ok": False, "msg": "设备未注册"}), 403
+    _liveness().touch(state)
+    _robot_changed(public_state(state))
+
+    # 返回指令给机器人上位机；机器人执行后可在下一次心跳的 ack 字段或 /ack 回执 command_id
+    return jsonify(_command_reply(state, data))
 
 
 # 更丰富的实时状态上报（可由机器人通过 wifi 定期 POST）
@@ -55,47 +139,42 @@ def robot_heartbeat():
 def update_robot_status():
     data = request.json or {}
     did = data.get('device_id')
-    robot = Robot.query.filter_by(device_id=did).first()
-    if not robot:
-        return jsonify({"ok": False, "msg": "设备未注册"}), 403
 
     # 更新位置、电量、状态
+    fields = {"last_heartbeat": datetime.now().isoformat()}
     if 'lat' in data and 'lng' in data:
-        robot.current_lat = data.get('lat')
-        robot.current_lng = data.get('lng')
+        fields["lat"] = data.get('lat')
+        fields["lng"] = data.get('lng')
     if 'battery' in data:
         try:
-            robot.battery = int(data.get('battery'))
+            fields["battery"] = int(data.get('battery'))
         except Exception:
             pass
     if 'status' in data:
-        robot.status = data.get('status')
+        fields["status"] = data.get('status')
 
     # ip address from request
-    ip = request.headers.get('X-Real-IP') or request.headers.get('X-Forwarded-For') or request.remote_addr
+    ip = _client_ip()
     if ip:
-        robot.ip_address = ip
+        fields["ip_address"] = ip
+
+    state = _store().heartbeat(did, fields)
+    if state is None:
+        return jsonify({"ok": False, "msg": "设备未注册"}), 403
 
     # optional config/sensors matrix: when provided merge into config text
     if data.get('config'):
         try:
-            # store as plain text JSON string (existing `config` column is Text)
-            robot.config = data.get('config')
+            # store as plain text JSON string (existing `config` column is Text); 配置上报较少，直接写库
+            Robot.query.filter_by(device_id=did).update({"config": data.get('config')})
+            db.session.commit()
         except Exception:
-            pass
-
-    robot.last_heartbeat = datetime.now()
-    # grab pending command then clear it so it won't be re-delivered
-    cmd = robot.next_command or "IDLE"
-    robot.next_command = None
-    db.session.commit()
+            db.session.rollback()
+    _liveness().touch(state)
+    _robot_changed(public_state(state))
 
     # Respond with any pending command and target
-    return jsonify({
-        "ok": True,
-        "command": cmd,
-        "target": {"lat": robot.target_lat, "lng": robot.target_lng}
-    })
+    return jsonify(_command_reply(state, data))
 
 # 2. 手动注册机器人
 @robot_bp.route('/register', methods=['POST'])
@@ -114,6 +193,9 @@ def register_robot():
     new_robot = Robot(device_id=device_id, name=name, status='OFFLINE')
     db.session.add(new_robot)
     db.session.commit()
+    store = _store()
+    store.put(new_robot)
+    _robot_changed(store.get(device_id))
     return jsonify({"ok": True})
 
 # 3. 删除机器人
@@ -121,8 +203,19 @@ def register_robot():
 def delete_robot(robot_id):
     robot = Robot.query.get(robot_id)
     if robot:
+        removed = {"id": robot.id, "device_id": robot.device_id}
+        _commands().delete_robot(robot.id)
         db.session.delete(robot)
         db.session.commit()
+        _store().remove(removed["device_id"])
+        _liveness().forget(removed["device_id"])
+        get_camera_ingest(current_app._get_current_object()).stop(removed["device_id"])
+        for name in ("frame_dedup", "tracker"):
+            per_device = current_app.extensions.get(name)
+            if per_device is not None:
+                per_device.forget(removed["device_id"])
+        versions.bump("robots")
+        broker.publish("robot_removed", removed)
         return jsonify({"ok": True})
     return jsonify({"ok": False, "msg": "未找到设备"})
 
@@ -133,71 +226,130 @@ def navigate_robot():
     robot = Robot.query.get(data.get('id'))
     if not robot:
         return jsonify({"ok": False, "msg": "机器人不存在"})
+    try:
+        ttl = _ttl(data)
+    except ValueError as e:
+        return jsonify({"ok": False, "msg": str(e)}), 400
 
     robot.target_lat = data.get('lat')
     robot.target_lng = data.get('lng')
-    robot.next_command = "NAVIGATE" 
     db.session.commit()
-    return jsonify({"ok": True, "msg": "目标已锁定"})
+    _store().update(robot.device_id, {"target": {"lat": robot.target_lat, "lng": robot.target_lng}})
+    queued = _enqueue(robot, "NAVIGATE", robot.target_lat, robot.target_lng, ttl=ttl)
+    return jsonify({"ok": True, "msg": "目标已锁定", "command_id": queued["id"]})
 
 # 5. 远程控制 (抓取、复位、停机)
 @robot_bp.route('/control', methods=['POST'])
 def control_robot():
     data = request.json
     robot = Robot.query.get(data.get('id'))
-    if robot:
-        robot.next_command = data.get('command')
-        db.session.commit()
-        return jsonify({"ok": True})
+    if robot and data.get('command'):
+        try:
+            ttl = _ttl(data)
+        except ValueError as e:
+            return jsonify({"ok": False, "msg": str(e)}), 400
+        # 命令进入队列按顺序投递，多条命令不会互相覆盖
+        queued = _enqueue(robot, data.get('command'), ttl=ttl)
+        return jsonify({"ok": True, "command_id": queued["id"]})
     return jsonify({"ok": False})
 
 
+# 命令回执：机器人执行完命令后上报 command_id（也可在下一次心跳的 ack 字段中捎带）
+@robot_bp.route('/ack', methods=['POST'])
+def ack_command():
+    data = request.json or {}
+    state = _store().get(data.get('device_id'))
+    if not state:
+        return jsonify({"ok": False, "msg": "设备未注册"}), 403
+    ids = data.get('command_ids') or [data.get('command_id')]
+    try:
+        acked = _commands().ack(state["id"], ids)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "msg": "command_id 无效"}), 400
+    return jsonify({"ok": True, "acked": acked})
+
+
+# 长轮询取命令：没有待投递命令时挂起，直到 control/navigate 入队或 wait 秒超时。
+# 机器人可以用它接收命令，同时把心跳间隔放长；ack 参数可捎带回执（逗号分隔的 command_id）。
+@robot_bp.route('/<device_id>/commands', methods=['GET'])
+def poll_commands(device_id):
+    store = _store()
+    state = store.get(device_id, internal=True)
+    if not state:
+        return jsonify({"ok": False, "msg": "设备未注册"}), 403
+    if request.args.get('ack'):
+        _ack(state, request.args.get('ack').split(','))
+
+    # 挂起中的长轮询说明设备在线，刷新心跳时间
+    fields = {"last_heartbeat": datetime.now().isoformat()}
+    if state.get("status") == "OFFLINE":
+        fields["status"] = "ONLINE"
+    alive = store.update(device_id, fields)
+    if _liveness().touch(alive) or "status" in fields:
+        _robot_changed(alive)
+
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        wait = 0
+    wait = max(0.0, min(wait, current_app.config.get("COMMAND_POLL_MAX_WAIT", 30)))
+    recheck = current_app.config.get("COMMAND_POLL_RECHECK", 1.0)
+    notifier = _commands().notifier
+    deadline = time.monotonic() + wait
+
+    force = False
+    while True:
+        generation = notifier.generation(state["id"])
+        cmd = _claim(state, force=force)
+        if cmd:
+            return jsonify(_reply(state, cmd))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return jsonify(_reply(state, None))
+        # 同进程入队会立即唤醒；其他进程入队（共享状态后端）按 recheck 间隔通过状态存储发现
+        force = notifier.wait(state["id"], generation, min(remaining, recheck))
+        state = store.get(device_id, internal=True)
+        if state is None:
+            return jsonify({"ok": False, "msg": "设备未注册"}), 403
+
+
+# 摄像头视频流接入：服务端连接机器人的 MJPEG /stream，按目标帧率检测，出现新目标的帧写成检测任务。
+# url 缺省时按 CAMERA_STREAM_URL 与机器人上报的 IP 拼出；fps 缺省为 CAMERA_TARGET_FPS。
+@robot_bp.route('/<device_id>/camera/start', methods=['POST'])
+def start_camera(device_id):
+    data = request.json or {}
+    if not _store().get(device_id):
+        return jsonify({"ok": False, "msg": "设备未注册"}), 403
+    try:
+        stream = get_camera_ingest(current_app._get_current_object()).start(
+            device_id, url=data.get('url'), fps=data.get('fps'))
+    except ValueError as e:
+        return jsonify({"ok": False, "msg": str(e)}), 400
+    return jsonify({"ok": True, "stream": stream})
+
+
+@robot_bp.route('/<device_id>/camera/stop', methods=['POST'])
+def stop_camera(device_id):
+    stopped = get_camera_ingest(current_app._get_current_object()).stop(device_id)
+    return jsonify({"ok": stopped, "msg": None if stopped else "未在接入该设备的视频流"})
+
+
+@robot_bp.route('/camera', methods=['GET'])
+def camera_streams():
+    return jsonify({"ok": True, "streams": get_camera_ingest(current_app._get_current_object()).stats()})
+
+
 # 6. 列表查询（前端用于显示实时位置、状态）
 @robot_bp.route('/list', methods=['GET'])
+@cached_response("robots")
 def list_robots():
-    robots = Robot.query.all()
-    out = []
-    now = datetime.now()
-    to_update = []
-    for r in robots:
-        resp_status = r.status
-        # evaluate offline by last_heartbeat
-        if r.last_heartbeat:
-            age = (now - r.last_heartbeat).total_seconds()
-            if age > HEARTBEAT_TIMEOUT:
-                resp_status = 'OFFLINE'
-                if r.status != 'OFFLINE':
-                    r.status = 'OFFLINE'
-                    to_update.append(r)
-        else:
-            # never heartbeated -> treat as offline
-            resp_status = 'OFFLINE'
-            if r.status != 'OFFLINE':
-                r.status = 'OFFLINE'
-                to_update.append(r)
-
-        out.append({
-            "id": r.id,
-            "device_id": r.device_id,
-            "name": r.name,
-            "status": resp_status,
-            "lat": getattr(r, 'current_lat', None),
-            "lng": getattr(r, 'current_lng', None),
-            "battery": getattr(r, 'battery', None),
-            "ip_address": r.ip_address,
-            "last_heartbeat": (r.last_heartbeat.isoformat() if r.last_heartbeat else None),
-            "next_command": r.next_command,
-            "target": {"lat": r.target_lat, "lng": r.target_lng}
-        })
-
-    # persist any status changes
-    if to_update:
-        try:
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+    return jsonify({"ok": True, "robots": live_robots()})
+
 
-    return jsonify({"ok": True, "robots": out})
+@robot_bp.route('/state', methods=['GET'])
+def robot_state_stats():
+    return jsonify({"ok": True, "stats": _store().stats(), "commands": _commands().stats(),
+                    "liveness": _liveness().stats()})
 
 
 # 管理端修改机器人信息（名称/配置/状态等）
@@ -209,17 +361,21 @@ def update_robot():
     if not robot:
         return jsonify({"ok": False, "msg": "机器人不存在"}), 404
 
+    # 只把管理端修改的字段同步到状态存储，位置/电量等以存储中的实时值为准
+    fields = {}
     if 'name' in data:
-        robot.name = data.get('name')
+        robot.name = fields["name"] = data.get('name')
     if 'status' in data:
-        robot.status = data.get('status')
+        robot.status = fields["status"] = data.get('status')
     if 'target_lat' in data and 'target_lng' in data:
         robot.target_lat = data.get('target_lat')
         robot.target_lng = data.get('target_lng')
-    if 'next_command' in data:
-        robot.next_command = data.get('next_command')
+        fields["target"] = {"lat": robot.target_lat, "lng": robot.target_lng}
     if 'config' in data:
         robot.config = data.get('config')
 
     db.session.commit()
+    _robot_changed(_store().update(robot.device_id, fields))
+    if data.get('next_command'):
+        _enqueue(robot, data.get('next_command'))
     return jsonify({"ok": True})
\ No newline at end of file
@@ -1,82 +1,60 @@
-from flask import Blueprint, jsonify
-from sqlalchemy import func
-from database.models import DetectTask, DetectItem, Robot
+from collections import Counter
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import select, func, and_, or_
+from database.models import DetectTask, StatsDaily, StatsLabel, StatsTaskLabels
 from database.db import db
+from services import geohash
+from services.cache import cached_response, response_cache
+from api.robot_api import live_robots
 from datetime import datetime, timedelta
 
 stats_bp = Blueprint("stats_bp", __name__)
 
 @stats_bp.route("/summary")
+@cached_response("detections", "robots")
 def get_stats_summary():
     try:
-        # 1. 垃圾分布地图点位
-        tasks = DetectTask.query.filter(DetectTask.latitude.isnot(None)).all()
-        locations = []
-        for t in tasks:
-            types = list(set([item.label for item in t.items]))
-            locations.append({
-                "id": t.id,
-                "lat": t.latitude,
-                "lng": t.longitude,
-                "trash_types": ", ".join(types) if types else "未知"
-            })
+        # 以下三项只读汇总表（写库时增量维护，见 database/rollups.py）
+        # 1. 垃圾分布地图点位：已废弃，保留一个版本供外部调用方迁移到 /api/stats/map；
+        #    只返回最近 SUMMARY_LOCATIONS_LIMIT 个点，不再随数据量无限增长
+        limit = current_app.config.get("SUMMARY_LOCATIONS_LIMIT", 1000)
+        rows = db.session.query(StatsTaskLabels.task_id, StatsTaskLabels.latitude,
+                                StatsTaskLabels.longitude, StatsTaskLabels.labels)\
+            .order_by(StatsTaskLabels.task_id.desc()).limit(limit).all() if limit > 0 else []
+        locations = [{
+            "id": row.task_id,
+            "lat": row.latitude,
+            "lng": row.longitude,
+            "trash_types": row.labels or "未知"
+        } for row in rows]
 
         # 2. 垃圾种类分布 (饼图)
-        label_counts = db.session.query(
-            DetectItem.label, func.count(DetectItem.id)
-        ).group_by(DetectItem.label).all()
+        label_counts = db.session.query(StatsLabel.label, StatsLabel.item_count)\
+            .filter(StatsLabel.item_count > 0).all()
         pie_data = [{"name": row[0], "value": row[1]} for row in label_counts]
 
         # 3. 近期捡拾数量趋势
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        trend_counts = db.session.query(
-            func.date(DetectTask.created_at).label('date'),
-            func.count(DetectTask.id)
-        ).filter(DetectTask.created_at >= seven_days_ago)\
-         .group_by('date').order_by('date').all()
+        seven_days_ago = (datetime.now() - timedelta(days=7)).date()
+        trend_counts = db.session.query(StatsDaily.day, StatsDaily.task_count)\
+            .filter(StatsDaily.day >= seven_days_ago)\
+            .order_by(StatsDaily.day).all()
         
         line_data = {
             "labels": [str(row[0]) for row in trend_counts],
             "values": [row[1] for row in trend_counts]
         }
 
-        # 4. 机器人状态与电量（动态评估 online/offline）
-        robots = Robot.query.all()
-        robot_list = []
-        now = datetime.now()
-        to_update = []
-        TIMEOUT = 3
-        for r in robots:
-            resp_status = r.status
-            if r.last_heartbeat:
-                age = (now - r.last_heartbeat).total_seconds()
-                if age > TIMEOUT:
-                    resp_status = 'OFFLINE'
-                    if r.status != 'OFFLINE':
-                        r.status = 'OFFLINE'
-                        to_update.append(r)
-            else:
-                resp_status = 'OFFLINE'
-                if r.status != 'OFFLINE':
-                    r.status = 'OFFLINE'
-                    to_update.append(r)
-
-            robot_list.append({
-                "device_id": r.device_id,
-                "name": r.name,
-                "status": resp_status,
-                "battery": getattr(r, 'battery', 75),
-                "lat": getattr(r, 'current_lat', None),
-                "lng": getattr(r, 'current_lng', None),
-                "ip_address": r.ip_address,
-                "last_heartbeat": (r.last_heartbeat.isoformat() if r.last_heartbeat else None)
-            })
-
-        if to_update:
-            try:
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
+        # 4. 机器人状态与电量（读内存状态存储，离线由后台在线状态监视标记）
+        robot_list = [{
+            "device_id": r["device_id"],
+            "name": r["name"],
+            "status": r["status"],
+            "battery": r.get("battery", 75),
+            "lat": r.get("lat"),
+            "lng": r.get("lng"),
+            "ip_address": r.get("ip_address"),
+            "last_heartbeat": r.get("last_heartbeat")
+        } for r in live_robots()]
 
         return jsonify({
             "ok": True,
@@ -86,4 +64,91 @@ def get_stats_summary():
             "robot_list": robot_list
         })
     except Exception as e:
-        return jsonify({"ok": False, "error": str(e)})
\ No newline at end of file
+        return jsonify({"ok": False, "error": str(e)})
+
+
+def _parse_bbox(value):
+    try:
+        west, south, east, north = (float(v) for v in value.split(","))
+    except (AttributeError, ValueError):
+        return None
+    if south > north:
+        return None
+    return west, south, east, north
+
+
+@stats_bp.route("/map")
+@cached_response("detections")
+def get_map_clusters():
+    """地图视口内的检测点位聚合：bbox=west,south,east,north，zoom 为 Leaflet 缩放级别。
+
+    先按覆盖视口的 geohash 前缀做范围查询（走 geocell 索引），再按与缩放级别对应的
+    geohash 前缀在库内分组，返回每个聚合的数量、中心点与主要垃圾类别；
+    返回的聚合数只取决于视口的屏幕尺寸，与总数据量无关。"""
+    bbox = _parse_bbox(request.args.get("bbox", "-180,-90,180,90"))
+    if bbox is None:
+        return jsonify({"ok": False, "msg": "bbox 格式应为 west,south,east,north"}), 400
+    try:
+        zoom = max(0, min(int(float(request.args.get("zoom", 5))), 22))
+    except ValueError:
+        return jsonify({"ok": False, "msg": "zoom 无效"}), 400
+
+    precision = geohash.cluster_precision(zoom, current_app.config.get("MAP_CLUSTER_PX", 80))
+    prefixes = geohash.cover(bbox, current_app.config.get("MAP_COVER_CELLS", 16))
+    west, south, east, north = bbox
+
+    cell = func.substr(DetectTask.geocell, 1, precision).label("cell")
+    conditions = [DetectTask.latitude.between(south, north)]
+    if east - west < 360:
+        west, east = (west + 180) % 360 - 180, (east + 180) % 360 - 180
+        lng_in = DetectTask.longitude.between(west, east)
+        if west > east:
+            lng_in = or_(DetectTask.longitude >= west, DetectTask.longitude <= east)
+        conditions.append(lng_in)
+    if prefixes is not None:
+        conditions.append(or_(*[and_(DetectTask.geocell >= p, DetectTask.geocell < p + geohash.RANGE_END)
+                                for p in prefixes]))
+    else:
+        conditions.append(DetectTask.geocell.isnot(None))
+
+    # 同一聚合内按类别组合再分组，类别组合数有限，Python 侧只需合并这些行
+    rows = db.session.execute(
+        select(cell, StatsTaskLabels.labels, func.count().label("n"),
+               func.sum(DetectTask.latitude).label("lat_sum"), func.sum(DetectTask.longitude).label("lng_sum"),
+               func.min(DetectTask.id).label("task_id"))
+        .join(StatsTaskLabels, StatsTaskLabels.task_id == DetectTask.id)
+        .where(*conditions)
+        .group_by(cell, StatsTaskLabels.labels)
+    ).all()
+
+    clusters = {}
+    for row in rows:
+        c = clusters.setdefault(row.cell, {"count": 0, "lat": 0.0, "lng": 0.0, "task_id": row.task_id,
+                                           "labels": Counter()})
+        c["count"] += row.n
+        c["lat"] += row.lat_sum
+        c["lng"] += row.lng_sum
+        c["task_id"] = min(c["task_id"], row.task_id)
+        for label in (row.labels or "").split(", "):
+            if label:
+                c["labels"][label] += row.n
+
+    out = []
+    for key, c in sorted(clusters.items()):
+        top = c["labels"].most_common(3)
+        out.append({
+            "cell": key,
+            "count": c["count"],
+            "lat": c["lat"] / c["count"],
+            "lng": c["lng"] / c["count"],
+            "id": c["task_id"] if c["count"] == 1 else None,
+            "labels": [{"label": label, "count": n} for label, n in top],
+            "dominant": top[0][0] if top else None,
+        })
+    return jsonify({"ok": True, "zoom": zoom, "precision": precision,
+                    "total": sum(c["count"] for c in out), "clusters": out})
+
+
+@stats_bp.route("/cache")
+def get_cache_stats():
+    return jsonify({"ok": True, "stats": response_cache.stats()})
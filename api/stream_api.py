@@ -0,0 +1,39 @@
+from flask import Blueprint, Response, current_app, request, jsonify
+
+from services.pubsub import broker, format_sse
+
+stream_bp = Blueprint("stream_bp", __name__)
+
+
+@stream_bp.route("/stream", methods=["GET"])
+def event_stream():
+    """SSE 推送：robot（机器人状态增量）、robot_removed、detection（新检测任务）。
+
+    可用 ?topics=robot,detection 只订阅部分事件；空闲时定期发送注释行保活，
+    客户端断开后下一次写入失败即释放订阅。"""
+    topics = [t for t in (request.args.get("topics") or "").split(",") if t]
+    keepalive = current_app.config.get("STREAM_KEEPALIVE", 15)
+    retry_ms = int(current_app.config.get("STREAM_RETRY_MS", 3000))
+    sub = broker.subscribe(topics or None)
+
+    def generate():
+        try:
+            yield f"retry: {retry_ms}\n: connected\n\n"
+            while True:
+                event = sub.get(timeout=keepalive)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_sse(*event)
+        finally:
+            broker.unsubscribe(sub)
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # 关闭 nginx 缓冲，事件即时下发
+    return resp
+
+
+@stream_bp.route("/stream/stats", methods=["GET"])
+def stream_stats():
+    return jsonify({"ok": True, **broker.stats()})
@@ -1,16 +1,29 @@
+import os
 import logging
 from flask import Flask, jsonify
 from config import Config
 from database.db import db
+from database import rollups, migrations
 from api.detect_api import detect_bp
 from web.pages import web_bp
 from api.stats_api import stats_bp
 from api.robot_api import robot_bp
+from api.stream_api import stream_bp
+from api.render_api import render_bp
+from inference.model_registry import registry
+from inference.backends import model_path_for
+from inference import export
+from services.uploads import UploadRequest
+from services.geocoder import get_geocoder
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
+    # 上传文件解析到内存并同时计算内容哈希（services/uploads.py）
+    app.request_class = UploadRequest
     app.config.from_object(Config)
+    if config:
+        app.config.update(config)
 
     # configure basic logging for the app
     logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
@@ -19,11 +32,34 @@ def create_app():
     app.secret_key = "change-this-to-a-random-secret"
 
     db.init_app(app)
+    rollups.init_app(app)
+    migrations.init_app(app)
+    export.init_app(app)
 
     app.register_blueprint(detect_bp, url_prefix="/api")
     app.register_blueprint(web_bp)
     app.register_blueprint(stats_bp, url_prefix="/api/stats")
     app.register_blueprint(robot_bp, url_prefix="/api/robot")
+    app.register_blueprint(stream_bp, url_prefix="/api")
+    app.register_blueprint(render_bp, url_prefix="/api")
+
+    # 启动时加载并预热模型，避免首个检测请求承担加载开销
+    registry.warmup = app.config.get("MODEL_WARMUP", True)
+    registry.onnx_options = {
+        "intra_op_threads": app.config.get("ONNX_INTRA_OP_THREADS", 0),
+        "inter_op_threads": app.config.get("ONNX_INTER_OP_THREADS", 0),
+        "providers": app.config.get("ONNX_PROVIDERS"),
+    }
+    model_path = model_path_for(app.config)
+    if app.config.get("MODEL_PRELOAD") and model_path and os.path.exists(model_path):
+        try:
+            registry.get(model_path)
+        except Exception:
+            app.logger.exception("模型预加载失败，将在首次检测时重试")
+
+    # 上次运行时排队、尚未补全地址的任务在后台线程中重新排队
+    if app.config.get("GEOCODE_MODE") == "deferred" and app.config.get("GEOCODE_RECOVER_ON_START"):
+        get_geocoder(app).recover()
 
     # Note: stats endpoints are provided by `api/stats_api.py` (registered at /api/stats).
     # The previous inline summary route was removed to avoid duplicate routing.
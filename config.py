@@ -23,4 +23,120 @@ class Config:
     UPLOAD_DIR = os.path.join(BASE_DIR, "static", "uploads")
     RESULT_DIR = os.path.join(BASE_DIR, "static", "results")
 
-    MAX_CONTENT_LENGTH = 10 * 1024 * 1024
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", str(10 * 1024 * 1024)))
+
+    # 模型权重与加载策略
+    MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(BASE_DIR, "best.pt"))
+    MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "1") == "1"
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+    # 推理后端：torch（ultralytics/PyTorch，加载 MODEL_PATH）或 onnx（ONNX Runtime，加载 flask export-model 导出的 ONNX_MODEL_PATH）
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+    ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", os.path.join(BASE_DIR, "best.onnx"))
+    ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0：由 ONNX Runtime 按 CPU 核数决定
+    ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "0"))
+    ONNX_PROVIDERS = os.getenv("ONNX_PROVIDERS", "CPUExecutionProvider").split(",")
+    # 低于该置信度的检测框在写库前丢弃（0 表示全部保留）
+    DETECT_MIN_CONFIDENCE = float(os.getenv("DETECT_MIN_CONFIDENCE", "0"))
+
+    # 动态微批推理：并发请求攒批后做一次前向
+    BATCH_INFERENCE = os.getenv("BATCH_INFERENCE", "0") == "1"
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+    BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+    BATCH_QUEUE_LIMIT = int(os.getenv("BATCH_QUEUE_LIMIT", "256"))
+
+    # 切片推理：长边不小于 TILE_MIN_SIDE 的大图切成重叠切片推理后跨切片 NMS 合并，提高宽幅照片中小目标的召回
+    TILED_INFERENCE = os.getenv("TILED_INFERENCE", "0") == "1"
+    TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+    TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+    TILE_MIN_SIDE = int(os.getenv("TILE_MIN_SIDE", "1280"))
+    TILE_FULL_FRAME = os.getenv("TILE_FULL_FRAME", "1") == "1"
+    TILE_MERGE_THRESHOLD = float(os.getenv("TILE_MERGE_THRESHOLD", "0.5"))
+    TILE_WORKERS = int(os.getenv("TILE_WORKERS", "0"))  # 0：所有切片作为一个批次前向
+
+    # 标注图：默认不在检测时保存，由 /api/render 按检测项按需渲染并写入磁盘 LRU 缓存；EAGER_ANNOTATION=1 恢复检测时保存整张标注图
+    EAGER_ANNOTATION = os.getenv("EAGER_ANNOTATION", "0") == "1"
+    RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(BASE_DIR, "cache", "render"))
+    RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    RENDER_CACHE_MAX_AGE = int(os.getenv("RENDER_CACHE_MAX_AGE", "3600"))  # 响应的 Cache-Control max-age（秒）
+    RENDER_WIDTHS = [int(w) for w in os.getenv("RENDER_WIDTHS", "160,320,640,1280").split(",")]
+    RENDER_JPEG_QUALITY = int(os.getenv("RENDER_JPEG_QUALITY", "85"))
+    RENDER_WEBP_QUALITY = int(os.getenv("RENDER_WEBP_QUALITY", "80"))
+
+    # 近重复帧去重（默认关闭）：同一设备在同一位置（FRAME_DEDUP_MAX_MOVE 米内）的新帧与最近推理过的帧
+    # 几乎相同时复用那次结果（不推理、不新建任务）
+    FRAME_DEDUP = os.getenv("FRAME_DEDUP", "0") == "1"
+    FRAME_DEDUP_METHOD = os.getenv("FRAME_DEDUP_METHOD", "thumb")  # thumb | dhash
+    FRAME_DEDUP_THRESHOLD = int(os.getenv("FRAME_DEDUP_THRESHOLD", "1"))
+    FRAME_DEDUP_DELTA = int(os.getenv("FRAME_DEDUP_DELTA", "20"))
+    FRAME_DEDUP_HISTORY = int(os.getenv("FRAME_DEDUP_HISTORY", "8"))
+    FRAME_DEDUP_MAX_AGE = float(os.getenv("FRAME_DEDUP_MAX_AGE", "300"))
+    FRAME_DEDUP_MAX_MOVE = float(os.getenv("FRAME_DEDUP_MAX_MOVE", "5"))
+
+    # 跨帧目标跟踪（默认关闭）：同一设备连续帧中的同一目标只写一条检测项（更新置信度、出现次数与最后出现时间）
+    TRACKING = os.getenv("TRACKING", "0") == "1"
+    TRACK_IOU = float(os.getenv("TRACK_IOU", "0.3"))
+    TRACK_CENTROID_RATIO = float(os.getenv("TRACK_CENTROID_RATIO", "0.5"))
+    TRACK_MAX_AGE = float(os.getenv("TRACK_MAX_AGE", "10"))
+    TRACK_MAX_MOVE = float(os.getenv("TRACK_MAX_MOVE", "5"))
+
+    # 异步检测任务：进程池大小与排队上限
+    DETECT_WORKERS = int(os.getenv("DETECT_WORKERS", "2"))
+    DETECT_QUEUE_LIMIT = int(os.getenv("DETECT_QUEUE_LIMIT", "64"))
+
+    # 批量上传：单次请求的图片数、请求体大小上限（替代 MAX_CONTENT_LENGTH）与 zip 解压总大小上限
+    BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "100"))
+    BATCH_MAX_CONTENT_LENGTH = int(os.getenv("BATCH_MAX_CONTENT_LENGTH", str(100 * 1024 * 1024)))
+    BATCH_ZIP_MAX_BYTES = int(os.getenv("BATCH_ZIP_MAX_BYTES", str(200 * 1024 * 1024)))
+
+    # 逆地理编码：nominatim 或 stub（离线/测试）；deferred 模式下由后台线程补全任务地址
+    GEOCODER_BACKEND = os.getenv("GEOCODER_BACKEND", "nominatim")
+    GEOCODE_MODE = os.getenv("GEOCODE_MODE", "deferred")  # deferred | sync | off
+    GEOCODE_URL = os.getenv("GEOCODE_URL", "https://nominatim.openstreetmap.org/reverse")
+    GEOCODE_USER_AGENT = os.getenv("GEOCODE_USER_AGENT", "Mozilla/5.0 (compatible; DetectApp/1.0; +http://yourdomain.com/)")
+    GEOCODE_TIMEOUT = float(os.getenv("GEOCODE_TIMEOUT", "5"))
+    GEOCODE_GRID_DEG = float(os.getenv("GEOCODE_GRID_DEG", "0.01"))
+    GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "4096"))
+    GEOCODE_MIN_INTERVAL = float(os.getenv("GEOCODE_MIN_INTERVAL", "1.0"))
+    # 外部调用限流默认只在本进程内生效；多 worker/多实例部署时设置 Redis 地址，由所有进程共享同一个限流
+    GEOCODE_RATE_LIMIT_REDIS_URL = os.getenv("GEOCODE_RATE_LIMIT_REDIS_URL", "")
+    # 启动时重新排队补全地址仍为占位文本的任务（deferred 模式的补全队列只在内存中）
+    GEOCODE_RECOVER_ON_START = os.getenv("GEOCODE_RECOVER_ON_START", "1") == "1"
+
+    # 看板读接口的响应缓存：数据版本号变化即失效；TTL 限制跨进程写入与按心跳超时判定离线的滞后
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "1.0"))
+
+    # /api/stats/map 地图聚合：聚合网格在屏幕上的最小宽度（像素）；覆盖视口时最多使用的 geohash 前缀数
+    MAP_CLUSTER_PX = int(os.getenv("MAP_CLUSTER_PX", "80"))
+    MAP_COVER_CELLS = int(os.getenv("MAP_COVER_CELLS", "16"))
+    # /api/stats/summary 中已废弃的 locations 字段（地图改用 /api/stats/map）最多返回的点数，0 表示不返回
+    SUMMARY_LOCATIONS_LIMIT = int(os.getenv("SUMMARY_LOCATIONS_LIMIT", "1000"))
+
+    # /api/stream 实时推送：空闲保活间隔（秒）与浏览器断线重连间隔（毫秒）
+    STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+    STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "3000"))
+
+    # 机器人实时状态存储：memory（单进程）或 redis（多进程/多实例共享）；心跳字段按间隔批量写回数据库
+    ROBOT_STATE_BACKEND = os.getenv("ROBOT_STATE_BACKEND", "memory")
+    ROBOT_STATE_REDIS_URL = os.getenv("ROBOT_STATE_REDIS_URL", "redis://localhost:6379/0")
+    ROBOT_FLUSH_INTERVAL = float(os.getenv("ROBOT_FLUSH_INTERVAL", "2.0"))
+    # 超过该秒数未心跳的机器人由后台在线状态监视置为 OFFLINE（列表与看板共用这一个超时）
+    HEARTBEAT_TIMEOUT = float(os.getenv("HEARTBEAT_TIMEOUT", "15"))
+
+    # 机器人命令队列：未投递命令的有效期、投递后等待回执的时间与最多投递次数
+    # （COMMAND_ACK_TIMEOUT 默认 0 不重投；开启后也只对回执过命令的机器人重投）
+    COMMAND_TTL = int(os.getenv("COMMAND_TTL", "300"))
+    COMMAND_ACK_TIMEOUT = int(os.getenv("COMMAND_ACK_TIMEOUT", "0"))
+    COMMAND_MAX_ATTEMPTS = int(os.getenv("COMMAND_MAX_ATTEMPTS", "3"))
+    # 长轮询取命令：单次最长挂起秒数；跨进程入队时重新检查状态存储的间隔
+    COMMAND_POLL_MAX_WAIT = float(os.getenv("COMMAND_POLL_MAX_WAIT", "30"))
+    COMMAND_POLL_RECHECK = float(os.getenv("COMMAND_POLL_RECHECK", "1.0"))
+
+    # 机器人摄像头 MJPEG 流接入：默认流地址（{ip} 为机器人上报的 IP）、检测帧率、断线重连间隔与连接超时（秒）
+    CAMERA_STREAM_URL = os.getenv("CAMERA_STREAM_URL", "http://{ip}:8080/stream")
+    CAMERA_TARGET_FPS = float(os.getenv("CAMERA_TARGET_FPS", "2"))
+    CAMERA_RECONNECT = float(os.getenv("CAMERA_RECONNECT", "3"))
+    CAMERA_TIMEOUT = float(os.getenv("CAMERA_TIMEOUT", "10"))
+    # 请求中指定的流地址：除机器人 IP 外允许的主机（逗号分隔）；是否允许本地视频文件（仅测试用）
+    CAMERA_ALLOWED_HOSTS = [h.strip() for h in os.getenv("CAMERA_ALLOWED_HOSTS", "").split(",") if h.strip()]
+    CAMERA_ALLOW_FILE_SOURCES = os.getenv("CAMERA_ALLOW_FILE_SOURCES", "0") == "1"
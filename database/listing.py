@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from sqlalchemy import select, func, text
+
+from database.db import db
+from database.models import DetectTask, DetectItem
+
+# 列表页只取这些列，不加载 error_msg 等大字段
+_COLUMNS = (DetectTask.id, DetectTask.source_type, DetectTask.device_id, DetectTask.status,
+            DetectTask.latitude, DetectTask.longitude, DetectTask.location, DetectTask.created_at)
+
+
+def approx_task_count():
+    """detect_task 的近似行数：MySQL 读 information_schema，PostgreSQL 读 pg_class，
+    其他数据库用 max(id)（任务极少删除时接近真实值），都不扫描全表。"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "mysql":
+        n = db.session.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'detect_task'")).scalar()
+    elif dialect == "postgresql":
+        n = db.session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'detect_task'")).scalar()
+    else:
+        n = db.session.execute(select(func.max(DetectTask.id))).scalar()
+    return int(n or 0)
+
+
+def _item_summary(task_ids):
+    """一次分组查询取出这一页任务的检测项数量与类别分布。"""
+    summary = defaultdict(lambda: {"item_count": 0, "labels": {}})
+    if not task_ids:
+        return summary
+    rows = db.session.execute(
+        select(DetectItem.task_id, DetectItem.label, func.count())
+        .where(DetectItem.task_id.in_(task_ids))
+        .group_by(DetectItem.task_id, DetectItem.label)
+    ).all()
+    for task_id, label, n in rows:
+        s = summary[task_id]
+        s["item_count"] += n
+        if label is not None:
+            s["labels"][label] = n
+    return summary
+
+
+def list_tasks(before=None, after=None, limit=10, count=False):
+    """按 id 倒序的游标分页（keyset），页深不影响查询代价，也不需要 COUNT(*)。
+
+    - before：返回 id 小于该值的下一页（更早的任务）；
+    - after：返回 id 大于该值的上一页（更新的任务）；
+    - count：附带近似总数（approx_task_count）。
+
+    返回的 next_before / prev_after 分别是下一页、上一页的游标，没有更多数据时为 None。
+    """
+    query = select(*_COLUMNS)
+    if after is not None:
+        query = query.where(DetectTask.id > after).order_by(DetectTask.id.asc())
+    else:
+        if before is not None:
+            query = query.where(DetectTask.id < before)
+        query = query.order_by(DetectTask.id.desc())
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after is not None:
+        rows.reverse()
+
+    summary = _item_summary([r.id for r in rows])
+    tasks = []
+    for r in rows:
+        task = r._asdict()
+        task["created_at"] = r.created_at.isoformat() if r.created_at else None
+        task.update(summary[r.id])
+        tasks.append(task)
+
+    if not tasks:
+        newer = older = False
+    elif after is not None:
+        newer = has_more
+        older = db.session.execute(select(DetectTask.id).where(DetectTask.id < tasks[-1]["id"]).limit(1)).first() is not None
+    else:
+        older = has_more
+        newer = before is not None and db.session.execute(
+            select(DetectTask.id).where(DetectTask.id > tasks[0]["id"]).limit(1)).first() is not None
+
+    out = {
+        "tasks": tasks,
+        "next_before": tasks[-1]["id"] if older else None,
+        "prev_after": tasks[0]["id"] if newer else None,
+    }
+    if count:
+        out["total"] = approx_task_count()
+    return out
@@ -0,0 +1,85 @@
+import click
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+from database.db import db
+
+
+def missing_tables(engine):
+    """模型中声明、但数据库中还不存在的表。"""
+    existing = set(inspect(engine).get_table_names())
+    return [table for table in db.metadata.sorted_tables if table.name not in existing]
+
+
+def missing_columns(engine):
+    """模型中新增、但已有表上还不存在的列（create_all 不会修改已存在的表）。"""
+    insp = inspect(engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {col["name"] for col in insp.get_columns(table.name)}
+        missing.extend(col for col in table.columns if col.name not in existing)
+    return missing
+
+
+def missing_indexes(engine):
+    """模型中声明、但已有表上还不存在的索引。"""
+    insp = inspect(engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in insp.get_indexes(table.name)}
+        existing.update(uc["name"] for uc in insp.get_unique_constraints(table.name))
+        missing.extend(ix for ix in sorted(table.indexes, key=lambda ix: ix.name) if ix.name not in existing)
+    return missing
+
+
+def migrate_tables(engine, dry_run=False):
+    """建出缺失的表（连同其索引），返回表名列表。"""
+    missing = missing_tables(engine)
+    if not dry_run and missing:
+        db.metadata.create_all(engine, tables=missing)
+    return [table.name for table in missing]
+
+
+def migrate_columns(engine, dry_run=False):
+    """补建缺失的列（只支持可为空的新列），返回 "表.列" 列表。"""
+    missing = missing_columns(engine)
+    for col in missing:
+        if not col.nullable:
+            raise click.ClickException(f"{col.table.name}.{col.name} 不可为空，需手工迁移")
+    if not dry_run:
+        with engine.begin() as conn:
+            for col in missing:
+                ddl = CreateColumn(col).compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {col.table.name} ADD COLUMN {ddl}")
+    return [f"{col.table.name}.{col.name}" for col in missing]
+
+
+def migrate_indexes(engine, dry_run=False):
+    """补建缺失的索引，返回索引名列表。"""
+    missing = missing_indexes(engine)
+    if not dry_run:
+        for index in missing:
+            index.create(engine)
+    return [ix.name for ix in missing]
+
+
+def migrate_schema(engine, dry_run=False):
+    """先建缺失的表，再补列与索引（新索引可能用到新列）。dry_run 时只列出，不做任何修改。"""
+    return (migrate_tables(engine, dry_run) + migrate_columns(engine, dry_run)
+            + migrate_indexes(engine, dry_run))
+
+
+def init_app(app):
+    @app.cli.command("migrate-schema")
+    @click.option("--dry-run", is_flag=True, help="只列出缺失的表、列与索引，不执行")
+    def migrate_schema_command(dry_run):
+        """为已有数据库补建模型中新增的表、列与索引。"""
+        names = migrate_schema(db.engine, dry_run=dry_run)
+        if not names:
+            click.echo("数据库结构已是最新")
+            return
+        click.echo(("待执行：" if dry_run else "已创建：") + ", ".join(names))
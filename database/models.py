@@ -37,7 +37,17 @@ class User(db.Model, UserMixin):
 
 class DetectTask(db.Model):
     __tablename__ = 'detect_task'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # 按天趋势 / 汇总重建按 created_at 分组；地图点位筛选有坐标的任务；按设备查最近任务
+        db.Index('ix_detect_task_created_at', 'created_at'),
+        db.Index('ix_detect_task_lat_lng', 'latitude', 'longitude'),
+        db.Index('ix_detect_task_device_created', 'device_id', 'created_at'),
+        # 地图视口查询按 geohash 前缀范围扫描，带上坐标列避免回表
+        db.Index('ix_detect_task_geocell', 'geocell', 'latitude', 'longitude'),
+        # 上传接口按原图内容哈希查找已有任务
+        db.Index('ix_detect_task_content_hash', 'content_hash'),
+        {'extend_existing': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     source_type = db.Column(db.String(20))
@@ -50,13 +60,39 @@ class DetectTask(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
+    # 坐标的 geohash（services/geohash.py），用作地图查询的空间索引
+    geocell = db.Column(db.String(12), nullable=True)
+    # 原图内容的 sha256，重复上传同一张图时复用已有任务
+    content_hash = db.Column(db.String(64), nullable=True)
 
     items = db.relationship('DetectItem', backref='task', lazy=True)
 
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "source_type": self.source_type,
+            "source_path": self.source_path,
+            "result_path": self.result_path,
+            "device_id": self.device_id,
+            "location": self.location,
+            "status": self.status,
+            "error_msg": self.error_msg,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+        }
+
 
 class DetectItem(db.Model):
     __tablename__ = 'detect_item'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # 详情页按 task_id 取检测项、汇总重建按 (task_id, label) 去重连接；类别分布按 label 分组
+        db.Index('ix_detect_item_task_label', 'task_id', 'label'),
+        db.Index('ix_detect_item_label', 'label'),
+        # 跨帧跟踪按 track_id 更新同一目标的检测项
+        db.Index('ix_detect_item_track', 'track_id'),
+        {'extend_existing': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey('detect_task.id'))
@@ -69,6 +105,24 @@ class DetectItem(db.Model):
     area = db.Column(db.Integer)
     handle_state = db.Column(db.String(20), default='NEW')
     updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+    # 跨帧跟踪（inference/tracker.py）：同一目标在后续帧中的观测只更新这一行
+    track_id = db.Column(db.String(32), nullable=True)
+    seen_count = db.Column(db.Integer, nullable=True, default=1)
+    last_seen_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "task_id": self.task_id,
+            "label": self.label,
+            "confidence": self.confidence,
+            "bbox": [self.x1, self.y1, self.x2, self.y2],
+            "area": self.area,
+            "handle_state": self.handle_state,
+            "track_id": self.track_id,
+            "seen_count": self.seen_count,
+            "last_seen_at": self.last_seen_at.isoformat() if self.last_seen_at else None,
+        }
 
 
 class OpsLog(db.Model):
@@ -81,6 +135,47 @@ class OpsLog(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now)
 
 
+class StatsDaily(db.Model):
+    """按天汇总的任务数（检测写库时增量维护）。"""
+    __tablename__ = 'stats_daily'
+    __table_args__ = {'extend_existing': True}
+
+    day = db.Column(db.Date, primary_key=True)
+    task_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StatsLabel(db.Model):
+    """按类别汇总的检测项数量。"""
+    __tablename__ = 'stats_label'
+    __table_args__ = {'extend_existing': True}
+
+    label = db.Column(db.String(50), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StatsTaskLabels(db.Model):
+    """带坐标任务的去重类别集合，供地图点位直接读取。"""
+    __tablename__ = 'stats_task_labels'
+    __table_args__ = {'extend_existing': True}
+
+    task_id = db.Column(db.Integer, db.ForeignKey('detect_task.id'), primary_key=True)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    labels = db.Column(db.String(255), default='')
+
+
+class GeoCache(db.Model):
+    __tablename__ = 'geo_cache'
+    __table_args__ = {'extend_existing': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    cell_key = db.Column(db.String(64), unique=True, nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    address = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+
 class Robot(db.Model):
     __tablename__ = 'robot'
     
@@ -101,4 +196,44 @@ class Robot(db.Model):
 
     battery = db.Column(db.Integer, default=100)
     config = db.Column(db.Text, default='{"confidence_threshold": 0.5, "active": true}')
-    created_at = db.Column(db.DateTime, default=datetime.now)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+class RobotCommand(db.Model):
+    """机器人命令队列：按 (robot_id, seq) 排序，投递时原子认领，机器人回执后置为 ACKED。
+
+    status：QUEUED -> DELIVERED -> ACKED；超时未投递或未回执的置为 EXPIRED。
+    """
+    __tablename__ = 'robot_command'
+    __table_args__ = (
+        db.UniqueConstraint('robot_id', 'seq', name='uq_robot_command_seq'),
+        db.Index('ix_robot_command_claim', 'robot_id', 'status', 'seq'),
+        {'extend_existing': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    robot_id = db.Column(db.Integer, db.ForeignKey('robot.id', ondelete='CASCADE'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    command = db.Column(db.String(100), nullable=False)
+    target_lat = db.Column(db.Float, nullable=True)
+    target_lng = db.Column(db.Float, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='QUEUED')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+    acked_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "robot_id": self.robot_id,
+            "seq": self.seq,
+            "command": self.command,
+            "target": {"lat": self.target_lat, "lng": self.target_lng},
+            "status": self.status,
+            "attempts": self.attempts,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "delivered_at": self.delivered_at.isoformat() if self.delivered_at else None,
+            "acked_at": self.acked_at.isoformat() if self.acked_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+        }
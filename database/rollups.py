@@ -0,0 +1,143 @@
+from collections import Counter
+from datetime import datetime, date
+
+import click
+from sqlalchemy import func, select, delete, update, bindparam
+
+from database.db import db
+from database.models import DetectTask, DetectItem, StatsDaily, StatsLabel, StatsTaskLabels
+from services import geohash
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _increment(model, key, count_col, deltas):
+    """对汇总表做 “key 不存在则插入，存在则累加” 的 upsert，在当前事务内执行。"""
+    if not deltas:
+        return
+    table = model.__table__
+    # 固定顺序写入，避免并发 upsert 时的锁顺序死锁
+    rows = [{key: k, count_col: n} for k, n in sorted(deltas.items())]
+    dialect = _dialect()
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update({count_col: table.c[count_col] + stmt.inserted[count_col]})
+        db.session.execute(stmt)
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[key],
+            set_={count_col: table.c[count_col] + stmt.excluded[count_col]})
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            res = db.session.execute(update(table)
+                                     .where(table.c[key] == row[key])
+                                     .values({count_col: table.c[count_col] + row[count_col]}))
+            if res.rowcount == 0:
+                db.session.execute(table.insert().values(row))
+
+
+def _join_labels(labels):
+    return ", ".join(sorted(set(labels)))[:255]
+
+
+def record_detections(entries, new_task=True):
+    """检测写库时同步更新汇总表（与任务/检测项在同一事务中，由调用方提交）。
+
+    - entries：[(task, labels)]，labels 为该任务本次写入的检测项类别列表；
+    - new_task=True：任务首次写入，按天任务数 +1。
+    """
+    days = Counter()
+    label_counts = Counter()
+    for task, labels in entries:
+        if new_task:
+            days[(task.created_at or datetime.now()).date()] += 1
+        label_counts.update(labels)
+
+        if task.latitude is None or task.longitude is None:
+            continue
+        if new_task:
+            db.session.add(StatsTaskLabels(task_id=task.id, latitude=task.latitude,
+                                           longitude=task.longitude, labels=_join_labels(labels)))
+        elif labels:
+            db.session.execute(update(StatsTaskLabels)
+                               .where(StatsTaskLabels.task_id == task.id)
+                               .values(labels=_join_labels(labels)))
+
+    _increment(StatsDaily, "day", "task_count", days)
+    _increment(StatsLabel, "label", "item_count", label_counts)
+
+
+def record_detection(task, labels, new_task=True):
+    record_detections([(task, labels)], new_task=new_task)
+
+
+def backfill():
+    """根据现有 detect_task / detect_item 重建全部汇总表，并补齐任务的 geocell。"""
+    db.session.execute(delete(StatsTaskLabels))
+    db.session.execute(delete(StatsLabel))
+    db.session.execute(delete(StatsDaily))
+
+    daily = db.session.execute(
+        select(func.date(DetectTask.created_at), func.count(DetectTask.id))
+        .where(DetectTask.created_at.isnot(None))
+        .group_by(func.date(DetectTask.created_at))
+    ).all()
+    for day, count in daily:
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        db.session.add(StatsDaily(day=day, task_count=count))
+
+    label_counts = db.session.execute(
+        select(DetectItem.label, func.count(DetectItem.id)).group_by(DetectItem.label)
+    ).all()
+    for label, count in label_counts:
+        if label is not None:
+            db.session.add(StatsLabel(label=label, item_count=count))
+
+    located = db.session.execute(
+        select(DetectTask.id, DetectTask.latitude, DetectTask.longitude)
+        .where(DetectTask.latitude.isnot(None), DetectTask.longitude.isnot(None))
+    ).all()
+    task_labels = {}
+    pairs = db.session.execute(
+        select(DetectItem.task_id, DetectItem.label)
+        .join(DetectTask, DetectTask.id == DetectItem.task_id)
+        .where(DetectTask.latitude.isnot(None), DetectTask.longitude.isnot(None))
+        .distinct()
+    )
+    for task_id, label in pairs:
+        if label is not None:
+            task_labels.setdefault(task_id, []).append(label)
+    for task_id, lat, lng in located:
+        db.session.add(StatsTaskLabels(task_id=task_id, latitude=lat, longitude=lng,
+                                       labels=_join_labels(task_labels.get(task_id, []))))
+
+    # 补齐地图空间索引（迁移新增 geocell 列之前写入的任务）
+    task_table = DetectTask.__table__
+    geocells = [{"b_id": task_id, "b_geocell": geohash.encode(lat, lng)} for task_id, lat, lng in located]
+    if geocells:
+        db.session.execute(update(task_table)
+                           .where(task_table.c.id == bindparam("b_id"))
+                           .values(geocell=bindparam("b_geocell")), geocells)
+
+    db.session.commit()
+    return {"days": len(daily), "labels": len(label_counts), "located_tasks": len(located)}
+
+
+def init_app(app):
+    @app.cli.command("backfill-stats")
+    def backfill_stats_command():
+        """根据已有检测数据重建统计汇总表。"""
+        db.create_all()
+        result = backfill()
+        click.echo(f"汇总表已重建：{result}")
@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+
+# 输出格式 -> (扩展名, MIME 类型, 质量参数)
+FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+def draw_boxes(image, xyxy, labels, conf):
+    """在 image 上原地画检测框与“类别 置信度”标签；线宽随图片尺寸缩放。"""
+    side = max(image.shape[:2])
+    thickness = max(2 if side >= 640 else 1, round(side / 640))
+    for (x1, y1, x2, y2), label, c in zip(np.asarray(xyxy).astype(int).tolist(), labels, conf):
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), thickness)
+        cv2.putText(image, f"{label} {c:.2f}", (x1, max(0, y1 - 4)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.4 * thickness, (0, 0, 255), max(1, thickness // 2))
+    return image
+
+
+def render(image, xyxy, labels, conf, width=None, fmt="jpeg", quality=85):
+    """按需渲染标注图：先缩小到 width（不放大），再按缩放后的坐标画框，编码为 fmt，返回 bytes。
+    缩略图上的框线与文字保持清晰，不会随整图一起被缩糊。"""
+    height_, width_ = image.shape[:2]
+    scale = 1.0
+    if width and width < width_:
+        scale = width / width_
+        image = cv2.resize(image, (width, max(1, round(height_ * scale))), interpolation=cv2.INTER_AREA)
+    else:
+        image = image.copy()
+    boxes = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4) * scale
+    draw_boxes(image, boxes, labels, conf)
+    ext, _, flag = FORMATS[fmt]
+    ok, buf = cv2.imencode(ext, image, [flag, int(quality)])
+    if not ok:
+        raise IOError(f"无法编码为 {fmt}")
+    return buf.tobytes()
@@ -0,0 +1,123 @@
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class _Pending:
+    __slots__ = ("source", "future", "enqueued_at")
+
+    def __init__(self, source):
+        self.source = source
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """动态微批推理：把并发请求的图片攒成一批，做一次 model(list_of_images) 前向。
+
+    - 第一张图入队后最多等待 ``max_wait_ms``，或攒满 ``max_batch_size`` 即发车；
+    - ``detector_factory`` 每批调用一次，配合模型注册表可以跟随权重热替换；
+    - 每个请求拿到自己的 Future，结果为对应图片的 ultralytics Result。
+    """
+
+    def __init__(self, detector_factory, max_batch_size=8, max_wait_ms=10, max_queue=256):
+        self.detector_factory = detector_factory
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopped = threading.Event()
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._images = 0
+        self._batches = 0
+        self._errors = 0
+        self._wait_total = 0.0
+        self._infer_total = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+        self._thread.start()
+
+    def submit(self, source):
+        pending = _Pending(source)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            raise QueueFullError("推理队列已满")
+        return pending.future
+
+    def infer(self, source, timeout=None):
+        return self.submit(source).result(timeout=timeout)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = self._collect(first)
+            started = time.perf_counter()
+            try:
+                detector = self.detector_factory()
+                results = detector.predict([p.source for p in batch])
+                for pending, result in zip(batch, results):
+                    pending.future.set_result(result)
+                failed = False
+            except Exception as e:
+                logger.exception("批量推理失败 (batch=%d)", len(batch))
+                for pending in batch:
+                    pending.future.set_exception(e)
+                failed = True
+            finished = time.perf_counter()
+
+            with self._stats_lock:
+                self._batches += 1
+                self._images += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._errors += int(failed)
+                self._wait_total += sum(started - p.enqueued_at for p in batch)
+                self._infer_total += finished - started
+
+    def stats(self):
+        with self._stats_lock:
+            batches = self._batches or 1
+            images = self._images or 1
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "images": self._images,
+                "errors": self._errors,
+                "avg_batch_size": round(self._images / batches, 3),
+                "batch_size_hist": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "avg_queue_wait_ms": round(self._wait_total / images * 1000.0, 3),
+                "avg_batch_infer_ms": round(self._infer_total / batches * 1000.0, 3),
+            }
+
+    def shutdown(self):
+        self._stopped.set()
+        self._thread.join(timeout=2)
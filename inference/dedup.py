@@ -0,0 +1,160 @@
+import time
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from inference.tracker import meters
+
+
+def _gray(image):
+    if isinstance(image, str):
+        gray = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise IOError("无法读取图片")
+        return gray
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def dhash(image, hash_size=8):
+    """差值哈希（dHash）：缩成 (hash_size+1)×hash_size 灰度图，比较左右相邻像素，得到 hash_size² 位整数。"""
+    small = cv2.resize(_gray(image), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def thumbnail(image, size=32):
+    """按面积平均缩成宽 size 格的彩色缩略图（高度按原图比例），每格是原图一块区域的平均颜色。"""
+    if isinstance(image, str):
+        image = cv2.imread(image, cv2.IMREAD_COLOR)
+        if image is None:
+            raise IOError("无法读取图片")
+    rows = max(1, round(size * image.shape[0] / image.shape[1]))
+    return cv2.resize(image, (size, rows), interpolation=cv2.INTER_AREA)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def changed_cells(a, b, delta=20):
+    """两张缩略图中任一通道变化超过 delta 的格子数；先按通道扣除整体偏移（自动曝光、白平衡）。"""
+    if a.shape != b.shape:
+        return a.shape[0] * a.shape[1]
+    diff = a.astype(np.int16) - b.astype(np.int16)
+    if diff.ndim == 2:
+        diff = diff[..., None]
+    diff -= np.median(diff.reshape(-1, diff.shape[-1]), axis=0).astype(np.int16)
+    return int(np.count_nonzero(np.abs(diff).max(axis=-1) > delta))
+
+
+class FrameDeduplicator:
+    """按设备的近重复帧判定：每台设备保留最近 ``history`` 个已推理帧的签名及其结果（LRU），
+    新帧与其中任一签名的距离不超过 ``threshold`` 即视为重复，直接复用该结果。
+
+    - method="thumb"（默认）：彩色缩略图逐格比较，距离为颜色明显变化的格子数。
+      新出现的小目标会让所在的几格明显变化，比感知哈希更不容易被当成重复；
+    - method="dhash"：64 位差值哈希的汉明距离，对位移更宽容，但画面中新增的小目标常常不改变哈希。
+
+    帧带坐标时位置也须一致：只与 ``max_move`` 米以内、同样带坐标的记录比较
+    （机器人换了地方、画面相似也不复用旧任务及其位置）；都不带坐标的帧只比较画面。
+
+    命中不会写入新签名，缓慢漂移的画面在偏离超过阈值后会重新推理；
+    超过 ``max_age`` 秒未命中的记录失效，设备数超过 ``max_devices`` 时淘汰最久未用的设备。
+    """
+
+    def __init__(self, method="thumb", threshold=1, history=8, size=None, delta=20,
+                 max_age=300.0, max_devices=1024, max_move=5.0):
+        if method not in ("thumb", "dhash"):
+            raise ValueError(f"未知的去重方式 {method}")
+        self.method = method
+        self.threshold = threshold
+        self.history = max(1, int(history))
+        self.size = size or (8 if method == "dhash" else 32)
+        self.delta = delta
+        self.max_age = max_age
+        self.max_devices = max_devices
+        self.max_move = max_move
+        self._devices = OrderedDict()  # device_id -> [[signature, value, last_used, lat, lng], ...]，末尾最近使用
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evicted = 0
+
+    def signature(self, image):
+        if self.method == "dhash":
+            return dhash(image, self.size)
+        return thumbnail(image, self.size)
+
+    def distance(self, a, b):
+        if self.method == "dhash":
+            return hamming(a, b)
+        return changed_cells(a, b, self.delta)
+
+    def same_place(self, entry, lat, lng):
+        if lat is None or lng is None or entry[3] is None or entry[4] is None:
+            return (lat is None or lng is None) and (entry[3] is None or entry[4] is None)
+        return meters(lat, lng, entry[3], entry[4]) <= self.max_move
+
+    def lookup(self, device_id, image, lat=None, lng=None):
+        """返回 (signature, value)；未命中时 value 为 None，调用方推理后用 remember 记录。"""
+        sig = self.signature(image)
+        now = time.monotonic()
+        with self._lock:
+            self.lookups += 1
+            entries = self._devices.get(device_id)
+            if not entries:
+                return sig, None
+            self._devices.move_to_end(device_id)
+            entries[:] = [e for e in entries if now - e[2] <= self.max_age]
+            best, best_dist = None, self.threshold + 1
+            for i, entry in enumerate(entries):
+                if not self.same_place(entry, lat, lng):
+                    continue
+                dist = self.distance(sig, entry[0])
+                if dist < best_dist:
+                    best, best_dist = i, dist
+            if best is None:
+                return sig, None
+            best = entries.pop(best)
+            best[2] = now
+            entries.append(best)
+            self.hits += 1
+            return sig, best[1]
+
+    def remember(self, device_id, sig, value, lat=None, lng=None):
+        with self._lock:
+            entries = self._devices.get(device_id)
+            if entries is None:
+                entries = self._devices[device_id] = []
+                while len(self._devices) > self.max_devices:
+                    self._devices.popitem(last=False)
+                    self.evicted += 1
+            self._devices.move_to_end(device_id)
+            # 同一画面只保留最新的结果（例如旧结果对应的任务已被删除、调用方重新推理时）
+            entries[:] = [e for e in entries
+                          if not self.same_place(e, lat, lng) or self.distance(sig, e[0]) > self.threshold]
+            entries.append([sig, value, time.monotonic(), lat, lng])
+            del entries[:-self.history]
+
+    def forget(self, device_id):
+        with self._lock:
+            self._devices.pop(device_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "method": self.method,
+                "threshold": self.threshold,
+                "history": self.history,
+                "max_move": self.max_move,
+                "devices": len(self._devices),
+                "entries": sum(len(e) for e in self._devices.values()),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "skip_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "evicted_devices": self.evicted,
+            }
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def _numpy(t):
+    # ultralytics 的张量需要先搬到 CPU；ONNX 后端直接给出 ndarray
+    return t.cpu().numpy() if hasattr(t, "cpu") else np.asarray(t)
+
+
+class Detections:
+    """列式检测结果：xyxy (N,4) float32、conf (N,) float32、cls (N,) int64，names 为类别表。
+
+    过滤、面积计算与写库都直接在数组上进行，只有需要旧的 dict 列表输出时才调用 ``to_list``。
+    """
+
+    __slots__ = ("xyxy", "conf", "cls", "names")
+
+    def __init__(self, xyxy, conf, cls, names):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls, dtype=np.int64).reshape(-1)
+        self.names = names
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0), names or {})
+
+    @classmethod
+    def from_result(cls, result):
+        """从 ultralytics Result（或 ONNX 后端的 Prediction）一次性取出整批张量，不逐框创建 Python 对象。"""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty(result.names)
+        return cls(_numpy(boxes.xyxy), _numpy(boxes.conf), _numpy(boxes.cls), result.names)
+
+    @classmethod
+    def concat(cls, parts, names=None):
+        if not parts:
+            return cls.empty(names)
+        return cls(
+            np.concatenate([p.xyxy for p in parts]),
+            np.concatenate([p.conf for p in parts]),
+            np.concatenate([p.cls for p in parts]),
+            names if names is not None else parts[0].names,
+        )
+
+    def __len__(self):
+        return len(self.conf)
+
+    @property
+    def labels(self):
+        if not len(self):
+            return []
+        if isinstance(self.names, dict):
+            table = np.empty(max(self.names) + 1, dtype=object)
+            for k, v in self.names.items():
+                table[k] = v
+        else:
+            table = np.asarray(self.names, dtype=object)
+        return table[self.cls].tolist()
+
+    def areas(self):
+        return (self.xyxy[:, 2] - self.xyxy[:, 0]) * (self.xyxy[:, 3] - self.xyxy[:, 1])
+
+    def select(self, mask):
+        return Detections(self.xyxy[mask], self.conf[mask], self.cls[mask], self.names)
+
+    def filter(self, min_conf=0.0):
+        if min_conf <= 0:
+            return self
+        return self.select(self.conf >= min_conf)
+
+    def to_list(self):
+        return [
+            {"label": label, "confidence": conf, "bbox": bbox}
+            for label, conf, bbox in zip(self.labels, self.conf.tolist(), self.xyxy.tolist())
+        ]
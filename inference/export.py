@@ -0,0 +1,98 @@
+import os
+import ast
+import glob
+
+import click
+import cv2
+import numpy as np
+
+from inference.backends import letterbox
+
+
+def export_onnx(model_path, output=None, imgsz=None, dynamic=True, opset=None, simplify=False):
+    """用 ultralytics 把 .pt 权重导出为 ONNX（带 names / imgsz / stride 元数据），返回导出文件路径。
+    imgsz 默认沿用权重训练时的输入尺寸（与 PyTorch 后端推理时一致）；
+    dynamic=True 时批大小与输入尺寸可变，微批推理与切片推理可以一次前向多张图。"""
+    from ultralytics import YOLO
+
+    options = {"imgsz": imgsz} if imgsz else {}
+    path = YOLO(model_path).export(format="onnx", dynamic=dynamic, opset=opset, simplify=simplify, **options)
+    if output and os.path.abspath(path) != os.path.abspath(output):
+        os.replace(path, output)
+        return output
+    return path
+
+
+class _CalibrationReader:
+    """静态量化的校准数据：把图片按推理时的方式 letterbox 到模型输入尺寸，逐张送入。"""
+
+    def __init__(self, input_name, paths, imgsz):
+        self.input_name = input_name
+        self.paths = iter(paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for path in self.paths:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            boxed = letterbox(image, self.imgsz)[0][..., ::-1].transpose(2, 0, 1)
+            return {self.input_name: (np.ascontiguousarray(boxed)[None].astype(np.float32) / 255.0)}
+        return None
+
+
+def _decode_nodes(model):
+    """检测头（最后一个 /model.N/ 模块）中卷积分支 cv2 / cv3 之后的解码部分：DFL、锚点偏移、与类别分数拼接。
+    这部分量化后误差直接落在框坐标上，保持浮点。"""
+    blocks = {n.name.split("/")[1] for n in model.graph.node if n.name.startswith("/model.")}
+    if not blocks:
+        return []
+    prefix = "/%s/" % max(blocks, key=lambda b: int(b.split(".")[1]))
+    return [n.name for n in model.graph.node
+            if n.name.startswith(prefix) and not n.name.startswith((prefix + "cv2.", prefix + "cv3."))]
+
+
+def quantize_int8(onnx_path, output, calib_dir=None, max_images=100):
+    """INT8 量化，返回输出路径。
+
+    给出校准图片目录时做静态量化（QDQ 格式，权重与激活都按校准数据定标，CPU 上提速最明显），
+    检测头的解码部分保持浮点；否则只做权重的动态量化（不需要数据，但卷积网络提速有限）。
+    """
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if not calib_dir:
+        quantize_dynamic(onnx_path, output, weight_type=QuantType.QUInt8)
+        return output
+
+    paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(calib_dir, f"*.{ext}")))
+    if not paths:
+        raise click.ClickException(f"{calib_dir} 中没有校准图片")
+    model = onnx.load(onnx_path)
+    meta = {p.key: p.value for p in model.metadata_props}
+    imgsz = ast.literal_eval(meta.get("imgsz", "[640, 640]"))
+    imgsz = tuple(imgsz) if isinstance(imgsz, (list, tuple)) else (imgsz, imgsz)
+    reader = _CalibrationReader(model.graph.input[0].name, paths[:max_images], imgsz)
+    quantize_static(onnx_path, output, reader, quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    per_channel=True, nodes_to_exclude=_decode_nodes(model))
+    return output
+
+
+def init_app(app):
+    @app.cli.command("export-model")
+    @click.option("--weights", default=None, help="PyTorch 权重，默认 MODEL_PATH")
+    @click.option("--output", default=None, help="导出的 ONNX 文件，默认 ONNX_MODEL_PATH")
+    @click.option("--imgsz", default=None, type=int, help="输入尺寸，默认沿用训练时的尺寸")
+    @click.option("--static-shape", is_flag=True, help="固定批大小为 1、输入为 imgsz 方图（部分推理引擎需要）")
+    @click.option("--int8", is_flag=True, help="另存一份 INT8 量化模型（<output>.int8.onnx）")
+    @click.option("--calib", default=None, help="INT8 静态量化的校准图片目录（如 static/uploads）；不给则做动态量化")
+    def export_model_command(weights, output, imgsz, static_shape, int8, calib):
+        """把 .pt 权重导出为 ONNX Runtime 推理后端使用的 .onnx（INFERENCE_BACKEND=onnx）。"""
+        weights = weights or app.config["MODEL_PATH"]
+        output = output or app.config["ONNX_MODEL_PATH"]
+        path = export_onnx(weights, output, imgsz=imgsz, dynamic=not static_shape)
+        click.echo(f"已导出 {path}")
+        if int8:
+            quantized = quantize_int8(path, os.path.splitext(path)[0] + ".int8.onnx", calib)
+            click.echo(f"已量化 {quantized}（将 ONNX_MODEL_PATH 指向该文件即可使用）")
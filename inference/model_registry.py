@@ -0,0 +1,129 @@
+import os
+import time
+import logging
+import threading
+
+from inference.yolo_detector import YOLODetector
+
+logger = logging.getLogger(__name__)
+
+
+class _ModelEntry:
+    def __init__(self, detector, fingerprint, load_time, warmup_time):
+        self.detector = detector
+        self.fingerprint = fingerprint
+        self.load_time = load_time
+        self.warmup_time = warmup_time
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """进程内的模型缓存：每个权重文件只加载一次，文件变化时热替换。
+
+    以 (绝对路径, mtime, size) 作为指纹；指纹变化时由一个线程重新加载，
+    其余请求在加载期间继续使用旧模型，加载完成后原子替换。
+    热替换加载失败（权重文件拷贝到一半或已损坏）时记录日志并继续使用旧模型，
+    失败的指纹会被记住，文件再次变化前不再重试加载。
+    """
+
+    def __init__(self, warmup=True, warmup_imgsz=640, onnx_options=None):
+        self.warmup = warmup
+        self.warmup_imgsz = warmup_imgsz
+        # 加载 .onnx 权重时传给 OnnxBackend（线程数、执行提供者）
+        self.onnx_options = onnx_options or {}
+        self._entries = {}
+        self._locks = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self.reload_count = 0
+        self.reload_failures = 0
+
+    @staticmethod
+    def _fingerprint(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _path_lock(self, path):
+        with self._lock:
+            lock = self._locks.get(path)
+            if lock is None:
+                lock = self._locks[path] = threading.Lock()
+            return lock
+
+    def _load(self, path, fingerprint):
+        t0 = time.perf_counter()
+        detector = YOLODetector(model_path=path, onnx_options=self.onnx_options)
+        load_time = time.perf_counter() - t0
+
+        warmup_time = None
+        if self.warmup:
+            t0 = time.perf_counter()
+            detector.warmup(self.warmup_imgsz)
+            warmup_time = time.perf_counter() - t0
+
+        logger.info("模型已加载 %s [%s] (load=%.3fs, warmup=%s)", path, detector.backend, load_time,
+                    f"{warmup_time:.3f}s" if warmup_time is not None else "skipped")
+        return _ModelEntry(detector, fingerprint, load_time, warmup_time)
+
+    def get(self, model_path):
+        path = os.path.abspath(model_path)
+        fingerprint = self._fingerprint(path)
+        entry = self._entries.get(path)
+        if entry is not None and fingerprint in (entry.fingerprint, self._failed.get(path)):
+            return entry.detector
+
+        lock = self._path_lock(path)
+        if entry is not None:
+            # 热替换期间不阻塞：另一个线程正在重新加载时继续用旧模型
+            if not lock.acquire(blocking=False):
+                return entry.detector
+        else:
+            lock.acquire()
+        try:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = self._entries[path] = self._load(path, fingerprint)
+            elif fingerprint not in (entry.fingerprint, self._failed.get(path)):
+                try:
+                    new_entry = self._load(path, fingerprint)
+                except Exception:
+                    # 只有还没有可用模型时才向调用方抛出；热替换失败时保留旧模型
+                    logger.exception("模型热替换失败，继续使用旧模型 %s", path)
+                    self._failed[path] = fingerprint
+                    self.reload_failures += 1
+                    return entry.detector
+                self._entries[path] = entry = new_entry
+                self._failed.pop(path, None)
+                self.reload_count += 1
+            return entry.detector
+        finally:
+            lock.release()
+
+    def stats(self):
+        return {
+            "reload_count": self.reload_count,
+            "reload_failures": self.reload_failures,
+            "models": [
+                {
+                    "path": path,
+                    "backend": e.detector.backend,
+                    "mtime_ns": e.fingerprint[0] if e.fingerprint else None,
+                    "size": e.fingerprint[1] if e.fingerprint else None,
+                    "load_time": round(e.load_time, 4),
+                    "warmup_time": round(e.warmup_time, 4) if e.warmup_time is not None else None,
+                    "loaded_at": e.loaded_at,
+                }
+                for path, e in list(self._entries.items())
+            ],
+        }
+
+
+# 每个 worker 进程一个注册表
+registry = ModelRegistry()
+
+
+def get_detector(model_path):
+    return registry.get(model_path)
@@ -0,0 +1,142 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from inference.detections import Detections
+
+
+def tile_windows(width, height, tile=640, overlap=0.2):
+    """把 width×height 的图切成边长 tile、相邻重叠 overlap 比例的窗口 [(x0, y0, x1, y1)]。
+    最后一行/列贴齐图像边缘，所有窗口大小相同；图像小于 tile 的方向只有一个窗口。"""
+    stride = max(1, int(tile * (1 - overlap)))
+
+    def starts(size):
+        if size <= tile:
+            return [0]
+        out = list(range(0, size - tile, stride))
+        out.append(size - tile)
+        return out
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def nms(xyxy, conf, cls, threshold=0.5, metric="ios"):
+    """按类别的贪心 NMS，返回保留框的下标（按置信度降序）。
+
+    metric="ios" 用交集 / 较小框面积：切片边缘被截断的半个框完全落在相邻切片的完整框内，
+    IoU 不高但 IoS 接近 1，也会被合并掉；metric="iou" 为常规 NMS。
+    """
+    if not len(conf):
+        return np.zeros(0, dtype=np.int64)
+    # 不同类别平移到互不重叠的坐标区间，一次循环完成按类别 NMS
+    shift = (xyxy.max() + 1) * cls.astype(np.float64)
+    boxes = xyxy.astype(np.float64) + shift[:, None]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-conf, kind="stable")
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        x1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        if metric == "ios":
+            denom = np.minimum(areas[i], areas[rest])
+        else:
+            denom = areas[i] + areas[rest] - inter
+        overlap = inter / np.maximum(denom, 1e-9)
+        order = rest[overlap <= threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class TiledPredictor:
+    """切片推理：大图切成重叠的 tile×tile 切片（可加一张整图），作为一个批次前向（workers>1 时分给线程池），
+    检测框平移回原图坐标后做跨切片 NMS（full_frame 时先丢弃被切片边缘截断的框）。
+    用于宽幅路面照片中的小目标（易拉罐、果皮、口罩等），
+    整图缩放到模型输入尺寸时这些目标只剩几个像素。
+
+    只有长边不小于 ``min_side`` 的图片走切片，其余仍整图推理。
+    """
+
+    def __init__(self, tile=640, overlap=0.2, merge_threshold=0.5, merge_metric="ios", min_side=1280,
+                 full_frame=True, workers=0):
+        self.tile = tile
+        self.overlap = overlap
+        self.merge_threshold = merge_threshold
+        self.merge_metric = merge_metric
+        self.min_side = min_side
+        self.full_frame = full_frame
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile") if workers > 1 else None
+        self._stats_lock = threading.Lock()
+        self.images = 0
+        self.tiles = 0
+        self.total_time = 0.0
+
+    def applies(self, image):
+        return max(image.shape[:2]) >= self.min_side
+
+    def _run(self, detector, sources):
+        if self._pool is None or len(sources) < 2:
+            return detector.predict(sources)
+        size = -(-len(sources) // self.workers)
+        chunks = [sources[i:i + size] for i in range(0, len(sources), size)]
+        return [r for results in self._pool.map(detector.predict, chunks) for r in results]
+
+    @staticmethod
+    def _truncated(xyxy, x0, y0, x1, y1, width, height, margin=2):
+        """贴着切片内侧边缘（不是原图边缘）的框是被切断的目标：比重叠区小的目标在相邻切片里是完整的，
+        更大的目标由整图那一张负责，这些残框直接丢弃，避免一个目标合并出多个框。"""
+        w, h = x1 - x0, y1 - y0
+        return (((x0 > 0) & (xyxy[:, 0] <= margin)) | ((x1 < width) & (xyxy[:, 2] >= w - margin)) |
+                ((y0 > 0) & (xyxy[:, 1] <= margin)) | ((y1 < height) & (xyxy[:, 3] >= h - margin)))
+
+    def predict(self, detector, image):
+        """对一张 BGR ndarray 做切片推理，返回原图坐标下合并后的 Detections。"""
+        started = time.perf_counter()
+        height, width = image.shape[:2]
+        windows = tile_windows(width, height, self.tile, self.overlap)
+        sources = [np.ascontiguousarray(image[y0:y1, x0:x1]) for x0, y0, x1, y1 in windows]
+        if self.full_frame and len(windows) > 1:
+            # 整图那一张负责跨切片的大目标
+            windows.append((0, 0, width, height))
+            sources.append(image)
+        results = self._run(detector, sources)
+
+        parts = []
+        for (x0, y0, x1, y1), result in zip(windows, results):
+            d = detector.parse_arrays(result)
+            if len(d) and self.full_frame and (x1 - x0, y1 - y0) != (width, height):
+                d = d.select(~self._truncated(d.xyxy, x0, y0, x1, y1, width, height))
+            if len(d):
+                d.xyxy = d.xyxy + np.array([x0, y0, x0, y0], dtype=np.float32)
+                parts.append(d)
+        names = results[0].names if results else {}
+        merged = Detections.concat(parts, names)
+        keep = nms(merged.xyxy, merged.conf, merged.cls, self.merge_threshold, self.merge_metric)
+        merged = merged.select(keep)
+
+        with self._stats_lock:
+            self.images += 1
+            self.tiles += len(sources)
+            self.total_time += time.perf_counter() - started
+        return merged
+
+    def stats(self):
+        with self._stats_lock:
+            images = self.images or 1
+            return {
+                "tile": self.tile,
+                "overlap": self.overlap,
+                "min_side": self.min_side,
+                "full_frame": self.full_frame,
+                "workers": self.workers,
+                "images": self.images,
+                "avg_tiles": round(self.tiles / images, 2),
+                "avg_ms": round(self.total_time / images * 1000.0, 3),
+            }
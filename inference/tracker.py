@@ -0,0 +1,219 @@
+import math
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def meters(lat1, lng1, lat2, lng2):
+    """两点间距离（米），等距圆柱近似，机器人移动的尺度上足够准确。"""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371000.0 * math.hypot(x, y)
+
+
+def iou_matrix(a, b):
+    """a (N,4)、b (M,4) 两组 xyxy 框的两两 IoU，返回 (N,M)。"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    __slots__ = ("track_id", "label", "box", "conf", "lat", "lng", "last_seen", "hits")
+
+    def __init__(self, label, box, conf, lat, lng, now):
+        self.track_id = uuid.uuid4().hex
+        self.label = label
+        self.box = box
+        self.conf = conf
+        self.lat = lat
+        self.lng = lng
+        self.last_seen = now
+        self.hits = 1
+
+
+class TrackPlan:
+    """一帧的关联结果：track_ids[i] 是第 i 个检测框所属的轨迹，new[i] 表示这是新目标。
+    调用方写库成功后再调用 ObjectTracker.apply 更新轨迹状态；写库失败时调用 ObjectTracker.release。"""
+
+    __slots__ = ("device_id", "detections", "track_ids", "new", "lat", "lng", "now", "_matched", "_lock")
+
+    def __init__(self, device_id, detections, lat, lng, now):
+        self.device_id = device_id
+        self.detections = detections
+        self.lat = lat
+        self.lng = lng
+        self.now = now
+        self.track_ids = [None] * len(detections)
+        self.new = np.ones(len(detections), dtype=bool)
+        self._matched = {}  # 检测框下标 -> Track
+        self._lock = None  # match 持有的设备锁，apply/release 时释放
+
+    def updates(self):
+        """已有轨迹本帧的观测：[(track_id, confidence)]。"""
+        conf = self.detections.conf
+        return [(track.track_id, float(conf[i])) for i, track in self._matched.items() if not self.new[i]]
+
+
+class ObjectTracker:
+    """按设备的跨帧目标关联（IoU + 中心距离，贪心匹配）。
+
+    同类别的检测框与轨迹 IoU 不低于 ``iou_threshold`` 时优先匹配；IoU 不够但中心距离不超过
+    框对角线的 ``centroid_ratio`` 倍时次之（机器人前进时目标在画面中平移）。
+    超过 ``max_age`` 秒未再出现的轨迹结束；给出坐标时，与当前位置相距超过 ``max_move`` 米的轨迹不参与匹配，
+    机器人离开后回到原处看到的画面不会被误关联。
+
+    match 到 apply（或 release）之间持有该设备的锁：同一设备并发处理的两帧（同步上传与视频流接入）
+    依次关联，后一帧能看到前一帧新建的轨迹，不会把同一个目标各自当成新目标写入。
+    设备锁按 device_id 哈希分到固定数量的锁上。
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_ratio=0.5, max_age=10.0, max_move=5.0,
+                 max_tracks=256, max_devices=1024, lock_stripes=64):
+        self.iou_threshold = iou_threshold
+        self.centroid_ratio = centroid_ratio
+        self.max_age = max_age
+        self.max_move = max_move
+        self.max_tracks = max_tracks
+        self.max_devices = max_devices
+        self._devices = OrderedDict()  # device_id -> [Track]
+        self._lock = threading.Lock()
+        self._device_locks = [threading.Lock() for _ in range(lock_stripes)]
+        self.observations = 0
+        self.matched = 0
+        self.created = 0
+
+    def _candidates(self, tracks, lat, lng, now):
+        alive = [t for t in tracks if now - t.last_seen <= self.max_age]
+        if lat is None or lng is None:
+            return alive
+        return [t for t in alive
+                if t.lat is None or t.lng is None or meters(lat, lng, t.lat, t.lng) <= self.max_move]
+
+    def match(self, device_id, detections, lat=None, lng=None, now=None):
+        """关联本帧检测框，返回 TrackPlan；返回后该设备的锁保持占用，直到 apply 或 release。"""
+        lock = self._device_locks[hash(device_id) % len(self._device_locks)]
+        lock.acquire()
+        try:
+            plan = self._match(device_id, detections, lat, lng, now)
+        except BaseException:
+            lock.release()
+            raise
+        plan._lock = lock
+        return plan
+
+    def release(self, plan):
+        """释放 match 持有的设备锁（写库失败、不调用 apply 时使用）；可重复调用。"""
+        lock, plan._lock = plan._lock, None
+        if lock is not None:
+            lock.release()
+
+    def _match(self, device_id, detections, lat, lng, now):
+        now = time.time() if now is None else now
+        plan = TrackPlan(device_id, detections, lat, lng, now)
+        if not len(detections):
+            return plan
+        with self._lock:
+            tracks = self._candidates(self._devices.get(device_id, ()), lat, lng, now)
+        if tracks:
+            labels = np.asarray(detections.labels, dtype=object)
+            boxes = detections.xyxy.astype(np.float64)
+            track_boxes = np.array([t.box for t in tracks], dtype=np.float64)
+            same = labels[:, None] == np.asarray([t.label for t in tracks], dtype=object)[None, :]
+
+            iou = iou_matrix(boxes, track_boxes)
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            track_centers = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+            dist = np.linalg.norm(centers[:, None, :] - track_centers[None, :, :], axis=-1)
+            diag = np.maximum(np.hypot(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])[:, None],
+                              np.hypot(track_boxes[:, 2] - track_boxes[:, 0], track_boxes[:, 3] - track_boxes[:, 1])[None, :])
+            near = dist / np.maximum(diag, 1e-9)
+            # IoU 匹配的得分总高于仅靠中心距离的匹配
+            score = np.where(iou >= self.iou_threshold, iou,
+                             np.where(near <= self.centroid_ratio,
+                                      self.iou_threshold * (1 - near / self.centroid_ratio), 0.0))
+            score = np.where(same, score, 0.0)
+
+            used_dets, used_tracks = set(), set()
+            for flat in np.argsort(-score, axis=None):
+                i, j = divmod(int(flat), len(tracks))
+                if score[i, j] <= 0:
+                    break
+                if i in used_dets or j in used_tracks:
+                    continue
+                used_dets.add(i)
+                used_tracks.add(j)
+                plan._matched[i] = tracks[j]
+                plan.track_ids[i] = tracks[j].track_id
+                plan.new[i] = False
+
+        labels = detections.labels
+        for i in np.flatnonzero(plan.new):
+            track = Track(labels[i], detections.xyxy[i].astype(np.float64), float(detections.conf[i]), lat, lng, now)
+            plan._matched[int(i)] = track
+            plan.track_ids[i] = track.track_id
+        return plan
+
+    def apply(self, plan):
+        """写库成功后更新轨迹：已有轨迹移到本帧的位置，新目标加入轨迹表；完成后释放设备锁。"""
+        try:
+            self._apply(plan)
+        finally:
+            self.release(plan)
+
+    def _apply(self, plan):
+        detections = plan.detections
+        with self._lock:
+            tracks = self._devices.get(plan.device_id)
+            if tracks is None:
+                tracks = self._devices[plan.device_id] = []
+                while len(self._devices) > self.max_devices:
+                    self._devices.popitem(last=False)
+            self._devices.move_to_end(plan.device_id)
+            for i, track in plan._matched.items():
+                self.observations += 1
+                if plan.new[i]:
+                    tracks.append(track)
+                    self.created += 1
+                    continue
+                self.matched += 1
+                track.box = detections.xyxy[i].astype(np.float64)
+                track.conf = max(track.conf, float(detections.conf[i]))
+                track.last_seen = plan.now
+                track.hits += 1
+                if plan.lat is not None and plan.lng is not None:
+                    track.lat, track.lng = plan.lat, plan.lng
+            tracks[:] = [t for t in tracks if plan.now - t.last_seen <= self.max_age][-self.max_tracks:]
+
+    def touch(self, device_id, track_ids, now=None):
+        """画面判为重复（未推理）时延长这些轨迹，避免目标仍在视野内时轨迹过期。"""
+        now = time.time() if now is None else now
+        ids = set(track_ids)
+        with self._lock:
+            for track in self._devices.get(device_id, ()):
+                if track.track_id in ids:
+                    track.last_seen = now
+
+    def forget(self, device_id):
+        with self._lock:
+            self._devices.pop(device_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "tracks": sum(len(t) for t in self._devices.values()),
+                "observations": self.observations,
+                "matched": self.matched,
+                "created": self.created,
+                "collapse_rate": round(self.matched / self.observations, 4) if self.observations else 0.0,
+            }
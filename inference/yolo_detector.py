@@ -1,4 +1,9 @@
 import cv2
+import numpy as np
+
+from inference.detections import Detections
+from inference.annotate import draw_boxes
+from inference.backends import OnnxBackend
 
 try:
     from ultralytics import YOLO
@@ -27,25 +32,54 @@ YOLO_CLASS_NAMES = [
 
 
 class YOLODetector:
-    def __init__(self, model_path=None):
-        self.model = YOLO(model_path if model_path else "best.pt")
+    """检测器：.onnx 权重用 ONNX Runtime 后端（onnx_options 为 OnnxBackend 的线程数等参数），其余用 ultralytics/PyTorch。"""
 
-    def detect(self, img_path, save_result=False, result_path=None):
+    def __init__(self, model_path=None, onnx_options=None):
+        model_path = model_path if model_path else "best.pt"
+        if str(model_path).endswith(".onnx"):
+            self.backend = "onnx"
+            self.model = OnnxBackend(model_path, names=dict(enumerate(YOLO_CLASS_NAMES)), **(onnx_options or {}))
+        else:
+            self.backend = "torch"
+            self.model = YOLO(model_path)
+
+    def warmup(self, imgsz=640):
+        # 用空白图跑一次前向，触发权重搬运与算子初始化，避免首个真实请求承担这部分开销
+        blank = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        self.model(blank, verbose=False)
+
+    def predict(self, sources):
+        """对一组图片（路径或 ndarray）做一次批量前向，返回 ultralytics Results 列表。"""
+        return self.model(list(sources), verbose=False)
+
+    @staticmethod
+    def save_annotated(result, result_path):
+        annotated_frame = result.plot()
+        cv2.imwrite(result_path, annotated_frame)
+
+    @staticmethod
+    def save_detections(image, detections, result_path):
+        """直接按 Detections 画框保存（切片推理合并后的结果没有对应的 ultralytics Result）。"""
+        annotated = draw_boxes(image.copy(), detections.xyxy, detections.labels, detections.conf.tolist())
+        cv2.imwrite(result_path, annotated)
 
+    @staticmethod
+    def parse_arrays(result):
+        return Detections.from_result(result)
+
+    @staticmethod
+    def parse_result(result):
+        return Detections.from_result(result).to_list()
+
+    def detect_arrays(self, img_path, save_result=False, result_path=None):
+        """与 detect 相同，但返回列式的 Detections。"""
         results = self.model(img_path)
         result = results[0]
 
         if save_result and result_path:
-            annotated_frame = result.plot()
-            cv2.imwrite(result_path, annotated_frame)
-
-        detections = []
-        for box in result.boxes:
-            coords = box.xyxy[0].tolist()
-            detections.append({
-                "label": result.names[int(box.cls[0])],
-                "confidence": float(box.conf[0]),
-                "bbox": coords
-            })
-        
-        return detections
\ No newline at end of file
+            self.save_annotated(result, result_path)
+
+        return self.parse_arrays(result)
+
+    def detect(self, img_path, save_result=False, result_path=None):
+        return self.detect_arrays(img_path, save_result=save_result, result_path=result_path).to_list()
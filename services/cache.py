@@ -0,0 +1,120 @@
+import time
+import hashlib
+import threading
+from functools import wraps
+from collections import OrderedDict, defaultdict
+
+from flask import current_app, request, Response
+
+
+class DataVersion:
+    """按命名空间计数的数据版本号：写路径 bump，读接口的缓存以版本号作为失效依据。"""
+
+    def __init__(self):
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def bump(self, *namespaces):
+        with self._lock:
+            for ns in namespaces:
+                self._versions[ns] += 1
+
+    def get(self, *namespaces):
+        with self._lock:
+            return tuple(self._versions[ns] for ns in namespaces)
+
+
+class _Entry:
+    __slots__ = ("version", "created", "body", "etag")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.created = time.monotonic()
+        self.body = body
+        self.etag = hashlib.md5(body).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256, lock_stripes=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # 按 key 哈希分条的固定数量的锁：不同查询串不会无限增加锁对象，偶尔撞条只是让两个未命中串行计算
+        self._key_locks = [threading.Lock() for _ in range(lock_stripes)]
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key, version, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                return None
+            if ttl and time.monotonic() - entry.created > ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, version, body):
+        entry = _Entry(version, body)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def key_lock(self, key):
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits,
+                    "misses": self.misses, "not_modified": self.not_modified}
+
+
+# 进程内共享：检测写库 bump "detections"，机器人心跳/管理操作 bump "robots"
+versions = DataVersion()
+response_cache = ResponseCache()
+
+
+def cached_response(*namespaces):
+    """缓存 JSON 读接口：数据版本号不变（且未超过 RESPONSE_CACHE_TTL）时直接复用上次的响应体，
+    同一时刻的并发请求只计算一次；响应带 ETag，客户端 If-None-Match 命中时返回 304。"""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get("RESPONSE_CACHE_ENABLED", True):
+                return view(*args, **kwargs)
+
+            ttl = current_app.config.get("RESPONSE_CACHE_TTL", 0)
+            key = request.full_path
+            version = versions.get(*namespaces)
+            entry = response_cache.get(key, version, ttl)
+            if entry is None:
+                with response_cache.key_lock(key):
+                    entry = response_cache.get(key, version, ttl)
+                    if entry is None:
+                        response_cache.misses += 1
+                        resp = current_app.make_response(view(*args, **kwargs))
+                        payload = resp.get_json(silent=True) if resp.is_json else None
+                        if resp.status_code != 200 or not isinstance(payload, dict) or not payload.get("ok", True):
+                            return resp
+                        entry = response_cache.put(key, version, resp.get_data())
+                    else:
+                        response_cache.hits += 1
+            else:
+                response_cache.hits += 1
+
+            resp = Response(entry.body, mimetype="application/json")
+            resp.set_etag(entry.etag)
+            resp.headers["Cache-Control"] = "no-cache"
+            resp = resp.make_conditional(request)
+            if resp.status_code == 304:
+                response_cache.not_modified += 1
+            return resp
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,418 @@
+import os
+import time
+import uuid
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+import requests
+
+from database.db import db
+from database.models import DetectTask
+from database import rollups
+from services.robot_state import get_robot_state
+from services.geocoder import get_geocoder
+from services.detection import (
+    predict, parse, get_dedup, get_tracker, track, insert_items, ensure_dirs, new_detections,
+    detections_changed, geocell, locate,
+)
+
+logger = logging.getLogger(__name__)
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+
+
+def iter_mjpeg(chunks, max_buffer=4 * 1024 * 1024):
+    """从 multipart/x-mixed-replace 字节流中按 JPEG 起止标记切出每一帧，
+    不依赖分隔符与换行格式（ESP32CAM_Controller.ino 的分段头用的是 \\n）。"""
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        while True:
+            start = buf.find(SOI)
+            if start < 0:
+                del buf[:-1]
+                break
+            end = buf.find(EOI, start + 2)
+            if end < 0:
+                if start:
+                    del buf[:start]
+                if len(buf) > max_buffer:
+                    buf.clear()
+                break
+            yield bytes(buf[start:end + 2])
+            del buf[:end + 2]
+
+
+def iter_file(path, stop):
+    """本地视频/MJPEG 文件按原始帧率读出（用于测试），读完即结束。"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频文件 {path}")
+    interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 10.0)
+    try:
+        next_at = time.monotonic()
+        while not stop.is_set():
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame
+            next_at += interval
+            stop.wait(max(0.0, next_at - time.monotonic()))
+    finally:
+        cap.release()
+
+
+class LatestFrame:
+    """只保留最新一帧的槽位：检测跟不上时新帧直接覆盖未处理的旧帧（latest-frame-wins）。"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.seq = 0
+        self._taken = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame, jpeg):
+        with self._cond:
+            if self._item is not None and self._taken != self.seq:
+                self.dropped += 1
+            self._item = (frame, jpeg)
+            self.seq += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def get(self, after_seq, timeout):
+        """等待比 after_seq 更新的一帧，返回 (seq, frame, jpeg)；超时或已关闭且无新帧时返回 None。"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != after_seq or self.closed, timeout)
+            if self.seq == after_seq:
+                return None
+            self._taken = self.seq
+            return (self.seq,) + self._item
+
+
+class CameraStream:
+    """一台机器人的视频流：读取线程拉流并解码到 LatestFrame，检测线程按目标帧率取最新帧推理。"""
+
+    def __init__(self, ingest, device_id, url, fps):
+        self.ingest = ingest
+        self.device_id = device_id
+        self.url = url
+        self.fps = fps
+        self.slot = LatestFrame()
+        self.state = "connecting"
+        self.error = None
+        self.started_at = datetime.now()
+        self.frames_read = 0
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+        self.tasks_created = 0
+        self.last_task_id = None
+        self.last_counts = Counter()
+        self._stop = threading.Event()
+        self._response = None
+        self._threads = []
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._read_loop, name=f"camera-read-{self.device_id}", daemon=True),
+            threading.Thread(target=self._detect_loop, name=f"camera-detect-{self.device_id}", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        self.slot.close()
+        response = self._response
+        if response is not None:
+            response.close()
+        self.state = "stopped"
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def _frames(self):
+        if self.url.startswith(("http://", "https://")):
+            timeout = self.ingest.timeout
+            self._response = requests.get(self.url, stream=True, timeout=(timeout, timeout))
+            self._response.raise_for_status()
+            for jpeg in iter_mjpeg(self._response.iter_content(chunk_size=16384)):
+                yield None, jpeg
+        else:
+            path = self.url[len("file://"):] if self.url.startswith("file://") else self.url
+            for frame in iter_file(path, self._stop):
+                yield frame, None
+
+    def _read_loop(self):
+        remote = self.url.startswith(("http://", "https://"))
+        while not self._stop.is_set():
+            try:
+                for frame, jpeg in self._frames():
+                    if self._stop.is_set():
+                        break
+                    if frame is None:
+                        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                        if frame is None:
+                            continue
+                    self.state = "streaming"
+                    self.frames_read += 1
+                    self.slot.put(frame, jpeg)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                self.error = str(e)
+                logger.warning("机器人 %s 视频流读取失败：%s", self.device_id, e)
+            finally:
+                if self._response is not None:
+                    self._response.close()
+                    self._response = None
+            if not remote:
+                break
+            # 机器人断线或重启：按间隔重连
+            if not self._stop.is_set():
+                self.state = "reconnecting"
+                self._stop.wait(self.ingest.reconnect)
+        if not self._stop.is_set():
+            self.state = "ended"
+        self.slot.close()
+
+    def _detect_loop(self):
+        interval = 1.0 / self.fps if self.fps > 0 else 0.0
+        seq = 0
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            item = self.slot.get(seq, timeout=1.0)
+            if item is None:
+                if self.slot.closed:
+                    break
+                continue
+            seq, frame, jpeg = item
+            try:
+                self.ingest.process(self, frame, jpeg)
+            except Exception as e:
+                self.error = str(e)
+                logger.exception("机器人 %s 视频帧检测失败", self.device_id)
+            # 限制到目标帧率；落后时不补帧，直接取下一帧最新画面
+            next_at = max(next_at + interval, time.monotonic())
+            self._stop.wait(max(0.0, next_at - time.monotonic()))
+
+    def stats(self):
+        return {
+            "device_id": self.device_id,
+            "url": self.url,
+            "fps": self.fps,
+            "state": self.state,
+            "error": self.error,
+            "started_at": self.started_at.isoformat(),
+            "frames_read": self.frames_read,
+            "frames_dropped": self.slot.dropped,
+            "frames_inferred": self.frames_inferred,
+            "frames_skipped": self.frames_skipped,
+            "tasks_created": self.tasks_created,
+        }
+
+
+class CameraIngest:
+    """机器人摄像头 MJPEG 流接入：每台机器人一个 CameraStream，
+    只有出现新目标（跟踪器判定的新轨迹；未开启跟踪时为某类别数量比上一帧增加）的帧才写成
+    source_type="stream" 的检测任务。
+
+    请求指定的 url 只接受 http(s)，且主机须为机器人上报的 IP 或 allowed_hosts 中的主机
+    （服务端会去拉取该地址）；本地文件（file:// 或路径）只在 allow_files 开启时可用。"""
+
+    def __init__(self, app, url_template, fps=2.0, reconnect=3.0, timeout=10.0,
+                 allowed_hosts=(), allow_files=False):
+        self.app = app
+        self.url_template = url_template
+        self.allowed_hosts = {h.lower() for h in allowed_hosts}
+        self.allow_files = allow_files
+        self.fps = fps
+        self.reconnect = reconnect
+        self.timeout = timeout
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _check_url(self, url, ip):
+        if not isinstance(url, str):
+            raise ValueError("视频流 url 无效")
+        parts = urlsplit(url)
+        if parts.scheme in ("http", "https"):
+            host = (parts.hostname or "").lower()
+            if not host or (host != ip and host not in self.allowed_hosts):
+                raise ValueError("视频流主机不在允许范围内（机器人 IP 或 CAMERA_ALLOWED_HOSTS）")
+        elif parts.scheme in ("", "file"):
+            if not self.allow_files:
+                raise ValueError("未开启本地文件视频源（CAMERA_ALLOW_FILE_SOURCES）")
+        else:
+            raise ValueError("视频流 url 仅支持 http(s)")
+
+    def start(self, device_id, url=None, fps=None):
+        state = get_robot_state(self.app).get(device_id)
+        ip = state.get("ip_address") if state else None
+        if url:
+            self._check_url(url, ip)
+        else:
+            if not ip:
+                raise ValueError("机器人尚未上报 IP 地址，请指定视频流 url")
+            url = self.url_template.format(ip=ip)
+        fps = float(fps) if fps else self.fps
+        with self._lock:
+            old = self._streams.get(device_id)
+            if old is not None and old.running and old.url == url and old.fps == fps:
+                return old.stats()
+            if old is not None:
+                old.stop()
+            stream = CameraStream(self, device_id, url, fps)
+            self._streams[device_id] = stream
+        stream.start()
+        return stream.stats()
+
+    def stop(self, device_id):
+        with self._lock:
+            stream = self._streams.pop(device_id, None)
+        if stream is None:
+            return False
+        stream.stop()
+        return True
+
+    def stop_all(self):
+        with self._lock:
+            streams, self._streams = list(self._streams.values()), {}
+        for stream in streams:
+            stream.stop()
+
+    def stats(self):
+        with self._lock:
+            return [s.stats() for s in self._streams.values()]
+
+    def process(self, stream, frame, jpeg):
+        """检测一帧；出现新目标时写库并返回任务，否则返回 None。
+        与最近推理过的帧几乎相同（机器人静止或缓慢移动）时跳过推理。"""
+        with self.app.app_context():
+            tracker = get_tracker()
+            # 位置取机器人状态存储中的实时坐标
+            state = get_robot_state(self.app).get(stream.device_id) or {}
+            lat, lng = state.get("lat"), state.get("lng")
+            dedup = get_dedup()
+            if dedup is not None:
+                signature, hit = dedup.lookup(stream.device_id, frame, lat, lng)
+                if hit is not None:
+                    stream.frames_skipped += 1
+                    if tracker is not None and hit[2]:
+                        tracker.touch(stream.device_id, hit[2])
+                    return None
+            detector, result = predict(frame)
+            detections = parse(detector, result)
+            stream.frames_inferred += 1
+
+            plan = track(stream.device_id, detections, lat, lng)
+            # 持有该设备的跟踪锁直到 apply，写库失败时释放
+            try:
+                if plan is not None:
+                    fresh = bool(plan.new.any())
+                else:
+                    # 未开启跟踪时按类别数量判断：某类别比上一帧多才算新目标
+                    counts = Counter(detections.labels)
+                    fresh = bool(counts - stream.last_counts)
+                    stream.last_counts = counts
+
+                task = None
+                if fresh:
+                    task = self._persist(stream.device_id, detector, result, detections, frame, jpeg, lat, lng, plan)
+                    stream.tasks_created += 1
+                    stream.last_task_id = task.id
+                elif plan is not None and len(detections):
+                    # 只看到已跟踪的目标：不建任务，只更新原检测项的置信度与最后出现时间
+                    try:
+                        insert_items(None, detections, plan)
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        raise
+                if plan is not None:
+                    tracker.apply(plan)
+            finally:
+                if plan is not None:
+                    tracker.release(plan)
+            if dedup is not None:
+                dedup.remember(stream.device_id, signature,
+                               (stream.last_task_id, detections, plan.track_ids if plan is not None else None),
+                               lat, lng)
+            return task
+
+    def _persist(self, device_id, detector, result, detections, frame, jpeg, lat, lng, plan):
+        ensure_dirs()
+        save_name = f"{uuid.uuid4().hex}.jpg"
+        if jpeg is None:
+            jpeg = cv2.imencode(".jpg", frame)[1].tobytes()
+        with open(os.path.join(self.app.config["UPLOAD_DIR"], save_name), "wb") as f:
+            f.write(jpeg)
+        result_path = None
+        if self.app.config.get("EAGER_ANNOTATION", False):
+            detector.save_annotated(result, os.path.join(self.app.config["RESULT_DIR"], save_name))
+            result_path = f"static/results/{save_name}"
+
+        address, geocode_later = locate(lat, lng)
+        task = DetectTask(
+            source_type="stream",
+            source_path=f"static/uploads/{save_name}",
+            result_path=result_path,
+            device_id=device_id,
+            status="DONE",
+            latitude=lat,
+            longitude=lng,
+            geocell=geocell(lat, lng),
+            location=address,
+            created_at=datetime.now(),
+        )
+        try:
+            db.session.add(task)
+            db.session.flush()
+            insert_items(task.id, detections, plan)
+            labels = new_detections(detections, plan).labels
+            rollups.record_detection(task, labels)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        detections_changed([(task, labels)])
+        if geocode_later:
+            get_geocoder(self.app).enqueue(task.id, lat, lng)
+        return task
+
+
+_ingest_lock = threading.Lock()
+
+
+def get_camera_ingest(app):
+    ingest = app.extensions.get("camera_ingest")
+    if ingest is None:
+        with _ingest_lock:
+            ingest = app.extensions.get("camera_ingest")
+            if ingest is None:
+                ingest = CameraIngest(
+                    app,
+                    url_template=app.config.get("CAMERA_STREAM_URL", "http://{ip}:8080/stream"),
+                    fps=app.config.get("CAMERA_TARGET_FPS", 2.0),
+                    reconnect=app.config.get("CAMERA_RECONNECT", 3.0),
+                    timeout=app.config.get("CAMERA_TIMEOUT", 10.0),
+                    allowed_hosts=app.config.get("CAMERA_ALLOWED_HOSTS", ()),
+                    allow_files=app.config.get("CAMERA_ALLOW_FILE_SOURCES", False),
+                )
+                atexit.register(ingest.stop_all)
+                app.extensions["camera_ingest"] = ingest
+    return ingest
@@ -0,0 +1,266 @@
+import time
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from database.db import db
+from database.models import RobotCommand
+
+logger = logging.getLogger(__name__)
+
+
+class CommandNotifier:
+    """进程内的命令到达通知：长轮询请求按 robot_id 等待，入队时只唤醒对应机器人的等待者。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conds = {}
+        self._waiters = defaultdict(int)
+        self._generation = defaultdict(int)
+
+    def generation(self, robot_id):
+        with self._lock:
+            return self._generation[robot_id]
+
+    def notify(self, robot_id):
+        with self._lock:
+            self._generation[robot_id] += 1
+            cond = self._conds.get(robot_id)
+            if cond is not None:
+                cond.notify_all()
+
+    def wait(self, robot_id, generation, timeout):
+        """等待 generation 变化（有新命令入队）或超时，返回是否被唤醒。"""
+        with self._lock:
+            cond = self._conds.get(robot_id)
+            if cond is None:
+                cond = self._conds[robot_id] = threading.Condition(self._lock)
+            self._waiters[robot_id] += 1
+            try:
+                return cond.wait_for(lambda: self._generation[robot_id] != generation, timeout)
+            finally:
+                self._waiters[robot_id] -= 1
+                if not self._waiters[robot_id]:
+                    del self._waiters[robot_id]
+                    del self._conds[robot_id]
+
+    def waiting(self):
+        with self._lock:
+            return sum(self._waiters.values())
+
+
+class CommandQueue:
+    """基于 robot_command 表的每台机器人命令队列。
+
+    - enqueue：按 robot 分配递增 seq 写入 QUEUED；
+    - claim：取 seq 最小的可投递命令，用带原状态条件的 UPDATE 认领（rowcount 为 1 才算成功），
+      并发心跳不会重复投递同一条命令；
+    - ack：机器人回执后置为 ACKED；ack_timeout 大于 0 时，DELIVERED 超过 ack_timeout 未回执的会重新投递，
+      最多 max_attempts 次；超过 expires_at 的命令置为 EXPIRED。
+
+    重投只针对回执过至少一条命令的机器人（不发回执的旧固件不会收到重放），
+    且已有更新的命令投递给该机器人后，较旧的未回执命令不再重投，避免把过时的动作命令重放给机器人。
+    """
+
+    def __init__(self, app, ttl=300, ack_timeout=0, max_attempts=3, sweep_interval=30):
+        self.app = app
+        self.ttl = ttl
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self._engine = None
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self.notifier = CommandNotifier()
+        self.stats_counts = {"enqueued": 0, "delivered": 0, "redelivered": 0,
+                             "acked": 0, "expired": 0, "claim_conflicts": 0}
+
+    def _get_engine(self):
+        if self._engine is None:
+            with self.app.app_context():
+                self._engine = db.engine
+        return self._engine
+
+    def enqueue(self, robot_id, command, target_lat=None, target_lng=None, ttl=None):
+        table = RobotCommand.__table__
+        now = datetime.now()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + timedelta(seconds=ttl) if ttl else None
+        for _ in range(5):
+            try:
+                with self._get_engine().begin() as conn:
+                    seq = conn.execute(
+                        select(func.coalesce(func.max(table.c.seq), 0) + 1)
+                        .where(table.c.robot_id == robot_id)
+                    ).scalar()
+                    result = conn.execute(table.insert().values(
+                        robot_id=robot_id, seq=seq, command=command,
+                        target_lat=target_lat, target_lng=target_lng,
+                        status="QUEUED", attempts=0, created_at=now, expires_at=expires_at))
+                self.stats_counts["enqueued"] += 1
+                self.notifier.notify(robot_id)
+                return {"id": result.inserted_primary_key[0], "seq": seq, "command": command}
+            except IntegrityError:
+                # 并发入队拿到同一个 seq，重试
+                continue
+        raise RuntimeError("命令入队失败：seq 冲突")
+
+    @staticmethod
+    def _redeliverable():
+        """可重投的 DELIVERED 命令：该机器人回执过命令，且之后没有更新的命令已投递或已回执。"""
+        table = RobotCommand.__table__
+        acked = table.alias("acked")
+        later = table.alias("later")
+        return and_(
+            table.c.status == "DELIVERED",
+            select(acked.c.id)
+            .where(acked.c.robot_id == table.c.robot_id, acked.c.status == "ACKED")
+            .exists(),
+            ~select(later.c.id)
+            .where(later.c.robot_id == table.c.robot_id, later.c.seq > table.c.seq,
+                   later.c.status.in_(("DELIVERED", "ACKED")))
+            .exists(),
+        )
+
+    def _claimable(self, now):
+        table = RobotCommand.__table__
+        condition = table.c.status == "QUEUED"
+        if self.ack_timeout:
+            condition = or_(condition, and_(
+                self._redeliverable(),
+                table.c.attempts < self.max_attempts,
+                table.c.delivered_at < now - timedelta(seconds=self.ack_timeout)))
+        return and_(condition, or_(table.c.expires_at.is_(None), table.c.expires_at > now))
+
+    def claim(self, robot_id):
+        """认领下一条命令，返回 (命令字典或 None, 是否仍有待回执/待投递的命令)。
+
+        每次尝试使用独立事务：MySQL 默认 REPEATABLE READ，同一事务内重新 SELECT 仍是旧快照，
+        会反复读到刚被并发请求认领的那一行。重试次数用尽（一直冲突）时按仍有命令返回，
+        调用方不能据此把队列标记为已清空。
+        """
+        self._maybe_sweep()
+        table = RobotCommand.__table__
+        now = datetime.now()
+        for _ in range(5):
+            with self._get_engine().begin() as conn:
+                row = conn.execute(
+                    select(table.c.id, table.c.seq, table.c.command, table.c.status, table.c.attempts,
+                           table.c.target_lat, table.c.target_lng)
+                    .where(table.c.robot_id == robot_id, self._claimable(now))
+                    .order_by(table.c.seq)
+                    .limit(1)
+                ).first()
+                if row is None:
+                    break
+                result = conn.execute(
+                    update(table)
+                    .where(table.c.id == row.id, table.c.status == row.status,
+                           table.c.attempts == row.attempts)
+                    .values(status="DELIVERED", delivered_at=now, attempts=row.attempts + 1))
+            if result.rowcount == 1:
+                self.stats_counts["delivered"] += 1
+                if row.status == "DELIVERED":
+                    self.stats_counts["redelivered"] += 1
+                return {"id": row.id, "seq": row.seq, "command": row.command,
+                        "target": {"lat": row.target_lat, "lng": row.target_lng}}, True
+            self.stats_counts["claim_conflicts"] += 1
+        else:
+            return None, True
+
+        if not self.ack_timeout:
+            return None, False
+        with self._get_engine().connect() as conn:
+            outstanding = conn.execute(
+                select(table.c.id)
+                .where(table.c.robot_id == robot_id, self._redeliverable(),
+                       table.c.attempts < self.max_attempts,
+                       or_(table.c.expires_at.is_(None), table.c.expires_at > now))
+                .limit(1)
+            ).first()
+        return None, outstanding is not None
+
+    def ack(self, robot_id, command_ids):
+        ids = [int(i) for i in command_ids if i is not None]
+        if not ids:
+            return 0
+        table = RobotCommand.__table__
+        with self._get_engine().begin() as conn:
+            result = conn.execute(
+                update(table)
+                .where(table.c.robot_id == robot_id, table.c.id.in_(ids),
+                       table.c.status == "DELIVERED")
+                .values(status="ACKED", acked_at=datetime.now()))
+        self.stats_counts["acked"] += result.rowcount
+        return result.rowcount
+
+    def pending(self, robot_id):
+        table = RobotCommand.__table__
+        with self._get_engine().connect() as conn:
+            rows = conn.execute(
+                select(table)
+                .where(table.c.robot_id == robot_id, table.c.status.in_(("QUEUED", "DELIVERED")))
+                .order_by(table.c.seq)
+            ).all()
+        return [{"id": r.id, "seq": r.seq, "command": r.command, "status": r.status,
+                 "attempts": r.attempts} for r in rows]
+
+    def delete_robot(self, robot_id):
+        table = RobotCommand.__table__
+        with self._get_engine().begin() as conn:
+            conn.execute(table.delete().where(table.c.robot_id == robot_id))
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_sweep = now
+            self.sweep()
+        except Exception:
+            logger.exception("清理过期机器人命令失败")
+        finally:
+            self._sweep_lock.release()
+
+    def sweep(self):
+        """把过期或重试次数用尽的命令置为 EXPIRED。"""
+        table = RobotCommand.__table__
+        now = datetime.now()
+        expired = and_(table.c.status.in_(("QUEUED", "DELIVERED")),
+                       table.c.expires_at.isnot(None), table.c.expires_at <= now)
+        if self.ack_timeout:
+            expired = or_(expired, and_(
+                table.c.status == "DELIVERED",
+                table.c.attempts >= self.max_attempts,
+                table.c.delivered_at < now - timedelta(seconds=self.ack_timeout)))
+        with self._get_engine().begin() as conn:
+            result = conn.execute(update(table).where(expired).values(status="EXPIRED"))
+        self.stats_counts["expired"] += result.rowcount
+        return result.rowcount
+
+    def stats(self):
+        return {"ttl": self.ttl, "ack_timeout": self.ack_timeout, "max_attempts": self.max_attempts,
+                "long_poll_waiters": self.notifier.waiting(), **self.stats_counts}
+
+
+_queue_lock = threading.Lock()
+
+
+def get_command_queue(app):
+    queue = app.extensions.get("command_queue")
+    if queue is None:
+        with _queue_lock:
+            queue = app.extensions.get("command_queue")
+            if queue is None:
+                queue = CommandQueue(
+                    app,
+                    ttl=app.config.get("COMMAND_TTL", 300),
+                    ack_timeout=app.config.get("COMMAND_ACK_TIMEOUT", 0),
+                    max_attempts=app.config.get("COMMAND_MAX_ATTEMPTS", 3),
+                )
+                app.extensions["command_queue"] = queue
+    return queue
@@ -0,0 +1,235 @@
+import os
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+from flask import current_app
+from sqlalchemy import insert, update, bindparam, case, func
+
+from database.db import db
+from database.models import DetectItem
+from inference.model_registry import registry
+from inference.backends import model_path_for
+from inference.yolo_detector import YOLODetector
+from inference.batcher import BatchScheduler
+from inference.dedup import FrameDeduplicator
+from inference.tracker import ObjectTracker
+from inference.tiling import TiledPredictor
+from services.geocoder import get_geocoder
+from services import geohash
+from services.cache import versions
+from services.pubsub import broker
+
+# 检测流程的公共部分：/api/detect、异步检测任务与摄像头视频流接入共用（需在应用上下文中调用）
+
+_batcher_lock = threading.Lock()
+_dedup_lock = threading.Lock()
+_tracker_lock = threading.Lock()
+_tiler_lock = threading.Lock()
+
+
+def detections_changed(entries):
+    """提交后调用：失效读缓存，并向 /api/stream 推送 detection 事件。entries：[(task, labels)]。"""
+    versions.bump("detections")
+    for task, labels in entries:
+        broker.publish("detection", {**task.to_dict(), "labels": sorted(set(labels)), "count": len(labels)})
+
+
+def ensure_dirs():
+    upload_dir = current_app.config.get("UPLOAD_DIR", "static/uploads")
+    result_dir = current_app.config.get("RESULT_DIR", "static/results")
+    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(result_dir, exist_ok=True)
+
+
+def model_path():
+    path = model_path_for(current_app.config)
+    if path and os.path.exists(path):
+        return path
+    return "best.onnx" if current_app.config.get("INFERENCE_BACKEND") == "onnx" else "best.pt"
+
+
+def get_detector():
+    return registry.get(model_path())
+
+
+def get_batcher():
+    if not current_app.config.get("BATCH_INFERENCE"):
+        return None
+    batcher = current_app.extensions.get("batcher")
+    if batcher is None:
+        with _batcher_lock:
+            batcher = current_app.extensions.get("batcher")
+            if batcher is None:
+                path = model_path()
+                batcher = BatchScheduler(
+                    lambda: registry.get(path),
+                    max_batch_size=current_app.config.get("BATCH_MAX_SIZE", 8),
+                    max_wait_ms=current_app.config.get("BATCH_MAX_WAIT_MS", 10),
+                    max_queue=current_app.config.get("BATCH_QUEUE_LIMIT", 256),
+                )
+                current_app.extensions["batcher"] = batcher
+    return batcher
+
+
+def get_tiler():
+    if not current_app.config.get("TILED_INFERENCE"):
+        return None
+    tiler = current_app.extensions.get("tiler")
+    if tiler is None:
+        with _tiler_lock:
+            tiler = current_app.extensions.get("tiler")
+            if tiler is None:
+                tiler = TiledPredictor(
+                    tile=current_app.config.get("TILE_SIZE", 640),
+                    overlap=current_app.config.get("TILE_OVERLAP", 0.2),
+                    merge_threshold=current_app.config.get("TILE_MERGE_THRESHOLD", 0.5),
+                    min_side=current_app.config.get("TILE_MIN_SIDE", 1280),
+                    full_frame=current_app.config.get("TILE_FULL_FRAME", True),
+                    workers=current_app.config.get("TILE_WORKERS", 0),
+                )
+                current_app.extensions["tiler"] = tiler
+    return tiler
+
+
+def get_dedup():
+    if not current_app.config.get("FRAME_DEDUP"):
+        return None
+    dedup = current_app.extensions.get("frame_dedup")
+    if dedup is None:
+        with _dedup_lock:
+            dedup = current_app.extensions.get("frame_dedup")
+            if dedup is None:
+                dedup = FrameDeduplicator(
+                    method=current_app.config.get("FRAME_DEDUP_METHOD", "thumb"),
+                    threshold=current_app.config.get("FRAME_DEDUP_THRESHOLD", 1),
+                    history=current_app.config.get("FRAME_DEDUP_HISTORY", 8),
+                    delta=current_app.config.get("FRAME_DEDUP_DELTA", 20),
+                    max_age=current_app.config.get("FRAME_DEDUP_MAX_AGE", 300.0),
+                    max_move=current_app.config.get("FRAME_DEDUP_MAX_MOVE", 5.0),
+                )
+                current_app.extensions["frame_dedup"] = dedup
+    return dedup
+
+
+def get_tracker():
+    if not current_app.config.get("TRACKING"):
+        return None
+    tracker = current_app.extensions.get("tracker")
+    if tracker is None:
+        with _tracker_lock:
+            tracker = current_app.extensions.get("tracker")
+            if tracker is None:
+                tracker = ObjectTracker(
+                    iou_threshold=current_app.config.get("TRACK_IOU", 0.3),
+                    centroid_ratio=current_app.config.get("TRACK_CENTROID_RATIO", 0.5),
+                    max_age=current_app.config.get("TRACK_MAX_AGE", 10.0),
+                    max_move=current_app.config.get("TRACK_MAX_MOVE", 5.0),
+                )
+                current_app.extensions["tracker"] = tracker
+    return tracker
+
+
+def track(device_id, detections, lat=None, lng=None):
+    """带 device_id 时把本帧检测框与该设备的已有轨迹关联，返回 TrackPlan；
+    未开启跟踪或没有设备时返回 None（每个框都写成新的检测项）。
+    返回的 TrackPlan 占用该设备的跟踪锁，调用方须在写库后调用 apply，失败时调用 release。"""
+    tracker = get_tracker() if device_id else None
+    if tracker is None:
+        return None
+    return tracker.match(device_id, detections, lat, lng)
+
+
+def predict(source):
+    """单张图片（路径或 ndarray）前向，返回 (detector, ultralytics Result)；
+    开启 BATCH_INFERENCE 时交给微批调度器与其他请求合并前向。"""
+    detector = get_detector()
+    batcher = get_batcher()
+    if batcher is not None:
+        return detector, batcher.infer(source)
+    return detector, detector.predict([source])[0]
+
+
+def parse(detector, result):
+    return detector.parse_arrays(result).filter(current_app.config.get("DETECT_MIN_CONFIDENCE", 0.0))
+
+
+def infer_tiled(tiler, image, result_path=None):
+    """大图切片推理（切片直接组成一个批次，不经过微批调度器）。"""
+    detections = tiler.predict(get_detector(), image)
+    if result_path:
+        YOLODetector.save_detections(image, detections, result_path)
+    return detections.filter(current_app.config.get("DETECT_MIN_CONFIDENCE", 0.0))
+
+
+def infer(source, result_path=None):
+    """单张图片推理，返回过滤后的 Detections；给出 result_path 时保存标注图。
+    开启 TILED_INFERENCE 且图片足够大时改为切片推理。"""
+    tiler = get_tiler()
+    if tiler is not None:
+        image = cv2.imread(source, cv2.IMREAD_COLOR) if isinstance(source, str) else source
+        if image is not None and tiler.applies(image):
+            return infer_tiled(tiler, image, result_path)
+        if image is not None:
+            source = image
+    detector, result = predict(source)
+    if result_path:
+        detector.save_annotated(result, result_path)
+    return parse(detector, result)
+
+
+def item_rows(task_id, detections):
+    """把 Detections 转成 detect_item 行；坐标取整与面积直接在数组上计算。"""
+    if not len(detections):
+        return []
+    coords = detections.xyxy.astype(np.int64).tolist()
+    areas = detections.areas().astype(np.int64).tolist()
+    return [{
+        "task_id": task_id,
+        "label": label,
+        "confidence": conf,
+        "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+        "area": area,
+        "handle_state": "NEW"
+    } for label, conf, (x1, y1, x2, y2), area in zip(detections.labels, detections.conf.tolist(), coords, areas)]
+
+
+def new_detections(detections, plan):
+    """本帧需要写成新检测项的框：没有跟踪时为全部，有跟踪时只有新目标。"""
+    return detections if plan is None else detections.select(plan.new)
+
+
+def insert_items(task_id, detections, plan=None):
+    # Core insert + executemany，避免逐个 ORM 对象的 unit-of-work 开销
+    rows = item_rows(task_id, new_detections(detections, plan))
+    if plan is not None:
+        now = datetime.fromtimestamp(plan.now)
+        for row, track_id in zip(rows, [t for t, new in zip(plan.track_ids, plan.new) if new]):
+            row.update(track_id=track_id, seen_count=1, last_seen_at=now)
+        # 已跟踪的目标不再新增行：置信度取最大值，累加出现次数并记录最后出现时间
+        updates = [{"tid": tid, "conf": conf, "seen": now} for tid, conf in plan.updates()]
+        if updates:
+            table = DetectItem.__table__
+            db.session.execute(
+                update(table).where(table.c.track_id == bindparam("tid")).values(
+                    confidence=case((table.c.confidence < bindparam("conf"), bindparam("conf")),
+                                    else_=table.c.confidence),
+                    seen_count=func.coalesce(table.c.seen_count, 1) + 1,
+                    last_seen_at=bindparam("seen")),
+                updates)
+    if rows:
+        db.session.execute(insert(DetectItem), rows)
+    return len(rows)
+
+
+def geocell(lat, lng):
+    return geohash.encode(lat, lng) if lat is not None and lng is not None else None
+
+
+def locate(lat, lng):
+    """请求路径上的地址：只查缓存，未命中时返回占位文本并标记由后台补全（见 GEOCODE_MODE）。"""
+    if lat is None or lng is None:
+        return "未知地点", False
+    address, deferred = get_geocoder(current_app._get_current_object()).locate(lat, lng)
+    return address[:100], deferred
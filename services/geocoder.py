@@ -0,0 +1,329 @@
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import requests
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from database.db import db
+from database.models import DetectTask, GeoCache
+
+logger = logging.getLogger(__name__)
+
+
+class NominatimBackend:
+    def __init__(self, url="https://nominatim.openstreetmap.org/reverse", user_agent=None, timeout=5):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {
+            "User-Agent": user_agent or "Mozilla/5.0 (compatible; DetectApp/1.0; +http://yourdomain.com/)"
+        }
+
+    def reverse(self, lat, lng):
+        params = {"format": "json", "lat": lat, "lon": lng, "zoom": 10, "addressdetails": 1}
+        response = requests.get(self.url, params=params, headers=self.headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get("display_name")
+
+
+class StubBackend:
+    """离线/测试用的本地解析器：不访问网络，按坐标生成地址文本。"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def reverse(self, lat, lng):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return f"stub:{lat:.4f},{lng:.4f}"
+
+
+class RateLimiter:
+    """最小调用间隔限流（Nominatim 要求每秒不超过 1 次请求）。"""
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RedisRateLimiter:
+    """跨进程的最小调用间隔限流：所有 worker 共用一个 Redis 键，SET NX PX 成功的进程获得这次调用，
+    其余进程等到键过期后再争抢，多进程部署时合计仍不超过每 min_interval 秒一次。"""
+
+    def __init__(self, url, min_interval=1.0, key="geocoder:rate"):
+        import redis
+        self.r = redis.Redis.from_url(url)
+        self.min_interval = min_interval
+        self.key = key
+
+    def acquire(self):
+        interval_ms = max(1, int(self.min_interval * 1000))
+        while not self.r.set(self.key, 1, nx=True, px=interval_ms):
+            remaining = self.r.pttl(self.key)
+            time.sleep(remaining / 1000.0 if remaining and remaining > 0 else 0.01)
+
+
+_RECOVER = object()
+
+
+class Geocoder:
+    """逆地理编码：坐标按网格量化后缓存（内存 LRU + geo_cache 表），同一网格的并发请求合并为
+    一次外部调用，外部调用受限流保护；deferred 模式下请求路径只查缓存，未命中时由后台线程补全
+    DetectTask.location。
+
+    补全队列只在内存中，进程重启后由 recover() 重新扫描地址仍是占位文本的任务。
+    limiter 缺省为进程内限流，多进程部署需传入 RedisRateLimiter。"""
+
+    PLACEHOLDER_PREFIX = "坐标： "
+
+    def __init__(self, app, backend, mode="deferred", grid=0.01, cache_size=4096, min_interval=1.0,
+                 limiter=None):
+        self.app = app
+        self.backend = backend
+        self.mode = mode
+        self.grid = grid
+        self.cache_size = cache_size
+        self.limiter = limiter or RateLimiter(min_interval)
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+        self._engine = None
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        self.stats_counts = {"memory_hits": 0, "db_hits": 0, "lookups": 0,
+                             "coalesced": 0, "failures": 0, "deferred": 0, "recovered": 0}
+
+    @classmethod
+    def placeholder(cls, lat, lng):
+        return f"{cls.PLACEHOLDER_PREFIX}{lat}, {lng}"
+
+    def cell_key(self, lat, lng):
+        return f"{round(float(lat) / self.grid)}:{round(float(lng) / self.grid)}@{self.grid}"
+
+    def _get_engine(self):
+        # 缓存 engine，后台线程与请求线程都无需依赖应用上下文
+        if self._engine is None:
+            with self.app.app_context():
+                self._engine = db.engine
+        return self._engine
+
+    # ---- 缓存 ----
+    def _memory_get(self, key):
+        with self._cache_lock:
+            address = self._cache.get(key)
+            if address is not None:
+                self._cache.move_to_end(key)
+            return address
+
+    def _memory_put(self, key, address):
+        with self._cache_lock:
+            self._cache[key] = address
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _db_get(self, key):
+        try:
+            with self._get_engine().connect() as conn:
+                return conn.execute(
+                    select(GeoCache.address).where(GeoCache.cell_key == key)
+                ).scalar()
+        except SQLAlchemyError:
+            logger.debug("geo_cache 读取失败", exc_info=True)
+            return None
+
+    def _db_put(self, key, lat, lng, address):
+        try:
+            with self._get_engine().begin() as conn:
+                conn.execute(insert(GeoCache).values(
+                    cell_key=key, latitude=lat, longitude=lng, address=address[:255]))
+        except IntegrityError:
+            pass  # 其他进程已写入同一网格
+        except SQLAlchemyError:
+            logger.debug("geo_cache 写入失败", exc_info=True)
+
+    def cached(self, lat, lng):
+        key = self.cell_key(lat, lng)
+        address = self._memory_get(key)
+        if address is not None:
+            self.stats_counts["memory_hits"] += 1
+            return address
+        address = self._db_get(key)
+        if address is not None:
+            self.stats_counts["db_hits"] += 1
+            self._memory_put(key, address)
+        return address
+
+    # ---- 解析 ----
+    def resolve(self, lat, lng):
+        """同步解析（带缓存、合并与限流），失败时返回坐标文本。"""
+        lat, lng = float(lat), float(lng)
+        address = self.cached(lat, lng)
+        if address is not None:
+            return address
+
+        key = self.cell_key(lat, lng)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats_counts["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            self.limiter.acquire()
+            self.stats_counts["lookups"] += 1
+            address = self.backend.reverse(lat, lng)
+            if address:
+                self._memory_put(key, address)
+                self._db_put(key, lat, lng, address)
+            else:
+                address = f"坐标： {lat}, {lng} (无法解析地址)"
+        except Exception:
+            logger.exception("地址解析失败")
+            self.stats_counts["failures"] += 1
+            address = f"坐标： {lat}, {lng} (解析地址失败)"
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        future.set_result(address)
+        return address
+
+    def locate(self, lat, lng):
+        """请求路径使用，返回 (地址, 是否需要后台补全)。"""
+        if self.mode == "off":
+            return self.placeholder(lat, lng), False
+        address = self.cached(lat, lng)
+        if address is not None:
+            return address, False
+        if self.mode == "deferred":
+            return self.placeholder(lat, lng), True
+        return self.resolve(lat, lng), False
+
+    # ---- 后台补全 ----
+    def enqueue(self, task_id, lat, lng):
+        self.stats_counts["deferred"] += 1
+        self._ensure_worker()
+        self._queue.put((task_id, float(lat), float(lng)))
+
+    def recover(self):
+        """让后台线程先扫描一遍仍是占位地址的任务（上次运行时排队但未补全的），再处理新的补全请求。"""
+        self._ensure_worker()
+        self._queue.put(_RECOVER)
+
+    def _requeue_placeholders(self, limit=1000):
+        # 占位文本为 "坐标： lat, lng"；解析失败时写入的文本以括号结尾，不在此重试
+        with self._get_engine().connect() as conn:
+            rows = conn.execute(
+                select(DetectTask.id, DetectTask.latitude, DetectTask.longitude)
+                .where(DetectTask.location.like(f"{self.PLACEHOLDER_PREFIX}%"),
+                       ~DetectTask.location.like("%)"),
+                       DetectTask.latitude.isnot(None), DetectTask.longitude.isnot(None))
+                .order_by(DetectTask.id.desc())
+                .limit(limit)
+            ).all()
+        for row in rows:
+            self._queue.put((row.id, float(row.latitude), float(row.longitude)))
+        self.stats_counts["recovered"] += len(rows)
+        if rows:
+            logger.info("重新排队补全 %d 个占位地址的任务", len(rows))
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="geocoder", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _RECOVER:
+                try:
+                    self._requeue_placeholders()
+                except Exception:
+                    logger.exception("扫描待补全地址的任务失败")
+                continue
+            task_id, lat, lng = item
+            try:
+                address = self.resolve(lat, lng)
+                with self._get_engine().begin() as conn:
+                    conn.execute(update(DetectTask)
+                                 .where(DetectTask.id == task_id)
+                                 .values(location=address[:100]))
+            except Exception:
+                logger.exception("补全任务 %s 的地址失败", task_id)
+
+    def stats(self):
+        with self._cache_lock:
+            size = len(self._cache)
+        return {"mode": self.mode, "grid": self.grid, "cache_size": size,
+                "queue_depth": self._queue.qsize(), **self.stats_counts}
+
+
+_geocoder_lock = threading.Lock()
+
+
+def _make_backend(config):
+    name = config.get("GEOCODER_BACKEND", "nominatim")
+    if name == "stub":
+        return StubBackend()
+    return NominatimBackend(
+        url=config.get("GEOCODE_URL", "https://nominatim.openstreetmap.org/reverse"),
+        user_agent=config.get("GEOCODE_USER_AGENT"),
+        timeout=config.get("GEOCODE_TIMEOUT", 5),
+    )
+
+
+def _make_limiter(config):
+    min_interval = config.get("GEOCODE_MIN_INTERVAL", 1.0)
+    url = config.get("GEOCODE_RATE_LIMIT_REDIS_URL")
+    if url:
+        return RedisRateLimiter(url, min_interval)
+    if config.get("GEOCODER_BACKEND", "nominatim") != "stub":
+        logger.warning("逆地理编码限流只在本进程内生效；多 worker 部署请设置 GEOCODE_RATE_LIMIT_REDIS_URL")
+    return RateLimiter(min_interval)
+
+
+def get_geocoder(app):
+    geocoder = app.extensions.get("geocoder")
+    if geocoder is None:
+        with _geocoder_lock:
+            geocoder = app.extensions.get("geocoder")
+            if geocoder is None:
+                geocoder = Geocoder(
+                    app,
+                    _make_backend(app.config),
+                    mode=app.config.get("GEOCODE_MODE", "deferred"),
+                    grid=app.config.get("GEOCODE_GRID_DEG", 0.01),
+                    cache_size=app.config.get("GEOCODE_CACHE_SIZE", 4096),
+                    min_interval=app.config.get("GEOCODE_MIN_INTERVAL", 1.0),
+                    limiter=_make_limiter(app.config),
+                )
+                app.extensions["geocoder"] = geocoder
+    return geocoder
@@ -0,0 +1,109 @@
+"""Geohash 编码与视口覆盖计算，供 detect_task.geocell 空间索引和地图聚合使用。
+
+geohash 的前缀即所在的更大网格，按前缀做字符串范围查询就能走 geocell 上的普通 B 树索引。
+"""
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# 存库精度：9 位约 4.8m x 4.8m
+PRECISION = 9
+# 字符串范围上界：大于 BASE32 中所有字符
+RANGE_END = "~"
+
+
+def encode(lat, lng, precision=PRECISION):
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[ch])
+            bits = ch = 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """返回该精度网格的 (纬度高, 经度宽)，单位度。"""
+    total = 5 * precision
+    lng_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def _split(bbox):
+    # 跨越 180° 经线的视口拆成两段
+    west, south, east, north = bbox
+    south, north = max(south, -90.0), min(north, 90.0)
+    if east - west >= 360:
+        return [(-180.0, south, 180.0, north)]
+    west = (west + 180) % 360 - 180
+    east = (east + 180) % 360 - 180
+    if west <= east:
+        return [(west, south, east, north)]
+    return [(west, south, 180.0, north), (-180.0, south, east, north)]
+
+
+def _cells(box, precision):
+    west, south, east, north = box
+    h, w = cell_size(precision)
+    lat0, lat1 = math.floor((south + 90) / h), math.floor((min(north, 89.999999) + 90) / h)
+    lng0, lng1 = math.floor((west + 180) / w), math.floor((min(east, 179.999999) + 180) / w)
+    return lat0, lat1, lng0, lng1
+
+
+def cover(bbox, max_cells=16):
+    """覆盖视口 (west, south, east, north) 的 geohash 前缀列表：取格子数不超过 max_cells 的最高精度。
+    即使 1 位精度也超过 max_cells 时返回 None，表示不按前缀过滤。"""
+    boxes = _split(bbox)
+    best = None
+    for precision in range(1, PRECISION + 1):
+        count = 0
+        for box in boxes:
+            lat0, lat1, lng0, lng1 = _cells(box, precision)
+            count += (lat1 - lat0 + 1) * (lng1 - lng0 + 1)
+        if count > max_cells:
+            break
+        best = precision
+    if best is None:
+        return None
+
+    h, w = cell_size(best)
+    prefixes = set()
+    for box in boxes:
+        lat0, lat1, lng0, lng1 = _cells(box, best)
+        for i in range(lat0, lat1 + 1):
+            for j in range(lng0, lng1 + 1):
+                prefixes.add(encode(-90 + (i + 0.5) * h, -180 + (j + 0.5) * w, best))
+    return sorted(prefixes)
+
+
+def cluster_precision(zoom, cluster_px=80):
+    """按地图缩放级别选择聚合精度：网格在屏幕上的宽度不小于 cluster_px 像素（Web 墨卡托，256 像素瓦片）。"""
+    px_per_degree = 256 * (2 ** zoom) / 360.0
+    precision = 1
+    for p in range(1, PRECISION + 1):
+        if cell_size(p)[1] * px_per_degree < cluster_px:
+            break
+        precision = p
+    return precision
@@ -0,0 +1,186 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import update
+
+from database.models import Robot
+from services.cache import versions
+from services.pubsub import broker
+
+logger = logging.getLogger(__name__)
+
+
+def _heartbeat_ts(state):
+    last = state.get("last_heartbeat")
+    return datetime.fromisoformat(last).timestamp() if last else None
+
+
+class LivenessMonitor:
+    """后台在线状态监视：每台机器人的截止时间（最后心跳 + timeout）放在小顶堆里，
+    线程睡到最早的截止时间，到期的机器人用一次批量 UPDATE 置为 OFFLINE，
+    并发布 robot_status（上线/离线）与 robot 事件。读接口不再判断或改写状态。
+
+    到期时以状态存储中的最后心跳为准重新核对，其他进程收到的心跳（共享后端）不会被误判。"""
+
+    def __init__(self, app, store, timeout=15):
+        self.app = app
+        self.store = store
+        self.timeout = timeout
+        self._heap = []
+        self._armed = set()
+        self._deadlines = {}
+        self._online = set()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self.went_offline = 0
+        self.came_online = 0
+        self.sweeps = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        now = time.time()
+        with self._cond:
+            for state in self.store.all():
+                if state.get("status") == "OFFLINE":
+                    continue
+                self._online.add(state["device_id"])
+                last = _heartbeat_ts(state)
+                self._arm(state["device_id"], (last + self.timeout) if last else now)
+        self._thread = threading.Thread(target=self._run, name="robot-liveness", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+
+    def _arm(self, device_id, deadline):
+        # 调用方持有 _cond；每台机器人在堆中最多一项，心跳只更新 _deadlines，到期时再按最新值重新入堆
+        self._deadlines[device_id] = deadline
+        if device_id not in self._armed:
+            self._armed.add(device_id)
+            heapq.heappush(self._heap, (deadline, device_id))
+            if self._heap[0][1] == device_id:
+                self._cond.notify()
+
+    def touch(self, state):
+        """收到心跳后调用，返回是否为离线 -> 在线的转换（此时发布 robot_status 事件）。"""
+        device_id = state["device_id"]
+        last = _heartbeat_ts(state) or time.time()
+        with self._cond:
+            self._arm(device_id, last + self.timeout)
+            came_online = device_id not in self._online
+            self._online.add(device_id)
+        if came_online:
+            self.came_online += 1
+            self._publish(state, "ONLINE")
+        return came_online
+
+    def forget(self, device_id):
+        with self._cond:
+            self._deadlines.pop(device_id, None)
+            self._online.discard(device_id)
+
+    def _due(self):
+        with self._cond:
+            while not self._stop.is_set():
+                if self._heap:
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                _, device_id = heapq.heappop(self._heap)
+                self._armed.discard(device_id)
+                deadline = self._deadlines.get(device_id)
+                if deadline is None:
+                    continue
+                if deadline > now:
+                    self._arm(device_id, deadline)
+                else:
+                    due.append(device_id)
+            return due
+
+    def _run(self):
+        while not self._stop.is_set():
+            due = self._due()
+            if not due:
+                continue
+            try:
+                self.expire(due)
+            except Exception:
+                logger.exception("标记机器人离线失败")
+
+    def expire(self, device_ids):
+        now = time.time()
+        expired = []
+        for device_id in device_ids:
+            state = self.store.get(device_id)
+            if state is None:
+                self.forget(device_id)
+                continue
+            last = _heartbeat_ts(state)
+            if last is not None and last + self.timeout > now:
+                # 其他进程刚收到过心跳，按新的截止时间重新计时
+                with self._cond:
+                    self._arm(device_id, last + self.timeout)
+                continue
+            with self._cond:
+                self._deadlines.pop(device_id, None)
+                self._online.discard(device_id)
+            if state.get("status") != "OFFLINE":
+                expired.append(state)
+        self.sweeps += 1
+        if not expired:
+            return []
+
+        table = Robot.__table__
+        with self.store._get_engine().begin() as conn:
+            conn.execute(update(table)
+                         .where(table.c.id.in_([s["id"] for s in expired]))
+                         .values(status="OFFLINE"))
+        states = self.store.set_status([s["device_id"] for s in expired], "OFFLINE")
+        self.went_offline += len(states)
+        versions.bump("robots")
+        for state in states:
+            self._publish(state, "OFFLINE")
+            broker.publish("robot", state)
+        return states
+
+    @staticmethod
+    def _publish(state, status):
+        broker.publish("robot_status", {"id": state.get("id"), "device_id": state["device_id"],
+                                        "status": status, "at": datetime.now().isoformat()})
+
+    def stats(self):
+        with self._cond:
+            tracked = len(self._deadlines)
+            online = len(self._online)
+            next_deadline = self._heap[0][0] - time.time() if self._heap else None
+        return {"timeout": self.timeout, "tracked": tracked, "online": online,
+                "next_expiry_in": next_deadline, "went_offline": self.went_offline,
+                "came_online": self.came_online, "sweeps": self.sweeps}
+
+
+_monitor_lock = threading.Lock()
+
+
+def get_liveness(app, store):
+    monitor = app.extensions.get("liveness")
+    if monitor is None:
+        with _monitor_lock:
+            monitor = app.extensions.get("liveness")
+            if monitor is None:
+                monitor = LivenessMonitor(app, store, timeout=app.config.get("HEARTBEAT_TIMEOUT", 15))
+                monitor.start()
+                app.extensions["liveness"] = monitor
+    return monitor
@@ -0,0 +1,78 @@
+import json
+import queue
+import itertools
+import threading
+
+
+class Subscription:
+    """一个订阅者（一条 SSE 连接）的事件队列；队列满时丢弃最旧的事件，慢客户端不阻塞发布方。"""
+
+    def __init__(self, topics=None, max_queue=256):
+        self.topics = set(topics) if topics else None
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broker:
+    """进程内发布/订阅：写路径（心跳、检测写库）发布事件，/api/stream 的每个连接订阅一份。"""
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, topics=None):
+        sub = Subscription(topics, self.max_queue)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, topic, data):
+        with self._lock:
+            subs = [s for s in self._subs if s.wants(topic)]
+            event_id = next(self._ids)
+            self.published += 1
+        if not subs:
+            return
+        event = (event_id, topic, json.dumps(data, ensure_ascii=False, default=str))
+        for sub in subs:
+            sub.put(event)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subs), "published": self.published,
+                    "dropped": sum(s.dropped for s in self._subs)}
+
+
+def format_sse(event_id, topic, payload):
+    return f"id: {event_id}\nevent: {topic}\ndata: {payload}\n\n"
+
+
+broker = Broker()
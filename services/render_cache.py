@@ -0,0 +1,108 @@
+import os
+import uuid
+import threading
+from collections import OrderedDict
+
+_render_cache_lock = threading.Lock()
+
+
+class RenderCache:
+    """按需渲染的标注图 / 缩略图的磁盘 LRU 缓存，总大小不超过 ``max_bytes``。
+
+    文件名即缓存键（调用方保证键由原图与检测项内容决定），命中时更新修改时间；
+    启动时按修改时间重建 LRU 顺序。多个进程共用同一目录时各自按自己的视图淘汰，
+    被其他进程删掉的文件按未命中处理。
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # name -> size，末尾最近使用
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                st = entry.stat()
+                files.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, name):
+        """命中时返回文件路径，否则 None。"""
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._bytes -= self._entries.pop(name, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, name, data):
+        """写入缓存（先写临时文件再改名）；超过总大小时淘汰最久未用的文件，单个超过总大小的不缓存。"""
+        if len(data) > self.max_bytes:
+            return
+        path = self.path(name)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evicted += 1
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicted": self.evicted,
+            }
+
+
+def get_render_cache(app):
+    cache = app.extensions.get("render_cache")
+    if cache is None:
+        with _render_cache_lock:
+            cache = app.extensions.get("render_cache")
+            if cache is None:
+                cache = RenderCache(app.config["RENDER_CACHE_DIR"],
+                                    max_bytes=app.config.get("RENDER_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+                app.extensions["render_cache"] = cache
+    return cache
@@ -0,0 +1,337 @@
+import json
+import time
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import select, update, bindparam
+
+from database.db import db
+from database.models import Robot
+
+logger = logging.getLogger(__name__)
+
+# 心跳高频更新、由后台线程批量写回 robot 表的字段（状态字段名 -> 列名）
+LIVE_COLUMNS = {
+    "lat": "current_lat",
+    "lng": "current_lng",
+    "battery": "battery",
+    "status": "status",
+    "ip_address": "ip_address",
+    "last_heartbeat": "last_heartbeat",
+    "next_command": "next_command",
+}
+
+# 待投递命令提示：入队时更新 _cmd_mark，队列取空时记下 _cmd_seen；两者相等说明没有待投递命令，
+# 心跳无需查询 robot_command 表。以 "_" 开头的字段不对外输出。
+_LOADED_HINT = {"_cmd_mark": 1, "_cmd_seen": None}
+
+
+def public_state(state):
+    if state is None:
+        return None
+    return {k: v for k, v in state.items() if not k.startswith("_")}
+
+
+def robot_state(r):
+    """robot 行（ORM 对象或 Core Row）转为对外的状态字典，也是存储中保存的格式。"""
+    return {
+        "id": r.id,
+        "device_id": r.device_id,
+        "name": r.name,
+        "status": r.status,
+        "lat": r.current_lat,
+        "lng": r.current_lng,
+        "battery": r.battery,
+        "ip_address": r.ip_address,
+        "last_heartbeat": (r.last_heartbeat.isoformat() if r.last_heartbeat else None),
+        "next_command": r.next_command,
+        "target": {"lat": r.target_lat, "lng": r.target_lng},
+    }
+
+
+class MemoryBackend:
+    """进程内存储，单进程部署的默认后端。"""
+
+    def __init__(self):
+        self._states = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def get(self, device_id):
+        with self._lock:
+            state = self._states.get(device_id)
+            return dict(state) if state is not None else None
+
+    def update(self, device_id, fields, dirty=False, create=False):
+        """只更新已存在的状态（create=True 时新建）；不存在时返回 None，
+        避免已删除机器人的迟到心跳或在线状态变更重建出没有 id 的残缺状态。"""
+        with self._lock:
+            state = self._states.get(device_id)
+            if state is None:
+                if not create:
+                    return None
+                state = self._states[device_id] = {}
+            state.update(fields)
+            if dirty:
+                self._dirty.add(device_id)
+            return dict(state)
+
+    def add(self, device_id, state):
+        """仅在不存在时写入（从数据库装载时不覆盖更新的内存状态）。"""
+        with self._lock:
+            self._states.setdefault(device_id, dict(state))
+
+    def delete(self, device_id):
+        with self._lock:
+            self._states.pop(device_id, None)
+            self._dirty.discard(device_id)
+
+    def all(self):
+        with self._lock:
+            return [dict(s) for s in self._states.values()]
+
+    def pop_dirty(self):
+        with self._lock:
+            ids, self._dirty = self._dirty, set()
+            return [dict(self._states[i]) for i in ids if i in self._states]
+
+
+class RedisBackend:
+    """多进程/多实例共享的 Redis 后端：每台机器人一个 hash（字段值为 JSON）。"""
+
+    def __init__(self, url, prefix="robot"):
+        import redis
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self._watch_error = redis.WatchError
+        self.prefix = prefix
+        self.ids_key = f"{prefix}:ids"
+        self.dirty_key = f"{prefix}:dirty"
+
+    def _key(self, device_id):
+        return f"{self.prefix}:state:{device_id}"
+
+    @staticmethod
+    def _decode(h):
+        return {k: json.loads(v) for k, v in h.items()} if h else None
+
+    def get(self, device_id):
+        return self._decode(self.r.hgetall(self._key(device_id)))
+
+    def update(self, device_id, fields, dirty=False, create=False):
+        """与 MemoryBackend 相同：只更新已存在的 hash；WATCH 保证检查与写入之间没有被并发删除。"""
+        if not fields:
+            return self.get(device_id)
+        key = self._key(device_id)
+        with self.r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    if not create and not pipe.exists(key):
+                        return None
+                    pipe.multi()
+                    pipe.hset(key, mapping={k: json.dumps(v) for k, v in fields.items()})
+                    pipe.sadd(self.ids_key, device_id)
+                    if dirty:
+                        pipe.sadd(self.dirty_key, device_id)
+                    pipe.hgetall(key)
+                    return self._decode(pipe.execute()[-1])
+                except self._watch_error:
+                    continue
+
+    def add(self, device_id, state):
+        key = self._key(device_id)
+        if self.r.hsetnx(key, "device_id", json.dumps(device_id)):
+            self.r.hset(key, mapping={k: json.dumps(v) for k, v in state.items()})
+            self.r.sadd(self.ids_key, device_id)
+
+    def delete(self, device_id):
+        pipe = self.r.pipeline()
+        pipe.delete(self._key(device_id))
+        pipe.srem(self.ids_key, device_id)
+        pipe.srem(self.dirty_key, device_id)
+        pipe.execute()
+
+    def all(self):
+        ids = self.r.smembers(self.ids_key)
+        pipe = self.r.pipeline()
+        for device_id in ids:
+            pipe.hgetall(self._key(device_id))
+        return [s for s in map(self._decode, pipe.execute()) if s]
+
+    def pop_dirty(self):
+        pipe = self.r.pipeline(transaction=True)
+        pipe.smembers(self.dirty_key)
+        pipe.delete(self.dirty_key)
+        ids = pipe.execute()[0]
+        return [s for s in (self.get(i) for i in ids) if s]
+
+
+class RobotStateStore:
+    """机器人实时状态：心跳只更新存储，列表/看板直接读存储；位置、电量、心跳时间等字段
+    由后台线程每 flush_interval 秒合并为一次批量 UPDATE 写回 robot 表。"""
+
+    def __init__(self, app, backend, flush_interval=2.0):
+        self.app = app
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._engine = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = None
+        self.heartbeats = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def _get_engine(self):
+        if self._engine is None:
+            with self.app.app_context():
+                self._engine = db.engine
+        return self._engine
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name="robot-state-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("退出时写回机器人状态失败")
+
+    # ---- 读取 ----
+    def load(self):
+        """首次使用时从 robot 表装载全部机器人。"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            with self._get_engine().connect() as conn:
+                for row in conn.execute(select(Robot.__table__)):
+                    self.backend.add(row.device_id, {**robot_state(row), **_LOADED_HINT})
+            self._loaded = True
+
+    def get(self, device_id, internal=False):
+        """internal=True 时保留以 "_" 开头的内部提示字段。"""
+        state = self.backend.get(device_id)
+        if state is None and device_id:
+            with self._get_engine().connect() as conn:
+                row = conn.execute(select(Robot.__table__).where(Robot.device_id == device_id)).first()
+            if row is None:
+                return None
+            self.backend.add(device_id, {**robot_state(row), **_LOADED_HINT})
+            state = self.backend.get(device_id)
+        return state if internal else public_state(state)
+
+    def all(self):
+        self.load()
+        return sorted(map(public_state, self.backend.all()), key=lambda s: s.get("id") or 0)
+
+    # ---- 写入 ----
+    def heartbeat(self, device_id, fields):
+        """吸收一次心跳，返回含内部提示字段的最新状态；未注册设备返回 None。"""
+        if self.get(device_id) is None:
+            return None
+        self.heartbeats += 1
+        return self.backend.update(device_id, fields, dirty=True)
+
+    @staticmethod
+    def has_commands(state):
+        return state.get("_cmd_mark") != state.get("_cmd_seen")
+
+    def mark_commands(self, device_id, command):
+        """命令入队后调用：下一次心跳去命令队列认领。"""
+        return public_state(self.backend.update(device_id, {"_cmd_mark": time.time_ns(), "next_command": command},
+                                           dirty=True))
+
+    def commands_drained(self, device_id, mark):
+        """队列已取空；mark 为查询前读到的 _cmd_mark，期间若有新命令入队提示仍然有效。"""
+        self.backend.update(device_id, {"_cmd_seen": mark, "next_command": None}, dirty=True)
+
+    def update(self, device_id, fields):
+        """管理操作写库后同步到存储；同时标记待写回，避免被并发的批量写回覆盖。"""
+        if self.get(device_id) is None:
+            return None
+        return public_state(self.backend.update(device_id, fields, dirty=True))
+
+    def put(self, robot):
+        self.backend.update(robot.device_id, {**robot_state(robot), **_LOADED_HINT}, create=True)
+
+    def remove(self, device_id):
+        self.backend.delete(device_id)
+
+    def set_status(self, device_ids, status):
+        """在线状态监视已批量写库后同步到存储（不再标记待写回），返回更新后的状态。"""
+        states = (self.backend.update(device_id, {"status": status}) for device_id in device_ids)
+        return [public_state(s) for s in states if s is not None]
+
+    # ---- 写回 ----
+    def flush(self):
+        states = self.backend.pop_dirty()
+        # 没有 id 的状态无法写回（不应出现）；跳过它们，不影响同批的其它行
+        missing = [s.get("device_id") for s in states if s.get("id") is None]
+        if missing:
+            logger.warning("跳过没有 id 的机器人状态：%s", missing)
+            states = [s for s in states if s.get("id") is not None]
+        if not states:
+            return 0
+        table = Robot.__table__
+        stmt = (update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values({col: bindparam(f"b_{col}") for col in LIVE_COLUMNS.values()}))
+        rows = []
+        for s in sorted(states, key=lambda s: s["id"]):
+            row = {"b_id": s["id"]}
+            for key, col in LIVE_COLUMNS.items():
+                row[f"b_{col}"] = s.get(key)
+            if row["b_last_heartbeat"]:
+                row["b_last_heartbeat"] = datetime.fromisoformat(row["b_last_heartbeat"])
+            rows.append(row)
+        with self._get_engine().begin() as conn:
+            conn.execute(stmt, rows)
+        self.flushes += 1
+        self.rows_flushed += len(rows)
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("写回机器人状态失败")
+
+    def stats(self):
+        return {"backend": type(self.backend).__name__, "flush_interval": self.flush_interval,
+                "heartbeats": self.heartbeats, "flushes": self.flushes,
+                "rows_flushed": self.rows_flushed}
+
+
+_store_lock = threading.Lock()
+
+
+def _make_backend(config):
+    if config.get("ROBOT_STATE_BACKEND", "memory") == "redis":
+        return RedisBackend(config.get("ROBOT_STATE_REDIS_URL", "redis://localhost:6379/0"))
+    return MemoryBackend()
+
+
+def get_robot_state(app):
+    store = app.extensions.get("robot_state")
+    if store is None:
+        with _store_lock:
+            store = app.extensions.get("robot_state")
+            if store is None:
+                store = RobotStateStore(
+                    app,
+                    _make_backend(app.config),
+                    flush_interval=app.config.get("ROBOT_FLUSH_INTERVAL", 2.0),
+                )
+                store.start()
+                app.extensions["robot_state"] = store
+    return store
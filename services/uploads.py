@@ -0,0 +1,53 @@
+import io
+import hashlib
+
+from flask import Request, current_app
+
+
+class HashingBuffer(io.BytesIO):
+    """上传文件的内存缓冲：表单解析写入文件内容时同时计算 sha256。"""
+
+    def __init__(self):
+        super().__init__()
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """上传文件直接解析到内存（请求大小已由 MAX_CONTENT_LENGTH 限制），
+    不落临时文件；解析的同时算好内容哈希，检测接口不必再读一遍。
+    个别接口（批量上传）可在读取表单前设置 max_content_length 放宽该请求的上限。"""
+
+    _max_content_length = None
+
+    @property
+    def max_content_length(self):
+        if self._max_content_length is not None:
+            return self._max_content_length
+        return current_app.config["MAX_CONTENT_LENGTH"] if current_app else None
+
+    @max_content_length.setter
+    def max_content_length(self, value):
+        self._max_content_length = value
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingBuffer()
+
+
+def read_upload(f, chunk_size=256 * 1024):
+    """返回上传文件的 (bytes, sha256 十六进制)。"""
+    stream = f.stream
+    if isinstance(stream, HashingBuffer):
+        return stream.getvalue(), stream.sha256.hexdigest()
+    digest = hashlib.sha256()
+    buf = io.BytesIO()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        buf.write(chunk)
+    return buf.getvalue(), digest.hexdigest()
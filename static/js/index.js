@@ -1,5 +1,39 @@
 $(function () {
     const trashTypeChart = echarts.init(document.getElementById('trashTypeChart'));
+    // 机器人状态按 device_id 保存，推送的增量直接合并，无需重新拉取整份汇总
+    let robots = {};
+    let refreshTimer = null;
+
+    function renderRobots() {
+        const list = Object.values(robots);
+        const $list = $('#robotListContainer');
+        $list.empty();
+        list.forEach(r => {
+            const color = r.status === 'ONLINE' ? '#3de5cc' : '#ff4d4d';
+            $list.append(`
+                <li class="list-item">
+                    <span>${r.device_id}</span>
+                    <span>${r.name}</span>
+                    <span style="color: ${color}">${r.status === 'ONLINE' ? '● 在线' : '● 离线'}</span>
+                </li>
+            `);
+        });
+
+        // update robot markers on the map if available
+        if (window.updateRobotMarkers) {
+            window.updateRobotMarkers(list);
+        }
+    }
+
+    // 短时间内的多条检测事件合并为一次汇总刷新
+    function scheduleRefresh() {
+        if (refreshTimer) return;
+        refreshTimer = setTimeout(function () {
+            refreshTimer = null;
+            refreshData();
+        }, 500);
+    }
+
     function refreshData() {
         $.get('/api/stats/summary', function (res) {
             if (!res.ok) return;
@@ -15,24 +49,9 @@ $(function () {
                 }]
             });
 
-            const $list = $('#robotListContainer');
-            $list.empty();
-            (res.robot_list || []).forEach(r => {
-                const color = r.status === 'ONLINE' ? '#3de5cc' : '#ff4d4d';
-                $list.append(`
-                    <li class="list-item">
-                        <span>${r.device_id}</span>
-                        <span>${r.name}</span>
-                        <span style="color: ${color}">${r.status === 'ONLINE' ? '● 在线' : '● 离线'}</span>
-                    </li>
-                `);
-            });
-
-            // update robot markers on the map if available
-            if (window.updateRobotMarkers && res.robot_list) {
-                // ensure lat/lng fields exist (stats_api now includes lat/lng)
-                window.updateRobotMarkers(res.robot_list);
-            }
+            robots = {};
+            (res.robot_list || []).forEach(r => { robots[r.device_id] = r; });
+            renderRobots();
         });
     }
 
@@ -42,9 +61,23 @@ $(function () {
         if (typeof robotBatteryChart !== 'undefined' && robotBatteryChart) { try { robotBatteryChart.resize(); } catch(e){} }
     };
 
-    refreshData();
-    // poll every 3 seconds for realtime status (matches server-side 3s timeout)
-    setInterval(refreshData, 3000);
+    // 优先使用 /api/stream 推送；连接断开时才退回每 3 秒轮询
+    window.openLiveStream(['robot', 'robot_removed', 'detection'], {
+        robot: function (r) {
+            robots[r.device_id] = Object.assign(robots[r.device_id] || {}, r);
+            renderRobots();
+        },
+        robot_removed: function (r) {
+            delete robots[r.device_id];
+            renderRobots();
+        },
+        detection: function (task) {
+            if (window.reloadDetectionClusters && task.latitude != null) {
+                window.reloadDetectionClusters();
+            }
+            scheduleRefresh();
+        }
+    }, refreshData, 3000);
 });
 
 function updateTime() {
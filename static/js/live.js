@@ -0,0 +1,43 @@
+// 订阅 /api/stream（SSE）推送的实时事件。
+// topics：要订阅的事件名数组；handlers：{事件名: function(data)}；
+// poll：拉取完整快照的函数，连接建立/重连时各调用一次用于对齐状态；
+// 浏览器不支持 EventSource 或连接断开期间按 interval 轮询，重连成功后停止轮询。
+window.openLiveStream = function (topics, handlers, poll, interval) {
+    let timer = null;
+
+    function startPolling() {
+        if (timer) return;
+        poll();
+        timer = setInterval(poll, interval);
+    }
+
+    function stopPolling() {
+        if (!timer) return;
+        clearInterval(timer);
+        timer = null;
+    }
+
+    if (!window.EventSource) {
+        startPolling();
+        return null;
+    }
+
+    const url = '/api/stream' + (topics && topics.length ? '?topics=' + topics.join(',') : '');
+    const source = new EventSource(url);
+    source.onopen = function () {
+        stopPolling();
+        poll();
+    };
+    // EventSource 会按服务端的 retry 间隔自动重连，期间先退回轮询
+    source.onerror = function () {
+        startPolling();
+    };
+    Object.keys(handlers).forEach(function (topic) {
+        source.addEventListener(topic, function (ev) {
+            let data;
+            try { data = JSON.parse(ev.data); } catch (e) { return; }
+            handlers[topic](data);
+        });
+    });
+    return source;
+};
@@ -14,44 +14,8 @@ $(document).ready(function () {
     // robot markers store
     window._robotMarkers = window._robotMarkers || {};
 
-    function loadDashboardData() {
-        fetch('/api/stats/summary')
-            .then(res => res.json())
-            .then(data => {
-                if (!data.ok) return;
-
-                if (data.locations && data.locations.length > 0) {
-                    data.locations.forEach(loc => {
-                        const marker = L.marker([loc.lat, loc.lng], { icon: dotIcon }).addTo(map);
-
-                        const cardHtml = `
-                            <div class="map-card" style="width: 200px; padding: 5px;">
-                                <h4 style="margin: 0 0 8px; color: #2563eb; border-bottom: 1px solid #eee;">任务 #${loc.id}</h4>
-                                <p style="font-size: 13px; margin: 4px 0;">
-                                    <b>识别结果:</b> <span style="color: #ef4444;">${loc.trash_types || '未检测到'}</span>
-                                </p>
-                                <hr style="border: 0; border-top: 1px solid #eee; margin: 8px 0;">
-                                <p style="font-size: 11px; color: #666;">坐标: ${loc.lat.toFixed(4)}, ${loc.lng.toFixed(4)}</p>
-                            </div>
-                        `;
-
-                        marker.bindPopup(cardHtml, {
-                            closeButton: false,
-                            offset: L.point(0, -15)
-                        });
-
-                        marker.on('mouseover', function () { this.openPopup(); });
-                        marker.on('mouseout', function () { this.closePopup(); });
-                    });
-                }
-
-                // update robot markers if provided by server
-                if (data.robot_list && data.robot_list.length > 0) {
-                    updateRobotMarkers(data.robot_list);
-                }
-            })
-            .catch(err => console.error("地图数据加载失败:", err));
-    }
+    // detection points are clustered server-side for the current viewport
+    const detections = window.attachDetectionClusters(map);
 
     // update robot markers function exposed globally
     function updateRobotMarkers(robots) {
@@ -80,7 +44,10 @@ $(document).ready(function () {
     }
 
 
-    loadDashboardData();
+    // used by index.js when updates arrive over /api/stream
+    window.updateRobotMarkers = updateRobotMarkers;
+    window.reloadDetectionClusters = detections.reload;
+
     setTimeout(function () {
         map.invalidateSize(true);
     }, 500);
@@ -0,0 +1,75 @@
+// 检测点位聚合图层：按当前视口与缩放级别请求 /api/stats/map，服务端已聚合，
+// 前端只绘制返回的聚合（数量与屏幕尺寸相关，与总数据量无关）。
+// 返回 { reload }：检测事件推送后调用 reload()，短时间内的多次调用合并为一次请求。
+window.attachDetectionClusters = function (map, options) {
+    options = options || {};
+    const layer = L.layerGroup().addTo(map);
+    const dotIcon = L.divIcon({ className: 'map-dot-icon', html: '<span class="map-dot"></span>',
+                                iconSize: [14, 14], iconAnchor: [7, 7] });
+    let timer = null;
+    let seq = 0;
+
+    function clusterIcon(count) {
+        const size = count < 10 ? 28 : count < 100 ? 34 : count < 1000 ? 40 : 48;
+        return L.divIcon({ className: 'map-cluster-icon', html: `<span class="map-cluster">${count}</span>`,
+                           iconSize: [size, size], iconAnchor: [size / 2, size / 2] });
+    }
+
+    function popupHtml(c) {
+        const title = c.count === 1 ? `任务 #${c.id}` : `${c.count} 个检测点`;
+        const labels = c.labels.length
+            ? c.labels.map(l => c.count === 1 ? l.label : `${l.label} (${l.count})`).join(', ')
+            : '未检测到';
+        return `
+            <div class="map-card" style="width: 200px; padding: 5px;">
+                <h4 style="margin: 0 0 8px; color: #2563eb; border-bottom: 1px solid #eee;">${title}</h4>
+                <p style="font-size: 13px; margin: 4px 0;">
+                    <b>识别结果:</b> <span style="color: #ef4444;">${labels}</span>
+                </p>
+                <hr style="border: 0; border-top: 1px solid #eee; margin: 8px 0;">
+                <p style="font-size: 11px; color: #666;">坐标: ${c.lat.toFixed(4)}, ${c.lng.toFixed(4)}</p>
+            </div>
+        `;
+    }
+
+    function render(clusters) {
+        layer.clearLayers();
+        clusters.forEach(c => {
+            const marker = L.marker([c.lat, c.lng], { icon: c.count === 1 ? dotIcon : clusterIcon(c.count) });
+            marker.bindPopup(popupHtml(c), { closeButton: false, offset: L.point(0, -15) });
+            marker.on('mouseover', function () { this.openPopup(); });
+            marker.on('mouseout', function () { this.closePopup(); });
+            if (c.count > 1) {
+                // 点击聚合放大到该区域
+                marker.on('click', () => map.setView([c.lat, c.lng], Math.min(map.getZoom() + 2, map.getMaxZoom())));
+            }
+            layer.addLayer(marker);
+        });
+    }
+
+    function load() {
+        const b = map.getBounds();
+        const bbox = [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].map(v => v.toFixed(4)).join(',');
+        const current = ++seq;
+        fetch(`/api/stats/map?bbox=${bbox}&zoom=${map.getZoom()}`)
+            .then(res => res.json())
+            .then(data => {
+                // 只绘制最后一次请求的结果，忽略拖动过程中过期的响应
+                if (!data.ok || current !== seq) return;
+                render(data.clusters || []);
+            })
+            .catch(err => console.error("地图数据加载失败:", err));
+    }
+
+    function reload() {
+        if (timer) return;
+        timer = setTimeout(function () {
+            timer = null;
+            load();
+        }, options.delay || 300);
+    }
+
+    map.on('moveend', reload);
+    load();
+    return { reload: reload };
+};
@@ -31,36 +31,44 @@ document.addEventListener('DOMContentLoaded', function(){
     if(row) row.classList.add('selected');
   }
 
+  function applyRobot(r){
+    // update table row (status/battery/ip/last-heartbeat by named cells)
+    const row = table.querySelector(`tr[data-id='${r.id}']`);
+    if(row){
+      const s = row.querySelector('.col-status'); if(s) s.innerText = r.status || '-';
+      const b = row.querySelector('.col-battery'); if(b) b.innerText = (r.battery!=null? r.battery : '-');
+      const ip = row.querySelector('.col-ip'); if(ip) ip.innerText = r.ip_address || '-';
+      const last = row.querySelector('.col-last'); if(last) last.innerText = r.last_heartbeat ? new Date(r.last_heartbeat).toLocaleString() : '-';
+    }
+
+    // update marker
+    if(map && r.lat != null && r.lng != null){
+      if(markers[r.id]){
+        markers[r.id].setLatLng([r.lat, r.lng]);
+      } else {
+        const m = L.marker([r.lat, r.lng], { icon: window._td_dotIcon || undefined }).addTo(map).bindPopup(`<b>${r.name}</b><br>${r.device_id}`);
+        m.on('click', ()=> setSelectedRow(r.id));
+        markers[r.id] = m;
+      }
+    }
+  }
+
   function loadRobots(){
     fetch('/api/robot/list').then(r=>r.json()).then(j=>{
       if(!j.ok) return;
-      // update table rows (update status/battery/ip/last-heartbeat by named cells)
-      j.robots.forEach(r=>{
-        const row = table.querySelector(`tr[data-id='${r.id}']`);
-        if(row){
-          const s = row.querySelector('.col-status'); if(s) s.innerText = r.status || '-';
-          const b = row.querySelector('.col-battery'); if(b) b.innerText = (r.battery!=null? r.battery : '-');
-          const ip = row.querySelector('.col-ip'); if(ip) ip.innerText = r.ip_address || '-';
-          const last = row.querySelector('.col-last'); if(last) last.innerText = r.last_heartbeat ? new Date(r.last_heartbeat).toLocaleString() : '-';
-        }
-
-        // update marker
-        if(map && r.lat != null && r.lng != null){
-          if(markers[r.id]){
-            markers[r.id].setLatLng([r.lat, r.lng]);
-          } else {
-            const m = L.marker([r.lat, r.lng], { icon: window._td_dotIcon || undefined }).addTo(map).bindPopup(`<b>${r.name}</b><br>${r.device_id}`);
-            m.on('click', ()=> setSelectedRow(r.id));
-            markers[r.id] = m;
-          }
-        }
-      });
+      j.robots.forEach(applyRobot);
     }).catch(e=>console.warn('fetch robots failed', e));
   }
 
-  // poll robots every 5s
-  setInterval(loadRobots, 5000);
-  loadRobots();
+  // robot state is pushed over /api/stream; poll every 5s only while the stream is down
+  window.openLiveStream(['robot', 'robot_removed'], {
+    robot: applyRobot,
+    robot_removed: function(r){
+      if(markers[r.id]){ try { map.removeLayer(markers[r.id]); } catch(e){} delete markers[r.id]; }
+      const row = table.querySelector(`tr[data-id='${r.id}']`);
+      if(row) row.remove();
+    }
+  }, loadRobots, 5000);
 
   // double-click map to send navigate command to selected robot
   if(map){
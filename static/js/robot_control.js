@@ -30,55 +30,61 @@ document.addEventListener('DOMContentLoaded', function(){
     logList.scrollTop = logList.scrollHeight;
   }
 
+  function isMe(x){
+    return x.id === robot.id || x.device_id === robot.device_id;
+  }
+
+  function applyRobot(me){
+    if(me.lat != null && me.lng != null){
+      if(robotMarker){ robotMarker.setLatLng([me.lat, me.lng]); }
+      else { robotMarker = L.marker([me.lat, me.lng], { icon: dotIcon }).addTo(map).bindPopup(`<b>${me.name}</b><br>${me.device_id}`); map.setView([me.lat, me.lng], 16); }
+    }
+    // update battery/status display in title & status card
+    document.title = `机器人控制 - ${me.name} (${me.status})`;
+    if(statusBadge){
+      statusBadge.textContent = me.status || 'UNKNOWN';
+      statusBadge.classList.remove('status-online','status-offline');
+      if(me.status === 'ONLINE'){ statusBadge.classList.add('status-online'); }
+      else { statusBadge.classList.add('status-offline'); }
+    }
+    if(typeof me.battery !== 'undefined' && me.battery !== null){
+      const val = Math.max(0, Math.min(100, Number(me.battery)));
+      if(batteryText) batteryText.textContent = val.toFixed(0) + '%';
+      if(batteryBar) batteryBar.style.width = val + '%';
+    }
+    if(positionEl && me.lat != null && me.lng != null){
+      positionEl.textContent = `${me.lat.toFixed(5)}, ${me.lng.toFixed(5)}`;
+    }
+    if(lastHeartbeatEl && me.last_heartbeat){
+      lastHeartbeatEl.textContent = me.last_heartbeat;
+    }
+    if(me.target && me.target.lat != null && me.target.lng != null){
+      if(targetEl) targetEl.textContent = `${me.target.lat.toFixed(5)}, ${me.target.lng.toFixed(5)}`;
+      if(targetMarker){
+        targetMarker.setLatLng([me.target.lat, me.target.lng]);
+      } else {
+        targetMarker = L.marker([me.target.lat, me.target.lng], { icon: dotIcon }).addTo(map).bindPopup('目标位置');
+      }
+      // prefill nav inputs if empty
+      const navLat = document.getElementById('navLat');
+      const navLng = document.getElementById('navLng');
+      if(navLat && !navLat.value){ navLat.value = me.target.lat; }
+      if(navLng && !navLng.value){ navLng.value = me.target.lng; }
+    }
+  }
+
   function fetchRobot(){
     fetch('/api/robot/list').then(r=>r.json()).then(j=>{
       if(!j.ok) return;
-      const list = j.robots || [];
-      const me = list.find(x=> x.id === robot.id || x.device_id === robot.device_id);
-      if(me){
-        if(me.lat != null && me.lng != null){
-          if(robotMarker){ robotMarker.setLatLng([me.lat, me.lng]); }
-          else { robotMarker = L.marker([me.lat, me.lng], { icon: dotIcon }).addTo(map).bindPopup(`<b>${me.name}</b><br>${me.device_id}`); map.setView([me.lat, me.lng], 16); }
-        }
-        // update battery/status display in title & status card
-        document.title = `机器人控制 - ${me.name} (${me.status})`;
-        if(statusBadge){
-          statusBadge.textContent = me.status || 'UNKNOWN';
-          statusBadge.classList.remove('status-online','status-offline');
-          if(me.status === 'ONLINE'){ statusBadge.classList.add('status-online'); }
-          else { statusBadge.classList.add('status-offline'); }
-        }
-        if(typeof me.battery !== 'undefined' && me.battery !== null){
-          const val = Math.max(0, Math.min(100, Number(me.battery)));
-          if(batteryText) batteryText.textContent = val.toFixed(0) + '%';
-          if(batteryBar) batteryBar.style.width = val + '%';
-        }
-        if(positionEl && me.lat != null && me.lng != null){
-          positionEl.textContent = `${me.lat.toFixed(5)}, ${me.lng.toFixed(5)}`;
-        }
-        if(lastHeartbeatEl && me.last_heartbeat){
-          lastHeartbeatEl.textContent = me.last_heartbeat;
-        }
-        if(me.target && me.target.lat != null && me.target.lng != null){
-          if(targetEl) targetEl.textContent = `${me.target.lat.toFixed(5)}, ${me.target.lng.toFixed(5)}`;
-          if(targetMarker){
-            targetMarker.setLatLng([me.target.lat, me.target.lng]);
-          } else {
-            targetMarker = L.marker([me.target.lat, me.target.lng], { icon: dotIcon }).addTo(map).bindPopup('目标位置');
-          }
-          // prefill nav inputs if empty
-          const navLat = document.getElementById('navLat');
-          const navLng = document.getElementById('navLng');
-          if(navLat && !navLat.value){ navLat.value = me.target.lat; }
-          if(navLng && !navLng.value){ navLng.value = me.target.lng; }
-        }
-      }
+      const me = (j.robots || []).find(isMe);
+      if(me) applyRobot(me);
     }).catch(e=>console.warn('fetch robot failed', e));
   }
 
-  // polling every 2s for more responsive control
-  fetchRobot();
-  setInterval(fetchRobot, 2000);
+  // state is pushed over /api/stream; poll every 2s only while the stream is down
+  window.openLiveStream(['robot'], {
+    robot: function(r){ if(isMe(r)) applyRobot(r); }
+  }, fetchRobot, 2000);
 
   // camera stream set
   document.getElementById('btnSetStream').addEventListener('click', function(){
@@ -5,6 +5,8 @@ document.addEventListener('DOMContentLoaded', function(){
   // 初始化地图（确保容器存在）
   const map = L.map('statsMap').setView([30, 110], 5);
   L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {attribution: '&copy; OpenStreetMap contributors'}).addTo(map);
+  // 地图点位按视口由服务端聚合
+  window.attachDetectionClusters(map);
 
   fetch('/api/stats/summary').then(r=>r.json()).then(data=>{
     if(!data.ok) return;
@@ -23,15 +25,6 @@ document.addEventListener('DOMContentLoaded', function(){
       line.setOption({xAxis:{type:'category', data:labels}, yAxis:{type:'value'}, series:[{type:'line', data:values, smooth:true}]});
     }
 
-    // 地图点位（小点样式）
-    const dotIcon = L.divIcon({ className: 'map-dot-icon', html: '<span class="map-dot"></span>', iconSize: [10,10], iconAnchor: [5,5] });
-    (data.locations||[]).forEach(l=>{
-      if (l.lat && l.lng) {
-        const m = L.marker([l.lat, l.lng], { icon: dotIcon }).addTo(map);
-        m.bindPopup(`<b>任务 ${l.id}</b><br>${l.trash_types}`);
-      }
-    });
-
     // 让地图正确渲染
     setTimeout(()=>{ try{ map.invalidateSize(); }catch(e){} }, 300);
   }).catch(e=>console.error(e));
@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from collections import Counter
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 命令队列压测：数百个模拟机器人（与 test_robot.py 相同的心跳协议）并发心跳，
+# 同时由控制端不断下发命令；机器人在下一次心跳的 ack 字段里回执收到的 command_id。
+# 统计投递数、重复投递、丢失命令、心跳延迟与命令从下发到送达的延迟。
+# --long-poll N 时每台机器人另开一个长轮询连接取命令，可配合较长的 --interval 对比送达延迟。
+# 默认在进程内启动应用（临时 SQLite），也可以用 --server 指向已运行的服务。
+
+
+def start_local_server(port, db_uri, ack_timeout):
+    from werkzeug.serving import make_server
+    from app import create_app
+    from database.db import db
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": db_uri, "SQLALCHEMY_ENGINE_OPTIONS": {},
+                      "MODEL_PRELOAD": False, "COMMAND_ACK_TIMEOUT": ack_timeout})
+    with app.app_context():
+        db.create_all()
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class SimRobot(threading.Thread):
+    def __init__(self, server, device_id, interval, stop, clients=1, long_poll=0):
+        super().__init__(daemon=True)
+        self.long_poll = long_poll
+        self.server = server
+        self.device_id = device_id
+        self.interval = interval
+        self.stop = stop
+        self.clients = clients
+        self.received = []          # (command_id, 收到时间)
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._to_ack = []
+
+    def beat(self, session):
+        with self._lock:
+            ack, self._to_ack = self._to_ack, []
+        payload = {"device_id": self.device_id, "lat": 30.5, "lng": 114.3,
+                   "status": "ONLINE", "battery": 80, "ack": ack}
+        start = time.perf_counter()
+        try:
+            data = session.post(f"{self.server}/api/robot/heartbeat", json=payload, timeout=30).json()
+        except requests.RequestException:
+            self.errors += 1
+            return
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(elapsed)
+        self._got(data)
+
+    def _got(self, data):
+        with self._lock:
+            if data.get("command_id"):
+                self.received.append((data["command_id"], time.time()))
+                self._to_ack.append(data["command_id"])
+
+    def _poll_loop(self):
+        # 长轮询取命令：命令入队后立即返回，心跳只负责上报状态
+        session = requests.Session()
+        while not self.stop.is_set():
+            with self._lock:
+                ack, self._to_ack = self._to_ack, []
+            params = {"wait": self.long_poll}
+            if ack:
+                params["ack"] = ",".join(map(str, ack))
+            try:
+                data = session.get(f"{self.server}/api/robot/{self.device_id}/commands",
+                                   params=params, timeout=self.long_poll + 30).json()
+            except requests.RequestException:
+                self.errors += 1
+                time.sleep(1)
+                continue
+            self._got(data)
+
+    def run(self):
+        # clients > 1 时同一台设备由多个连接同时心跳，用于验证并发认领不会重复投递
+        workers = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.clients)]
+        if self.long_poll:
+            workers.append(threading.Thread(target=self._poll_loop, daemon=True))
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+    def _loop(self):
+        session = requests.Session()
+        time.sleep(random.uniform(0, self.interval))
+        while not self.stop.is_set():
+            self.beat(session)
+            time.sleep(self.interval)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--server', default=None, help='Target server (default: start one in-process on SQLite)')
+    p.add_argument('--port', type=int, default=5099)
+    p.add_argument('--db-uri', default=None, help='SQLAlchemy URI for the in-process server')
+    p.add_argument('--robots', type=int, default=200)
+    p.add_argument('--interval', type=float, default=1.0, help='Heartbeat interval seconds')
+    p.add_argument('--clients', type=int, default=1, help='Concurrent heartbeat connections per robot')
+    p.add_argument('--long-poll', type=float, default=0,
+                   help='Also long-poll /api/robot/<device_id>/commands with this wait (seconds)')
+    p.add_argument('--commands', type=int, default=3, help='Commands sent to each robot')
+    p.add_argument('--duration', type=float, default=20.0, help='Seconds to run')
+    p.add_argument('--drain', type=float, default=10.0, help='Extra seconds to wait for queued commands to be delivered')
+    p.add_argument('--ack-timeout', type=int, default=30, help='COMMAND_ACK_TIMEOUT for the in-process server')
+    args = p.parse_args()
+
+    tmp = None
+    app = None
+    server_url = args.server
+    if not server_url:
+        uri = args.db_uri
+        if not uri:
+            tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+            tmp.close()
+            uri = f"sqlite:///{tmp.name}"
+        app = start_local_server(args.port, uri, args.ack_timeout)
+        server_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        prefix = f"BENCH_{int(time.time())}_"
+        for i in range(args.robots):
+            requests.post(f"{server_url}/api/robot/register",
+                          json={"device_id": f"{prefix}{i}", "name": f"bench-{i}"}, timeout=10)
+        robots = {r["device_id"]: r["id"] for r in requests.get(f"{server_url}/api/robot/list", timeout=30).json()["robots"]
+                  if r["device_id"].startswith(prefix)}
+
+        stop = threading.Event()
+        sims = [SimRobot(server_url, did, args.interval, stop, args.clients, args.long_poll) for did in robots]
+        for s in sims:
+            s.start()
+
+        # 控制端：在前 60% 的时间内随机给各机器人下发命令
+        sent = {}
+        send_window = args.duration * 0.6
+        plan = sorted((random.uniform(0, send_window), did) for did in robots for _ in range(args.commands))
+        session = requests.Session()
+        t0 = time.time()
+        for at, did in plan:
+            delay = t0 + at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            r = session.post(f"{server_url}/api/robot/control",
+                             json={"id": robots[did], "command": random.choice(["PICK_TRASH", "STOP", "FORWARD"])},
+                             timeout=30).json()
+            if r.get("ok"):
+                sent[r["command_id"]] = (did, time.time())
+
+        time.sleep(max(0.0, t0 + args.duration - time.time()))
+        # 收尾：继续心跳直到所有已下发命令送达，或超过 --drain 秒
+        deadline = time.time() + args.drain
+        while time.time() < deadline:
+            got = {cid for s in sims for cid, _ in list(s.received)}
+            if all(cid in got for cid in sent):
+                break
+            time.sleep(0.2)
+        stop.set()
+        for s in sims:
+            s.join(timeout=args.interval * 2 + 30)
+
+        received = Counter()
+        delivery = []
+        for s in sims:
+            for cid, at in s.received:
+                received[cid] += 1
+                if cid in sent:
+                    delivery.append(at - sent[cid][1])
+        latencies = [x for s in sims for x in s.latencies]
+        duplicates = sum(n - 1 for n in received.values() if n > 1)
+        lost = [cid for cid in sent if cid not in received]
+
+        print(f"robots={len(sims)} clients/robot={args.clients} interval={args.interval}s "
+              f"long_poll={args.long_poll}s duration={args.duration}s")
+        print(f"heartbeats={len(latencies)} ({len(latencies) / args.duration:.0f}/s) errors={sum(s.errors for s in sims)}")
+        print(f"heartbeat latency p50={percentile(latencies, 50) * 1000:.1f}ms "
+              f"p99={percentile(latencies, 99) * 1000:.1f}ms")
+        print(f"commands sent={len(sent)} delivered={len(received)} duplicates={duplicates} lost={len(lost)}")
+        print(f"delivery latency p50={percentile(delivery, 50) * 1000:.0f}ms "
+              f"p99={percentile(delivery, 99) * 1000:.0f}ms")
+        try:
+            print("server:", requests.get(f"{server_url}/api/robot/state", timeout=10).json())
+        except requests.RequestException:
+            pass
+        return 1 if duplicates or lost else 0
+    finally:
+        if app is not None and "robot_state" in app.extensions:
+            app.extensions["robot_state"].stop()
+        if tmp:
+            os.unlink(tmp.name)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
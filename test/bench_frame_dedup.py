@@ -0,0 +1,105 @@
+import os
+import sys
+import glob
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from inference.dedup import FrameDeduplicator
+
+
+# 近重复帧去重的阈值标定：模拟机器人静止/缓慢前进时的连续帧（纹理路面 + 传感器噪声 + JPEG 压缩），
+# 期间不时出现新的垃圾目标。对每组 (hash_size, threshold) 统计跳过率，以及“新目标出现却被判为重复”的漏检次数。
+# 也可以用 --images 指定真实帧序列（按文件名排序）只看跳过率。
+#
+#   python test/bench_frame_dedup.py --frames 600
+#   python test/bench_frame_dedup.py --images /path/to/frames --settings thumb:32:1,dhash:8:6
+
+
+def road(width, height, rng):
+    base = rng.normal(110, 25, (height // 8 + 1, width * 2 // 8 + 1)).astype(np.float32)
+    base = cv2.resize(base, (width * 2, height), interpolation=cv2.INTER_CUBIC)
+    base += rng.normal(0, 6, base.shape).astype(np.float32)
+    return np.clip(base, 0, 255).astype(np.uint8)
+
+
+def synthetic_frames(n, width, height, speed, stationary, appear_every, seed):
+    """生成 (frame, new_object) 序列：new_object 为 True 表示这一帧比上一帧多了一个目标。"""
+    rng = np.random.default_rng(seed)
+    ground = cv2.cvtColor(road(width, height, rng), cv2.COLOR_GRAY2BGR)
+    objects = []  # (x_on_ground, y, radius, color)
+    x = 0.0
+    for i in range(n):
+        moving = (i // stationary) % 2 == 1
+        if moving:
+            x = min(x + speed, width - 1)
+        new_object = i > 0 and i % appear_every == 0
+        if new_object:
+            r = int(rng.integers(14, 32))
+            objects.append((x + rng.uniform(r, width - r), rng.uniform(r, height - r), r,
+                            tuple(int(c) for c in rng.integers(0, 255, 3))))
+        frame = ground[:, int(x):int(x) + width].copy()
+        for ox, oy, r, color in objects:
+            cv2.circle(frame, (int(ox - x), int(oy)), r, color, -1)
+        noise = rng.normal(0, 3, frame.shape)
+        frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+        frame = cv2.imdecode(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1], cv2.IMREAD_COLOR)
+        yield frame, new_object
+
+
+def run(frames, method, size, threshold, history, delta):
+    dedup = FrameDeduplicator(method=method, threshold=threshold, history=history, size=size, delta=delta)
+    missed = appeared = 0
+    started = time.perf_counter()
+    for i, (frame, new_object) in enumerate(frames):
+        h, hit = dedup.lookup("bench", frame)
+        if new_object:
+            appeared += 1
+            missed += hit is not None
+        if hit is None:
+            dedup.remember("bench", h, i)
+    elapsed = time.perf_counter() - started
+    stats = dedup.stats()
+    return stats["skip_rate"], missed, appeared, elapsed / max(1, stats["lookups"]) * 1000
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--frames', type=int, default=600)
+    p.add_argument('--width', type=int, default=640)
+    p.add_argument('--height', type=int, default=480)
+    p.add_argument('--speed', type=float, default=1.5, help='Pixels the view shifts per frame while moving')
+    p.add_argument('--stationary', type=int, default=60, help='Frames per stationary/moving phase')
+    p.add_argument('--appear-every', type=int, default=25, help='A new object appears every N frames')
+    p.add_argument('--images', default=None, help='Use the sorted .jpg/.png files in this directory instead')
+    p.add_argument('--settings', default='dhash:8:2,dhash:8:6,thumb:16:1,thumb:32:1,thumb:32:2,thumb:32:4',
+                   help='Comma-separated method:size:threshold triples')
+    p.add_argument('--delta', type=int, default=20, help='Per-channel change that marks a thumbnail cell as changed')
+    p.add_argument('--history', type=int, default=8)
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+
+    if args.images:
+        paths = sorted(glob.glob(os.path.join(args.images, "*.jpg")) + glob.glob(os.path.join(args.images, "*.png")))
+        frames = [(cv2.imread(path), False) for path in paths]
+        print(f"{len(frames)} frames from {args.images} (no ground truth: missed is not reported)")
+    else:
+        frames = list(synthetic_frames(args.frames, args.width, args.height, args.speed,
+                                       args.stationary, args.appear_every, args.seed))
+        print(f"{len(frames)} synthetic frames, {args.width}x{args.height}, speed {args.speed}px/frame, "
+              f"new object every {args.appear_every} frames")
+
+    print(f"{'method':>6} {'size':>5} {'thresh':>6} {'skip':>7} {'missed':>9} {'ms/frame':>9}")
+    for setting in args.settings.split(','):
+        method, size, threshold = setting.split(':')
+        skip, missed, appeared, ms = run(frames, method, int(size), int(threshold), args.history, args.delta)
+        missed_col = f"{missed}/{appeared}" if not args.images else "-"
+        print(f"{method:>6} {size:>5} {threshold:>6} {skip:>7.1%} {missed_col:>9} {ms:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from database.db import db
+from database.models import DetectTask, DetectItem
+from services.detection import insert_items
+from inference.detections import Detections
+
+
+# detect_item 写库基准：对比逐个 ORM 对象 add + 两次 commit（旧路径）
+# 与 Core insert executemany + 单次 commit（新路径）的 rows/sec。
+# 默认使用临时 SQLite 文件，也可以用 --db-uri 指向 MySQL 测试库。
+
+LABELS = ["Plastic Bottle", "Face Mask", "Cans", "Peel", "Plastic Bag", "Cardboard"]
+
+
+def fake_detections(n, w=1920, h=1080):
+    xyxy, conf, cls = [], [], []
+    for _ in range(n):
+        x1 = random.uniform(0, w - 50)
+        y1 = random.uniform(0, h - 50)
+        xyxy.append([x1, y1, x1 + random.uniform(10, 50), y1 + random.uniform(10, 50)])
+        conf.append(random.uniform(0.25, 0.99))
+        cls.append(random.randrange(len(LABELS)))
+    return Detections(xyxy, conf, cls, dict(enumerate(LABELS)))
+
+
+def write_orm(detections):
+    task = DetectTask(source_type="image", source_path="bench", status="PENDING")
+    db.session.add(task)
+    db.session.commit()
+    for d in detections.to_list():
+        db.session.add(DetectItem(
+            task_id=task.id,
+            label=d["label"],
+            confidence=float(d["confidence"]),
+            x1=int(d["bbox"][0]), y1=int(d["bbox"][1]),
+            x2=int(d["bbox"][2]), y2=int(d["bbox"][3]),
+            area=int((d["bbox"][2]-d["bbox"][0])*(d["bbox"][3]-d["bbox"][1])),
+            handle_state='NEW'
+        ))
+    task.status = "DONE"
+    db.session.commit()
+
+
+def write_bulk(detections):
+    task = DetectTask(source_type="image", source_path="bench", status="DONE")
+    db.session.add(task)
+    db.session.flush()
+    insert_items(task.id, detections)
+    db.session.commit()
+
+
+def run(name, fn, batches):
+    rows = sum(len(b) for b in batches)
+    start = time.perf_counter()
+    for b in batches:
+        fn(b)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} tasks={len(batches):<6} rows={rows:<8} {elapsed:8.3f}s  {rows / elapsed:10.0f} rows/s")
+    return rows / elapsed
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--tasks', type=int, default=200, help='Number of detection tasks to write')
+    p.add_argument('--boxes', type=int, default=50, help='Boxes per task (cluttered road image)')
+    p.add_argument('--db-uri', default=None, help='SQLAlchemy URI (default: temporary SQLite file)')
+    args = p.parse_args()
+
+    tmp = None
+    uri = args.db_uri
+    if not uri:
+        tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        tmp.close()
+        uri = f"sqlite:///{tmp.name}"
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SQLALCHEMY_ENGINE_OPTIONS": {},
+                      "MODEL_PRELOAD": False})
+    random.seed(0)
+    batches = [fake_detections(args.boxes) for _ in range(args.tasks)]
+
+    try:
+        with app.app_context():
+            db.create_all()
+            before = run("ORM add loop + 2 commits", write_orm, batches)
+            after = run("Core executemany + 1 commit", write_bulk, batches)
+            print(f"speedup: {after / before:.2f}x")
+    finally:
+        if tmp:
+            os.unlink(tmp.name)
+
+
+if __name__ == '__main__':
+    main()
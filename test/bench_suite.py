@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference.yolo_detector as yolo_detector
+from inference.backends import Prediction
+from inference.yolo_detector import YOLODetector, YOLO_CLASS_NAMES
+from query_plan_check import seed
+
+
+# 热路径基准套件：SQLite + 桩检测器，不需要模型权重与网络。
+# 覆盖 /api/detect 端到端、YOLODetector 结果解析、不同数据量下的 /api/stats/summary，
+# 以及不同机器人数量下的 /api/robot/heartbeat 与 /api/robot/list。
+# 每项取中位数与 --baseline 中的记录比较，慢于基线超过 --tolerance（且绝对值超过 --min-delta-ms）
+# 即判为回归，退出码为 1。
+# 基线与机器相关：换机器或有意的性能变化后用 --save-baseline 重新生成。
+#
+#   python test/bench_suite.py                          # 全部基准，与 test/bench_baselines.json 比较
+#   python test/bench_suite.py --only robot --tolerance 0.3
+#   python test/bench_suite.py --rows 10000,100000 --save-baseline
+#
+# 判为回归的项先重跑 --retries 次（取最好的一次），仍慢于基线才失败。
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines.json")
+
+
+class StubYOLO:
+    """替代 ultralytics.YOLO：不加载权重，每张图返回 ``boxes`` 个固定的检测框（坐标按图片尺寸缩放）。"""
+
+    boxes = 12
+
+    def __init__(self, model_path=None):
+        rng = np.random.default_rng(0)
+        self._xy = rng.uniform(0, 0.9, (self.boxes, 2))
+        self._wh = rng.uniform(0.02, 0.1, (self.boxes, 2))
+        self._conf = rng.uniform(0.3, 0.99, self.boxes).astype(np.float32)
+        self._cls = rng.integers(0, len(YOLO_CLASS_NAMES), self.boxes).astype(np.float32)
+        self._names = dict(enumerate(YOLO_CLASS_NAMES))
+
+    def _predict(self, image):
+        h, w = image.shape[:2]
+        scale = np.array([w, h, w, h], dtype=np.float32)
+        xyxy = np.concatenate([self._xy, self._xy + self._wh], axis=1).astype(np.float32) * scale
+        return Prediction(xyxy, self._conf.copy(), self._cls.copy(), self._names, image)
+
+    def __call__(self, sources, verbose=False, **kwargs):
+        if not isinstance(sources, (list, tuple)):
+            sources = [sources]
+        return [self._predict(cv2.imread(s) if isinstance(s, str) else s) for s in sources]
+
+
+def make_app(workdir, **config):
+    from app import create_app
+    from database.db import db
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "SQLALCHEMY_ENGINE_OPTIONS": {},
+        "MODEL_PATH": os.path.join(workdir, "stub.pt"),
+        "MODEL_PRELOAD": False,
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "RESULT_DIR": os.path.join(workdir, "results"),
+        "RENDER_CACHE_DIR": os.path.join(workdir, "render"),
+        "GEOCODER_BACKEND": "stub",
+        # 测的是每次请求真实的查询与序列化开销，不让响应缓存命中
+        "RESPONSE_CACHE_ENABLED": False,
+        **config,
+    })
+    logging.getLogger().setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def close_app(app):
+    """停止应用的后台线程（机器人状态写回、在线检测等），临时数据库删除前调用。"""
+    for ext in list(app.extensions.values()):
+        stop = getattr(ext, "stop", None)
+        if callable(stop):
+            stop()
+
+
+def measure(fn, iterations, warmup, rounds=7):
+    """分 rounds 轮计时，取中位数最小的一轮：单核机器上后台线程、GC 偶发地拖慢某一轮，取最好一轮更稳定。"""
+    for _ in range(warmup):
+        fn()
+    best = None
+    per_round = max(1, iterations // rounds)
+    for _ in range(rounds):
+        timings = []
+        for _ in range(per_round):
+            t0 = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        if best is None or statistics.median(timings) < statistics.median(best):
+            best = timings
+    return {
+        "median_ms": round(statistics.median(best), 4),
+        "p95_ms": round(best[min(len(best) - 1, int(len(best) * 0.95))], 4),
+        "n": per_round * rounds,
+    }
+
+
+def bench_detect(workdir, iterations, warmup):
+    """/api/detect 同步模式端到端：上传解析、解码、（桩）推理、写任务与检测项、汇总与推送。
+    每次上传内容不同，不会命中按内容哈希的去重。"""
+    app = make_app(workdir)
+    client = app.test_client()
+    rng = np.random.default_rng(1)
+    base = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    payloads = []
+    for i in range(iterations + warmup):
+        image = base.copy()
+        image[0, :4] = np.frombuffer(i.to_bytes(12, "little"), dtype=np.uint8).reshape(4, 3)
+        payloads.append(cv2.imencode(".jpg", image)[1].tobytes())
+    payloads.reverse()
+
+    def run():
+        import io
+        r = client.post("/api/detect", data={"image": (io.BytesIO(payloads.pop()), "bench.jpg")},
+                        content_type="multipart/form-data")
+        assert r.status_code == 200 and r.get_json()["ok"], r.get_data(as_text=True)[:200]
+
+    try:
+        return {"detect_e2e": measure(run, iterations, warmup)}
+    finally:
+        close_app(app)
+
+
+def bench_parse(iterations, warmup):
+    """YOLODetector 结果解析：100 个框的 Result -> Detections，取类别名并按置信度过滤。"""
+    StubYOLO.boxes, boxes = 100, StubYOLO.boxes
+    try:
+        result = StubYOLO()(np.zeros((1080, 1920, 3), dtype=np.uint8))[0]
+    finally:
+        StubYOLO.boxes = boxes
+
+    def run():
+        d = YOLODetector.parse_arrays(result).filter(0.25)
+        d.labels
+        d.areas()
+
+    return {"parse_result_100": measure(run, iterations, warmup)}
+
+
+def bench_stats(workdir, rows, iterations, warmup):
+    """/api/stats/summary：rows 个检测项（任务数为其 1/10），汇总表由 backfill 重建。"""
+    from database.db import db
+    from database import rollups
+
+    app = make_app(workdir)
+    with app.app_context():
+        seed(db.engine, max(1, rows // 10), rows)
+        rollups.backfill()
+        db.session.commit()
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    client = app.test_client()
+
+    def run():
+        r = client.get("/api/stats/summary")
+        assert r.status_code == 200, r.status_code
+
+    try:
+        return {f"stats_summary_{label(rows)}": measure(run, iterations, warmup)}
+    finally:
+        close_app(app)
+
+
+def bench_robots(workdir, robots, iterations, warmup):
+    """robots 台已注册机器人：轮流心跳（只写内存状态存储），以及完整列表查询。"""
+    from database.db import db
+    from database.models import Robot
+
+    app = make_app(workdir)
+    with app.app_context():
+        db.session.execute(Robot.__table__.insert(), [
+            {"device_id": f"BENCH_{i:04d}", "name": f"bench {i}", "status": "OFFLINE", "battery": 100}
+            for i in range(robots)
+        ])
+        db.session.commit()
+    client = app.test_client()
+    counter = iter(range(10 ** 9))
+
+    def heartbeat():
+        i = next(counter)
+        r = client.post("/api/robot/heartbeat", json={
+            "device_id": f"BENCH_{i % robots:04d}", "lat": 30.5 + (i % 100) * 1e-4, "lng": 114.3,
+            "battery": 100 - i % 50, "status": "ONLINE"})
+        assert r.status_code == 200, r.get_data(as_text=True)[:200]
+
+    def listing():
+        r = client.get("/api/robot/list")
+        assert r.status_code == 200 and len(r.get_json()["robots"]) == robots
+
+    try:
+        return {
+            f"robot_heartbeat_{robots}": measure(heartbeat, iterations, warmup),
+            f"robot_list_{robots}": measure(listing, iterations, warmup),
+        }
+    finally:
+        close_app(app)
+
+
+def label(n):
+    for unit, size in (("m", 10 ** 6), ("k", 10 ** 3)):
+        if n >= size and n % size == 0:
+            return f"{n // size}{unit}"
+    return str(n)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--rows', default='10000,100000,1000000', help='detect_item counts for the stats benchmark')
+    p.add_argument('--robots', default='10,100,1000', help='Robot counts for heartbeat/list benchmarks')
+    p.add_argument('--only', action='append', default=[], help='Run benchmarks whose name contains this (repeatable)')
+    p.add_argument('--scale', type=float, default=1.0, help='Multiply every iteration count')
+    p.add_argument('--warmup', type=int, default=5)
+    p.add_argument('--baseline', default=BASELINE)
+    p.add_argument('--tolerance', type=float, default=1.0,
+                   help='Allowed median slowdown over the baseline (1.0 = up to 2x; use ~0.2 on a quiet dedicated machine)')
+    p.add_argument('--min-delta-ms', type=float, default=0.25,
+                   help='Ignore slowdowns smaller than this, so sub-millisecond benchmarks do not flap')
+    p.add_argument('--retries', type=int, default=2, help='Re-run benchmarks that regressed before failing')
+    p.add_argument('--save-baseline', action='store_true', help='Write results to --baseline instead of comparing')
+    args = p.parse_args()
+
+    yolo_detector.YOLO = StubYOLO
+    n = lambda count: max(5, int(count * args.scale))
+    wanted = lambda name: not args.only or any(key in name for key in args.only)
+
+    suites = [("detect_e2e", lambda d: bench_detect(d, n(100), args.warmup)),
+              ("parse_result_100", lambda d: bench_parse(n(2000), args.warmup))]
+    for rows in (int(v) for v in args.rows.split(',') if v):
+        suites.append((f"stats_summary_{label(rows)}", lambda d, rows=rows: bench_stats(d, rows, n(50), args.warmup)))
+    for robots in (int(v) for v in args.robots.split(',') if v):
+        suites.append((f"robot_heartbeat_{robots} robot_list_{robots}",
+                       lambda d, robots=robots: bench_robots(d, robots, n(300), args.warmup)))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("benchmarks", {})
+
+    def regressed(name, r):
+        base = baseline.get(name)
+        return (not args.save_baseline and base is not None
+                and r["median_ms"] > base["median_ms"] * (1 + args.tolerance)
+                and r["median_ms"] - base["median_ms"] > args.min_delta_ms)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        pending = [(names, run) for names, run in suites if any(wanted(name) for name in names.split())]
+        for attempt in range(args.retries + 1):
+            for names, run in pending:
+                t0 = time.perf_counter()
+                out = {k: v for k, v in run(tempfile.mkdtemp(dir=workdir)).items() if wanted(k)}
+                for k, v in out.items():
+                    if k not in results or v["median_ms"] < results[k]["median_ms"]:
+                        results[k] = v
+                print(f"  ran {', '.join(out)} in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+            # 单次慢于基线可能只是机器抖动：只重跑判为回归的项，取各次中最好的结果
+            pending = [(names, run) for names, run in pending
+                       if any(regressed(k, results[k]) for k in names.split() if k in results)]
+            if not pending:
+                break
+            if attempt < args.retries:
+                print(f"  re-running {', '.join(names for names, _ in pending)}", file=sys.stderr)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": os.cpu_count(), "saved_at": datetime.now().isoformat(timespec="seconds")},
+                "benchmarks": dict(sorted(baseline.items())),
+            }, f, indent=2)
+            f.write("\n")
+        print(f"saved {len(results)} results to {args.baseline}")
+
+    failed = False
+    print(f"{'benchmark':<26}{'median ms':>11}{'p95 ms':>10}{'ops/s':>10}{'baseline':>11}{'change':>9}  status")
+    for name, r in results.items():
+        base = baseline.get(name)
+        status, change, base_text = ("saved" if args.save_baseline else "new"), "", "-"
+        if base and not args.save_baseline:
+            change = f"{r['median_ms'] / base['median_ms'] - 1:+.0%}"
+            base_text = f"{base['median_ms']:.3f}"
+            status = "REGRESSED" if regressed(name, r) else "ok"
+            failed |= status == "REGRESSED"
+        print(f"{name:<26}{r['median_ms']:>11.3f}{r['p95_ms']:>10.3f}{1000 / r['median_ms']:>10.0f}"
+              f"{base_text:>11}{change:>9}  {status}")
+    print("FAIL" if failed else "PASS")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
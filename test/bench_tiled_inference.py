@@ -0,0 +1,178 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from inference.yolo_detector import YOLODetector
+from inference.tiling import TiledPredictor
+from inference.tracker import iou_matrix
+
+
+# 切片推理与整图推理的延迟、召回对比。
+# 合成数据：把目标小图（--objects 目录，文件名 "<类别>_xxx.jpg" 或按类别分子目录；
+# 或 --images 目录中的照片，由模型在原分辨率下检出的高置信度目标裁剪而来）缩小后贴到宽幅路面背景上，
+# 贴图位置即真值框。召回 = 与同类别真值框 IoU 不低于 --match-iou 的真值比例。
+#
+#   python test/bench_tiled_inference.py --images static/uploads --scenes 20
+#   python test/bench_tiled_inference.py --objects /path/to/crops --width 4000 --height 3000 --workers 4
+
+
+def load_objects(objects_dir):
+    crops = []
+    for path in sorted(glob.glob(os.path.join(objects_dir, "**", "*.*"), recursive=True)):
+        if os.path.splitext(path)[1].lower() not in (".jpg", ".jpeg", ".png"):
+            continue
+        parent = os.path.basename(os.path.dirname(path))
+        label = parent if os.path.dirname(path) != objects_dir.rstrip("/") else os.path.basename(path).split("_")[0]
+        image = cv2.imread(path)
+        if image is not None:
+            crops.append((label, image))
+    return crops
+
+
+def harvest_objects(detector, images_dir, min_conf, min_size=48):
+    """在原分辨率照片上跑一遍模型，裁出高置信度目标作为贴图素材。"""
+    crops = []
+    paths = sorted(glob.glob(os.path.join(images_dir, "*.jpg")) + glob.glob(os.path.join(images_dir, "*.png")))
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        d = detector.parse_arrays(detector.predict([image])[0])
+        for (x1, y1, x2, y2), label, conf in zip(d.xyxy.astype(int).tolist(), d.labels, d.conf.tolist()):
+            if conf >= min_conf and min(x2 - x1, y2 - y1) >= min_size:
+                crops.append((label, image[max(0, y1):y2, max(0, x1):x2].copy()))
+    return crops
+
+
+def background(width, height, rng, path=None):
+    if path:
+        return cv2.resize(cv2.imread(path), (width, height), interpolation=cv2.INTER_AREA)
+    base = rng.normal(115, 22, (height // 16 + 1, width // 16 + 1, 1)).astype(np.float32)
+    base = cv2.resize(base, (width, height), interpolation=cv2.INTER_CUBIC)[..., None]
+    tint = np.array([1.0, 1.02, 1.05], dtype=np.float32)
+    scene = base * tint + rng.normal(0, 5, (height, width, 3)).astype(np.float32)
+    return np.clip(scene, 0, 255).astype(np.uint8)
+
+
+def make_scene(crops, width, height, per_scene, size_range, rng, background_path=None):
+    """返回 (scene, [(label, (x1, y1, x2, y2))])；贴图互不重叠。"""
+    scene = background(width, height, rng, background_path)
+    truth = []
+    occupied = np.zeros((height, width), dtype=bool)
+    for _ in range(per_scene * 10):
+        if len(truth) >= per_scene:
+            break
+        label, crop = crops[int(rng.integers(len(crops)))]
+        side = int(rng.integers(size_range[0], size_range[1] + 1))
+        scale = side / max(crop.shape[:2])
+        w, h = max(2, int(crop.shape[1] * scale)), max(2, int(crop.shape[0] * scale))
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        if occupied[y:y + h, x:x + w].any():
+            continue
+        occupied[y:y + h, x:x + w] = True
+        scene[y:y + h, x:x + w] = cv2.resize(crop, (w, h), interpolation=cv2.INTER_AREA)
+        truth.append((label, (x, y, x + w, y + h)))
+    return scene, truth
+
+
+def score(detections, truth, match_iou):
+    """返回 (命中的真值数, 未匹配的检测数)；同类别、按 IoU 贪心一对一匹配。"""
+    if not truth or not len(detections):
+        return 0, len(detections)
+    gt = np.array([box for _, box in truth], dtype=np.float64)
+    iou = iou_matrix(gt, detections.xyxy.astype(np.float64))
+    same = np.array([[g == p for p in detections.labels] for g, _ in truth])
+    iou = np.where(same, iou, 0.0)
+    used_gt, used = set(), set()
+    for flat in np.argsort(-iou, axis=None):
+        i, j = divmod(int(flat), iou.shape[1])
+        if iou[i, j] < match_iou:
+            break
+        if i in used_gt or j in used:
+            continue
+        used_gt.add(i)
+        used.add(j)
+    return len(used_gt), len(detections) - len(used)
+
+
+def evaluate(name, infer, scenes, match_iou, min_conf):
+    infer(scenes[0][0])  # 预热
+    latencies, hits, total, extra = [], 0, 0, 0
+    for scene, truth in scenes:
+        started = time.perf_counter()
+        detections = infer(scene).filter(min_conf)
+        latencies.append((time.perf_counter() - started) * 1000)
+        h, e = score(detections, truth, match_iou)
+        hits += h
+        total += len(truth)
+        extra += e
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<22} {statistics.mean(latencies):>9.1f} {p95:>9.1f} {hits / max(1, total):>8.1%} "
+          f"{extra / len(scenes):>10.2f}")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--model', default=os.path.join(os.path.dirname(__file__), "..", "best.pt"))
+    p.add_argument('--objects', default=None, help='Directory of object crops (label_xxx.jpg or label/xxx.jpg)')
+    p.add_argument('--images', default=None, help='Harvest object crops from model detections on these photos')
+    p.add_argument('--harvest-conf', type=float, default=0.6)
+    p.add_argument('--background', default=None, help='Background image (default: synthetic road texture)')
+    p.add_argument('--scenes', type=int, default=20)
+    p.add_argument('--width', type=int, default=3840)
+    p.add_argument('--height', type=int, default=2160)
+    p.add_argument('--per-scene', type=int, default=12)
+    p.add_argument('--object-size', default='24:64', help='min:max longest side of pasted objects, in pixels')
+    p.add_argument('--tile', type=int, default=640)
+    p.add_argument('--overlap', type=float, default=0.2)
+    p.add_argument('--workers', type=int, default=4, help='Thread pool size for the pooled tiled run')
+    p.add_argument('--match-iou', type=float, default=0.5)
+    p.add_argument('--min-conf', type=float, default=0.25)
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+
+    detector = YOLODetector(model_path=args.model)
+    if args.objects:
+        crops = load_objects(args.objects)
+    elif args.images:
+        crops = harvest_objects(detector, args.images, args.harvest_conf)
+    else:
+        p.error("need --objects or --images to build the synthetic set")
+    if not crops:
+        p.error("no object crops found")
+
+    rng = np.random.default_rng(args.seed)
+    size_range = tuple(int(v) for v in args.object_size.split(':'))
+    scenes = [make_scene(crops, args.width, args.height, args.per_scene, size_range, rng, args.background)
+              for _ in range(args.scenes)]
+    labels = sorted({label for label, _ in crops})
+    print(f"{len(scenes)} scenes {args.width}x{args.height}, {args.per_scene} objects each "
+          f"({size_range[0]}-{size_range[1]}px), {len(crops)} crops: {', '.join(labels)}")
+
+    batch = TiledPredictor(tile=args.tile, overlap=args.overlap, min_side=0)
+    tiles_only = TiledPredictor(tile=args.tile, overlap=args.overlap, min_side=0, full_frame=False)
+    modes = [
+        ("full frame", lambda image: detector.parse_arrays(detector.predict([image])[0])),
+        ("tiled (batch)", lambda image: batch.predict(detector, image)),
+        ("tiled, no full frame", lambda image: tiles_only.predict(detector, image)),
+    ]
+    if args.workers > 1:
+        pooled = TiledPredictor(tile=args.tile, overlap=args.overlap, min_side=0, workers=args.workers)
+        modes.append((f"tiled ({args.workers} threads)", lambda image: pooled.predict(detector, image)))
+
+    print(f"{'mode':<22} {'mean ms':>9} {'p95 ms':>9} {'recall':>8} {'extra/img':>10}")
+    for name, infer in modes:
+        evaluate(name, infer, scenes, args.match_iou, args.min_conf)
+
+
+if __name__ == '__main__':
+    main()
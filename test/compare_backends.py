@@ -0,0 +1,114 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from inference.yolo_detector import YOLODetector
+from inference.tracker import iou_matrix
+
+
+# 推理后端的精度与延迟对比：以 PyTorch 后端（--weights）的检测结果为基准，
+# 逐张比较 ONNX Runtime 模型（--onnx，可多个，如 FP32 与 INT8）的检测框：
+# 同类别、IoU 不低于 --match-iou 贪心一对一匹配，报告召回（基准框被复现的比例）、精确率、
+# 匹配框的平均 IoU 与置信度差。任一后端召回或精确率低于 --min-agreement 时退出码为 1。
+#
+#   flask --app app export-model --int8 --calib static/uploads
+#   python test/compare_backends.py --onnx best.onnx best.int8.onnx --images static/uploads --threads 4
+
+
+def agreement(ref, det, match_iou):
+    """返回 (匹配数, 匹配框 IoU 列表, 置信度差列表)。"""
+    if not len(ref) or not len(det):
+        return 0, [], []
+    iou = iou_matrix(ref.xyxy.astype(np.float64), det.xyxy.astype(np.float64))
+    iou = np.where(ref.cls[:, None] == det.cls[None, :], iou, 0.0)
+    used_ref, used_det, ious, dconf = set(), set(), [], []
+    for flat in np.argsort(-iou, axis=None):
+        i, j = divmod(int(flat), iou.shape[1])
+        if iou[i, j] < match_iou:
+            break
+        if i in used_ref or j in used_det:
+            continue
+        used_ref.add(i)
+        used_det.add(j)
+        ious.append(float(iou[i, j]))
+        dconf.append(abs(float(ref.conf[i]) - float(det.conf[j])))
+    return len(ious), ious, dconf
+
+
+def run(detector, images, min_conf):
+    detector.predict([images[0]])  # 预热
+    latencies, outputs = [], []
+    for image in images:
+        started = time.perf_counter()
+        result = detector.predict([image])[0]
+        latencies.append((time.perf_counter() - started) * 1000)
+        outputs.append(detector.parse_arrays(result).filter(min_conf))
+    return latencies, outputs
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--weights', default=os.path.join(os.path.dirname(__file__), "..", "best.pt"))
+    p.add_argument('--onnx', nargs='+', default=[os.path.join(os.path.dirname(__file__), "..", "best.onnx")])
+    p.add_argument('--images', required=True, help='Directory of test photos')
+    p.add_argument('--limit', type=int, default=100)
+    p.add_argument('--threads', type=int, default=0, help='CPU threads for both backends (0: library default)')
+    p.add_argument('--min-conf', type=float, default=0.25)
+    p.add_argument('--match-iou', type=float, default=0.9)
+    p.add_argument('--min-agreement', type=float, default=0.95)
+    args = p.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.images, "*.jpg")) + glob.glob(os.path.join(args.images, "*.png")))
+    images = [img for img in (cv2.imread(path) for path in paths[:args.limit]) if img is not None]
+    if not images:
+        p.error("no images found")
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    reference = YOLODetector(model_path=args.weights)
+    ref_latency, ref_out = run(reference, images, args.min_conf)
+    ref_mean = statistics.mean(ref_latency)
+    ref_boxes = sum(len(d) for d in ref_out)
+    print(f"{len(images)} images, {ref_boxes} reference boxes (conf >= {args.min_conf}), match IoU {args.match_iou}")
+    print(f"{'backend':<28} {'mean ms':>9} {'p95 ms':>9} {'speedup':>8} {'recall':>8} {'precision':>10} "
+          f"{'mean IoU':>9} {'|dconf|':>8}")
+
+    def report(name, latencies, outputs):
+        latencies = sorted(latencies)
+        mean = statistics.mean(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        matched, ious, dconf = 0, [], []
+        for ref, det in zip(ref_out, outputs):
+            m, i, d = agreement(ref, det, args.match_iou)
+            matched += m
+            ious += i
+            dconf += d
+        boxes = sum(len(d) for d in outputs)
+        recall = matched / ref_boxes if ref_boxes else 1.0
+        precision = matched / boxes if boxes else 1.0
+        print(f"{name:<28} {mean:>9.1f} {p95:>9.1f} {ref_mean / mean:>7.2f}x {recall:>8.1%} {precision:>10.1%} "
+              f"{statistics.mean(ious) if ious else 1.0:>9.3f} {statistics.mean(dconf) if dconf else 0.0:>8.4f}")
+        return min(recall, precision)
+
+    report(f"torch ({os.path.basename(args.weights)})", ref_latency, ref_out)
+    worst = 1.0
+    for path in args.onnx:
+        detector = YOLODetector(model_path=path, onnx_options={"intra_op_threads": args.threads})
+        latencies, outputs = run(detector, images, args.min_conf)
+        worst = min(worst, report(f"onnx ({os.path.basename(path)})", latencies, outputs))
+    if worst < args.min_agreement:
+        print(f"agreement {worst:.1%} below --min-agreement {args.min_agreement:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -34,7 +34,14 @@ CREATE TABLE IF NOT EXISTS `detect_task` (
 	`error_msg` TEXT,
 	`created_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
 	`latitude` FLOAT,
-	`longitude` FLOAT
+	`longitude` FLOAT,
+	`geocell` VARCHAR(12),
+	`content_hash` VARCHAR(64),
+	KEY `ix_detect_task_created_at` (`created_at`),
+	KEY `ix_detect_task_lat_lng` (`latitude`, `longitude`),
+	KEY `ix_detect_task_device_created` (`device_id`, `created_at`),
+	KEY `ix_detect_task_geocell` (`geocell`, `latitude`, `longitude`),
+	KEY `ix_detect_task_content_hash` (`content_hash`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- 检测项表（关联 detect_task）
@@ -50,6 +57,12 @@ CREATE TABLE IF NOT EXISTS `detect_item` (
 	`area` INT,
 	`handle_state` VARCHAR(20) DEFAULT 'NEW',
 	`updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+	`track_id` VARCHAR(32),
+	`seen_count` INT DEFAULT 1,
+	`last_seen_at` DATETIME,
+	KEY `ix_detect_item_task_label` (`task_id`, `label`),
+	KEY `ix_detect_item_label` (`label`),
+	KEY `ix_detect_item_track` (`track_id`),
 	FOREIGN KEY (`task_id`) REFERENCES `detect_task`(`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -79,6 +92,54 @@ CREATE TABLE IF NOT EXISTS `robot` (
 	`created_at` DATETIME DEFAULT CURRENT_TIMESTAMP
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 机器人命令队列（按 robot_id + seq 排序，投递时原子认领）
+CREATE TABLE IF NOT EXISTS `robot_command` (
+	`id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+	`robot_id` INT NOT NULL,
+	`seq` INT NOT NULL,
+	`command` VARCHAR(100) NOT NULL,
+	`target_lat` FLOAT,
+	`target_lng` FLOAT,
+	`status` VARCHAR(20) NOT NULL DEFAULT 'QUEUED',
+	`attempts` INT NOT NULL DEFAULT 0,
+	`created_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
+	`delivered_at` DATETIME,
+	`acked_at` DATETIME,
+	`expires_at` DATETIME,
+	UNIQUE KEY `uq_robot_command_seq` (`robot_id`, `seq`),
+	KEY `ix_robot_command_claim` (`robot_id`, `status`, `seq`),
+	FOREIGN KEY (`robot_id`) REFERENCES `robot`(`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 逆地理编码缓存（按网格量化的坐标）
+CREATE TABLE IF NOT EXISTS `geo_cache` (
+	`id` INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+	`cell_key` VARCHAR(64) NOT NULL UNIQUE,
+	`latitude` FLOAT,
+	`longitude` FLOAT,
+	`address` VARCHAR(255),
+	`created_at` DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 统计汇总表（检测写库时增量维护，可用 `flask --app app backfill-stats` 重建）
+CREATE TABLE IF NOT EXISTS `stats_daily` (
+	`day` DATE NOT NULL PRIMARY KEY,
+	`task_count` INT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `stats_label` (
+	`label` VARCHAR(50) NOT NULL PRIMARY KEY,
+	`item_count` INT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `stats_task_labels` (
+	`task_id` INT NOT NULL PRIMARY KEY,
+	`latitude` FLOAT,
+	`longitude` FLOAT,
+	`labels` VARCHAR(255) DEFAULT '',
+	FOREIGN KEY (`task_id`) REFERENCES `detect_task`(`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- 示例数据（MySQL）
 -- INSERT INTO `user` (username, password_hash, security_code, role) VALUES ('admin', '<password_hash_here>', '<security_code_here>', 'admin');
 -- INSERT INTO `robot` (device_id, name, status, battery) VALUES ('SIM_ROBOT_001', 'Simulator', 'OFFLINE', 100);
@@ -113,8 +174,15 @@ CREATE TABLE IF NOT EXISTS detect_task (
 	error_msg TEXT,
 	created_at DATETIME DEFAULT (datetime('now')),
 	latitude REAL,
-	longitude REAL
+	longitude REAL,
+	geocell TEXT,
+	content_hash TEXT
 );
+CREATE INDEX IF NOT EXISTS ix_detect_task_created_at ON detect_task (created_at);
+CREATE INDEX IF NOT EXISTS ix_detect_task_lat_lng ON detect_task (latitude, longitude);
+CREATE INDEX IF NOT EXISTS ix_detect_task_device_created ON detect_task (device_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_detect_task_geocell ON detect_task (geocell, latitude, longitude);
+CREATE INDEX IF NOT EXISTS ix_detect_task_content_hash ON detect_task (content_hash);
 
 DROP TABLE IF EXISTS detect_item;
 CREATE TABLE IF NOT EXISTS detect_item (
@@ -129,8 +197,14 @@ CREATE TABLE IF NOT EXISTS detect_item (
 	area INTEGER,
 	handle_state TEXT DEFAULT 'NEW',
 	updated_at DATETIME DEFAULT (datetime('now')),
+	track_id TEXT,
+	seen_count INTEGER DEFAULT 1,
+	last_seen_at DATETIME,
 	FOREIGN KEY(task_id) REFERENCES detect_task(id) ON DELETE CASCADE
 );
+CREATE INDEX IF NOT EXISTS ix_detect_item_task_label ON detect_item (task_id, label);
+CREATE INDEX IF NOT EXISTS ix_detect_item_label ON detect_item (label);
+CREATE INDEX IF NOT EXISTS ix_detect_item_track ON detect_item (track_id);
 
 DROP TABLE IF EXISTS ops_log;
 CREATE TABLE IF NOT EXISTS ops_log (
@@ -158,6 +232,56 @@ CREATE TABLE IF NOT EXISTS robot (
 	created_at DATETIME DEFAULT (datetime('now'))
 );
 
+DROP TABLE IF EXISTS robot_command;
+CREATE TABLE IF NOT EXISTS robot_command (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	robot_id INTEGER NOT NULL,
+	seq INTEGER NOT NULL,
+	command TEXT NOT NULL,
+	target_lat REAL,
+	target_lng REAL,
+	status TEXT NOT NULL DEFAULT 'QUEUED',
+	attempts INTEGER NOT NULL DEFAULT 0,
+	created_at DATETIME DEFAULT (datetime('now')),
+	delivered_at DATETIME,
+	acked_at DATETIME,
+	expires_at DATETIME,
+	UNIQUE(robot_id, seq),
+	FOREIGN KEY(robot_id) REFERENCES robot(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_robot_command_claim ON robot_command (robot_id, status, seq);
+
+DROP TABLE IF EXISTS geo_cache;
+CREATE TABLE IF NOT EXISTS geo_cache (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	cell_key TEXT NOT NULL UNIQUE,
+	latitude REAL,
+	longitude REAL,
+	address TEXT,
+	created_at DATETIME DEFAULT (datetime('now'))
+);
+
+DROP TABLE IF EXISTS stats_daily;
+CREATE TABLE IF NOT EXISTS stats_daily (
+	day DATE PRIMARY KEY,
+	task_count INTEGER NOT NULL DEFAULT 0
+);
+
+DROP TABLE IF EXISTS stats_label;
+CREATE TABLE IF NOT EXISTS stats_label (
+	label TEXT PRIMARY KEY,
+	item_count INTEGER NOT NULL DEFAULT 0
+);
+
+DROP TABLE IF EXISTS stats_task_labels;
+CREATE TABLE IF NOT EXISTS stats_task_labels (
+	task_id INTEGER PRIMARY KEY,
+	latitude REAL,
+	longitude REAL,
+	labels TEXT DEFAULT '',
+	FOREIGN KEY(task_id) REFERENCES detect_task(id) ON DELETE CASCADE
+);
+
 -- 示例数据（SQLite）
 -- INSERT INTO user (username, password_hash, security_code, role) VALUES ('admin', '<password_hash_here>', '<security_code_here>', 'admin');
 -- INSERT INTO robot (device_id, name, status, battery) VALUES ('SIM_ROBOT_001', 'Simulator', 'OFFLINE', 100);
@@ -0,0 +1,103 @@
+import os
+import time
+import glob
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import cv2
+import numpy as np
+
+
+# 模拟 ESP32-CAM 的 MJPEG 视频流（与 Clean_Robot/src/ESP32CAM_Controller.ino 的 /stream 格式相同），
+# 用于在没有硬件时测试 /api/robot/<device_id>/camera/start 的视频流接入。
+# 帧来源：--video 视频文件、--images 图片目录（循环播放），缺省时生成移动色块的合成画面。
+#
+#   python test/fake_camera.py --port 8080 --fps 10
+#   curl -X POST localhost:5000/api/robot/SIM_ROBOT_001/camera/start \
+#        -H 'Content-Type: application/json' -d '{"url": "http://127.0.0.1:8080/stream"}'
+
+
+class FrameSource:
+    def __init__(self, video=None, images=None, width=640, height=480):
+        self.width = width
+        self.height = height
+        self.cap = cv2.VideoCapture(video) if video else None
+        self.images = sorted(glob.glob(os.path.join(images, "*.jpg")) + glob.glob(os.path.join(images, "*.png"))) if images else []
+        self.index = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            self.index += 1
+            if self.cap is not None:
+                ok, frame = self.cap.read()
+                if not ok:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    ok, frame = self.cap.read()
+                if ok:
+                    return frame
+            if self.images:
+                return cv2.imread(self.images[self.index % len(self.images)])
+            return self.synthetic(self.index)
+
+    def synthetic(self, i):
+        frame = np.full((self.height, self.width, 3), 40, dtype=np.uint8)
+        x = (i * 7) % (self.width - 80)
+        y = self.height // 2 - 40 + int(40 * np.sin(i / 10))
+        cv2.rectangle(frame, (x, y), (x + 80, y + 80), (0, 140, 255), -1)
+        cv2.putText(frame, f"frame {i}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        return frame
+
+
+def make_handler(source, fps, quality):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/stream":
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.end_headers()
+                self.wfile.write(b"Fake ESP32 Camera Server\nStream URL: /stream\n")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.end_headers()
+            interval = 1.0 / fps
+            try:
+                while True:
+                    jpeg = cv2.imencode(".jpg", source.next(), [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+                    self.wfile.write(b"--frame\nContent-Type: image/jpeg\n")
+                    self.wfile.write(f"Content-Length: {len(jpeg)}\n\n".encode())
+                    self.wfile.write(jpeg + b"\n")
+                    self.wfile.flush()
+                    time.sleep(interval)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8080)
+    p.add_argument('--fps', type=float, default=10.0)
+    p.add_argument('--quality', type=int, default=80, help='JPEG quality')
+    p.add_argument('--video', default=None, help='Loop frames from this video file')
+    p.add_argument('--images', default=None, help='Loop frames from the .jpg/.png files in this directory')
+    args = p.parse_args()
+
+    source = FrameSource(args.video, args.images)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(source, args.fps, args.quality))
+    print(f"fake camera: http://{args.host}:{args.port}/stream ({args.fps} fps)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 查询计划回归检查：在 SQLite 中生成大量模拟数据（默认 100 万检测项），
+# 先建无索引的表、写入数据，再用 `flask migrate-schema` 同一套迁移补建索引；
+# 然后通过测试客户端访问看板、地图聚合、结果分页、详情等接口，记录它们实际执行的 SELECT，
+# 逐条 EXPLAIN QUERY PLAN，检查热表（detect_task / detect_item）没有无界全表扫描，
+# 并检查每个接口的耗时不超过预算。--no-indexes 可跳过迁移，对比无索引时的结果。
+
+HOT_TABLES = ("detect_task", "detect_item")
+LABELS = ["plastic_bottle", "can", "paper", "plastic_bag", "cigarette", "glass", "carton", "other"]
+
+# 名称 -> 默认耗时预算（毫秒，取多次运行的中位数）
+BUDGETS = {
+    "stats_summary": 100,
+    "stats_map_overview": 1500,
+    "stats_map_street": 50,
+    "result_first_page": 50,
+    "result_deep_page": 50,
+    "tasks_api": 50,
+    "result_detail": 50,
+    "detect_get": 50,
+    "backfill_stats": 60000,
+}
+
+
+def seed(engine, tasks, items, batch=50000):
+    """按批写入任务与检测项：任务分布在最近 90 天，约 60% 带坐标。"""
+    from database.models import DetectTask, DetectItem
+
+    rnd = random.Random(42)
+    now = datetime.now()
+    task_table = DetectTask.__table__
+    item_table = DetectItem.__table__
+    with engine.begin() as conn:
+        rows = []
+        for i in range(1, tasks + 1):
+            located = rnd.random() < 0.6
+            rows.append({
+                "id": i, "source_type": "image", "source_path": f"uploads/{i}.jpg", "status": "DONE",
+                "device_id": f"ROBOT_{rnd.randrange(50):03d}",
+                "created_at": now - timedelta(seconds=rnd.randrange(90 * 86400)),
+                "latitude": 30 + rnd.random() if located else None,
+                "longitude": 114 + rnd.random() if located else None,
+            })
+            if len(rows) >= batch:
+                conn.execute(task_table.insert(), rows)
+                rows = []
+        if rows:
+            conn.execute(task_table.insert(), rows)
+
+        rows = []
+        for i in range(1, items + 1):
+            x, y = rnd.randrange(600), rnd.randrange(600)
+            rows.append({"id": i, "task_id": rnd.randint(1, tasks), "label": rnd.choice(LABELS),
+                         "confidence": rnd.random(), "x1": x, "y1": y, "x2": x + 40, "y2": y + 40,
+                         "area": 1600, "handle_state": "NEW"})
+            if len(rows) >= batch:
+                conn.execute(item_table.insert(), rows)
+                rows = []
+        if rows:
+            conn.execute(item_table.insert(), rows)
+
+
+class QueryRecorder:
+    """记录引擎上执行的 SELECT 语句及其参数。"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.engine = engine
+        self.statements = []
+        self.enabled = False
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled and not executemany and statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+    def record(self, fn):
+        self.statements = []
+        self.enabled = True
+        try:
+            fn()
+        finally:
+            self.enabled = False
+        return list(self.statements)
+
+
+def explain(engine, statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+def plan_problems(statement, plan, allow_temp_btree=False):
+    """热表上无 LIMIT 的全表扫描（未用索引）与临时排序 B 树视为问题。"""
+    problems = []
+    bounded = re.search(r"\bLIMIT\b", statement, re.IGNORECASE) is not None
+    for line in plan:
+        m = re.match(r"SCAN (\w+)", line)
+        if m and m.group(1) in HOT_TABLES and "INDEX" not in line and not bounded:
+            problems.append(line)
+        if "TEMP B-TREE" in line and not allow_temp_btree and any(t in statement for t in HOT_TABLES):
+            problems.append(line)
+    return problems
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--items', type=int, default=1000000, help='Number of detect_item rows to seed')
+    p.add_argument('--tasks', type=int, default=None, help='Number of detect_task rows (default: items / 10)')
+    p.add_argument('--db', default=None, help='SQLite file to use (default: temporary file, removed afterwards)')
+    p.add_argument('--reuse', action='store_true', help='Reuse an already seeded --db instead of seeding')
+    p.add_argument('--no-indexes', action='store_true', help='Skip the index migration (baseline comparison)')
+    p.add_argument('--repeat', type=int, default=5, help='Runs per endpoint; the median is compared to the budget')
+    p.add_argument('--budget', action='append', default=[], metavar='NAME=MS', help='Override a latency budget')
+    p.add_argument('--verbose', action='store_true', help='Print every query plan')
+    args = p.parse_args()
+
+    budgets = dict(BUDGETS)
+    for item in args.budget:
+        name, _, ms = item.partition('=')
+        budgets[name] = float(ms)
+    tasks = args.tasks or max(1, args.items // 10)
+
+    path = args.db or tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    if not args.db or not args.reuse:
+        if os.path.exists(path):
+            os.unlink(path)
+
+    from app import create_app
+    from database.db import db
+    from database import rollups
+    from database.migrations import missing_indexes, migrate_schema
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}", "SQLALCHEMY_ENGINE_OPTIONS": {},
+                      "MODEL_PRELOAD": False, "RESPONSE_CACHE_ENABLED": False})
+    failed = False
+    try:
+        with app.app_context():
+            engine = db.engine
+            if not args.reuse:
+                # 模拟已上线的旧库：先建表但不建索引，写入数据后再迁移
+                for table in db.metadata.sorted_tables:
+                    table.create(engine)
+                    for index in table.indexes:
+                        index.drop(engine)
+                t0 = time.perf_counter()
+                seed(engine, tasks, args.items)
+                print(f"seeded tasks={tasks} items={args.items} in {time.perf_counter() - t0:.1f}s")
+            if not args.no_indexes:
+                t0 = time.perf_counter()
+                created = migrate_schema(engine)
+                print(f"migrate-schema created {created or 'nothing'} in {time.perf_counter() - t0:.1f}s")
+            still_missing = [ix.name for ix in missing_indexes(engine)]
+            if still_missing:
+                print(f"missing indexes: {', '.join(still_missing)}")
+            with engine.connect() as conn:
+                conn.exec_driver_sql("ANALYZE")
+
+            recorder = QueryRecorder(engine)
+            client = app.test_client()
+            task_id = tasks // 2
+            deep_cursor = max(2, tasks // 100)
+
+            def get(url):
+                def run():
+                    r = client.get(url)
+                    assert r.status_code == 200, f"{url} -> {r.status_code}"
+                return run
+
+            def backfill():
+                rollups.backfill()
+
+            checks = [
+                ("backfill_stats", backfill, True, 1),
+                ("stats_summary", get("/api/stats/summary"), False, args.repeat),
+                # 地图聚合：整个数据范围（全部点位参与分组）与街道级别的小视口
+                ("stats_map_overview", get("/api/stats/map?bbox=100,20,130,40&zoom=5"), True, args.repeat),
+                ("stats_map_street", get("/api/stats/map?bbox=114.50,30.50,114.52,30.51&zoom=16"), True, args.repeat),
+                ("result_first_page", get("/result"), False, args.repeat),
+                ("result_deep_page", get(f"/result?before={deep_cursor}"), False, args.repeat),
+                ("tasks_api", get(f"/api/tasks?before={deep_cursor}&limit=100&count=1"), False, args.repeat),
+                ("result_detail", get(f"/result/{task_id}"), False, args.repeat),
+                ("detect_get", get(f"/api/detect/{task_id}"), False, args.repeat),
+            ]
+            print(f"{'check':<20}{'median ms':>12}{'budget':>10}  plan")
+            for name, fn, allow_temp_btree, repeat in checks:
+                statements = recorder.record(fn)
+                timings = []
+                for _ in range(repeat - 1):
+                    t0 = time.perf_counter()
+                    fn()
+                    timings.append((time.perf_counter() - t0) * 1000)
+                if not timings:
+                    t0 = time.perf_counter()
+                    statements = recorder.record(fn)
+                    timings.append((time.perf_counter() - t0) * 1000)
+                median = sorted(timings)[len(timings) // 2]
+
+                problems = []
+                plans = []
+                for statement, parameters in statements:
+                    plan = explain(engine, statement, parameters)
+                    plans.append((statement, plan))
+                    problems.extend(plan_problems(statement, plan, allow_temp_btree))
+                over = median > budgets[name]
+                failed |= over or bool(problems)
+                status = "ok" if not problems else "; ".join(sorted(set(problems)))
+                print(f"{name:<20}{median:>12.1f}{budgets[name]:>10.0f}  {status}{'  OVER BUDGET' if over else ''}")
+                if args.verbose or problems:
+                    for statement, plan in plans:
+                        print("    " + " ".join(statement.split())[:160])
+                        for line in plan:
+                            print("      " + line)
+    finally:
+        if not args.db:
+            os.unlink(path)
+    print("FAIL" if failed else "PASS")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
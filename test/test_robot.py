@@ -34,6 +34,9 @@ def simulate_robot(server='http://127.0.0.1:5000', device_id='SIM_ROBOT_001', na
             print('无法打开本地摄像头，关闭摄像头模拟')
             cap = None
 
+    # command ids received from the server, acknowledged on the next heartbeat
+    pending_ack = []
+
     try:
         while battery > 0:
             payload = {
@@ -41,7 +44,8 @@ def simulate_robot(server='http://127.0.0.1:5000', device_id='SIM_ROBOT_001', na
                 'lat': round(lat, 6),
                 'lng': round(lng, 6),
                 'status': 'ONLINE',
-                'battery': round(battery, 1)
+                'battery': round(battery, 1),
+                'ack': pending_ack
             }
 
             url = status_url if use_status else heartbeat_url
@@ -66,7 +70,10 @@ def simulate_robot(server='http://127.0.0.1:5000', device_id='SIM_ROBOT_001', na
                 else:
                     data = r.json()
                     if data.get('ok'):
+                        pending_ack = []
                         cmd = data.get('command')
+                        if data.get('command_id'):
+                            pending_ack.append(data['command_id'])
                         target = data.get('target') or {}
                         print(f"[{time.strftime('%H:%M:%S')}] 上报成功 | 电量={battery:.1f}% | 指令={cmd}")
                         if cmd == 'NAVIGATE' and target.get('lat') is not None and target.get('lng') is not None:
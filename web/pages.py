@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request
 from database.models import DetectTask, DetectItem
 from database.db import db
+from database.listing import list_tasks
 
 web_bp = Blueprint("web_bp", __name__)
 
@@ -18,11 +19,11 @@ def stats_page():
 
 @web_bp.route("/result")
 def result():
-    page = int(request.args.get("page", 1))
-    pagination = DetectTask.query.order_by(DetectTask.id.desc()).paginate(
-        page=page, per_page=10, error_out=False
-    )
-    return render_template("result.html", tasks=pagination.items, pagination=pagination)
+    # 游标分页：?before=<id> 下一页，?after=<id> 上一页；总数为近似值
+    listing = list_tasks(before=request.args.get("before", type=int),
+                         after=request.args.get("after", type=int),
+                         limit=10, count=True)
+    return render_template("result.html", **listing)
 
 @web_bp.route('/result/<int:task_id>')
 def result_detail(task_id):